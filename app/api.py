@@ -1,9 +1,13 @@
+import json
+
 from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
-from . import crud, models, schemas
+from . import crawl_metrics, crud, models, schemas
 from .database import SessionLocal, engine
+from .settings import METRICS_DIR
 
 models.Base.metadata.create_all(bind=engine)
 
@@ -61,18 +65,37 @@ def read_part(part_id: int, db: Session = Depends(get_db)):
 # Story endpoints
 @app.get("/stories/", response_model=list[schemas.Story])
 def read_stories(era: str | None = None, team: str | None = None, story_type: str | None = None, 
-                 category: str | None = None, skip: int = 0, limit: int = 20, db: Session = Depends(get_db)):
+                 category: str | None = None, skip: int = 0, limit: int = 20, generate: bool = True,
+                 db: Session = Depends(get_db)):
     # Try to get stories from database
     stories = crud.get_stories(db, era=era, team=team, story_type=story_type, skip=skip, limit=limit)
     
     # If no stories found and filters are applied, generate some using AI
     if len(stories) < 5 and (era or team or category):
-        from .story_generator import get_or_generate_stories
-        stories = get_or_generate_stories(era=era, category=category, team=team, limit=limit)
+        from .story_generator import fallback_stories, get_or_generate_stories
+        if generate:
+            stories = get_or_generate_stories(era=era, category=category, team=team, limit=limit)
+        else:
+            # The caller streams new stories from /stories/stream; answer with stored ones right away
+            stories = fallback_stories(db, era, category, team, limit, preferred=stories)
     
     return stories
 
 
+@app.get("/stories/stream")
+def stream_stories(era: str | None = None, category: str | None = None, team: str | None = None):
+    """Server-Sent Events: a `story` event for each generated story as soon as it is stored, then `done`"""
+    from .story_generator import stream_contextual_stories
+
+    def events():
+        for event, data in stream_contextual_stories(era=era, category=category, team=team, count=5):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    # No-buffering header for nginx-style proxies in front of the API
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.get("/stories/{story_id}", response_model=schemas.Story)
 def read_story(story_id: int, db: Session = Depends(get_db)):
     db_story = crud.get_story(db, story_id=story_id)
@@ -84,7 +107,28 @@ def read_story(story_id: int, db: Session = Depends(get_db)):
 @app.post("/stories/generate")
 def generate_stories(era: str | None = None, category: str | None = None, team: str | None = None):
     """Endpoint to manually trigger story generation"""
-    from .story_generator import generate_contextual_stories
-    
-    generated = generate_contextual_stories(era=era, category=category, team=team, count=5)
+    from .story_generator import generate_within_deadline
+
+    generated = generate_within_deadline(era=era, category=category, team=team, count=5)
+    if generated is None:
+        # Slow, failing or busy provider; the caller can try again later
+        return {"generated": 0, "stories": [], "deferred": True}
     return {"generated": len(generated), "stories": generated}
+
+
+# Crawl metrics
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """Live crawler metrics in the Prometheus text format"""
+    snapshots = crawl_metrics.load_snapshots(METRICS_DIR)
+    return PlainTextResponse(crawl_metrics.render_prometheus(snapshots), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/crawl-runs/", response_model=list[schemas.CrawlRun])
+def read_crawl_runs(spider: str | None = None, skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
+    return crud.get_crawl_runs(db, spider=spider, skip=skip, limit=limit)
+
+
+@app.get("/story-warmups/", response_model=list[schemas.StoryWarmupRun])
+def read_story_warmups(skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
+    return crud.get_story_warmup_runs(db, skip=skip, limit=limit)
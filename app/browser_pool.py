@@ -0,0 +1,386 @@
+"""Shared Playwright browser pool with resource blocking.
+
+``SharedBrowserDownloadHandler`` is a drop-in replacement for the
+scrapy-playwright download handler. Every crawler in the same process
+shares one Playwright instance, one browser per browser type and launch
+options, and one context per context name and options, instead of each
+spider launching its own Chromium. Concurrent pages can be capped per
+domain across all spiders with ``PLAYWRIGHT_MAX_PAGES_PER_DOMAIN``; the
+cap is fixed by the first spider that opens a page on the domain, and a
+spider asking for a different cap later is warned and shares the first one.
+
+``should_abort_request`` (for ``PLAYWRIGHT_ABORT_REQUEST``) stops images,
+media, fonts and known trackers from being downloaded at all, and the
+``BrowserPoolStats`` extension logs pages per minute and peak RSS so runs
+can be compared.
+
+Run several Playwright spiders in one process so they share the pool, or
+smoke-test the pool against a real browser and a local HTTP server:
+
+    python -m app.browser_pool crawl schmiedmann_e28 schmiedmann_f10
+    python -m app.browser_pool smoke --pages 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from playwright.async_api import PlaywrightContextManager
+from scrapy import signals
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy_playwright.handler import (
+    PERSISTENT_CONTEXT_PATH_KEY,
+    BrowserContextWrapper,
+    ScrapyPlaywrightDownloadHandler,
+)
+
+# Resource types the spiders never read; the DOM and scripts still load normally
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+BLOCKED_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "facebook.net",
+    "facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "cookiebot.com",
+    "trustpilot.com",
+    "bing.com",
+)
+DEFAULT_MAX_PAGES_PER_DOMAIN = 2
+
+logger = logging.getLogger(__name__)
+
+
+def should_abort_request(request) -> bool:
+    """PLAYWRIGHT_ABORT_REQUEST hook: skip heavy resources and third-party trackers"""
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlparse(request.url).hostname or ""
+    return any(host == domain or host.endswith("." + domain) for domain in BLOCKED_DOMAINS)
+
+
+class BrowserPool:
+    """Process-wide Playwright, browsers and contexts, reference-counted by download handler"""
+
+    def __init__(self):
+        self.users = 0
+        self.lock = asyncio.Lock()
+        self.playwright_context_manager = None
+        self.playwright = None
+        self.browsers: Dict[Tuple[str, str], object] = {}
+        self.contexts: Dict[Tuple[str, str], BrowserContextWrapper] = {}
+        self.domain_slots: Dict[str, asyncio.Semaphore] = {}
+        self.domain_slot_sizes: Dict[str, int] = {}
+
+    async def acquire(self):
+        async with self.lock:
+            if self.playwright is None:
+                self.playwright_context_manager = PlaywrightContextManager()
+                self.playwright = await self.playwright_context_manager.start()
+            self.users += 1
+            return self.playwright_context_manager, self.playwright
+
+    async def browser(self, browser_type, launch_options: dict):
+        key = (browser_type.name, json.dumps(launch_options, sort_keys=True, default=str))
+        async with self.lock:
+            if key not in self.browsers:
+                self.browsers[key] = await browser_type.launch(**launch_options)
+            return self.browsers[key]
+
+    def domain_slot(self, domain: str, size: int) -> asyncio.Semaphore:
+        """The page cap shared by every spider on a domain; its size is the first caller's"""
+        if domain not in self.domain_slots:
+            self.domain_slots[domain] = asyncio.Semaphore(size)
+            self.domain_slot_sizes[domain] = size
+        elif self.domain_slot_sizes[domain] != size:
+            logger.warning(f"⚠️ {domain} is already capped at {self.domain_slot_sizes[domain]} pages at a time "
+                           f"by another spider; PLAYWRIGHT_MAX_PAGES_PER_DOMAIN={size} is ignored for it")
+        return self.domain_slots[domain]
+
+    async def release(self) -> None:
+        async with self.lock:
+            self.users -= 1
+            if self.users > 0:
+                return
+            await asyncio.gather(*[wrapper.context.close() for wrapper in self.contexts.values()],
+                                 return_exceptions=True)
+            await asyncio.gather(*[browser.close() for browser in self.browsers.values()],
+                                 return_exceptions=True)
+            if self.playwright_context_manager:
+                await self.playwright_context_manager.__aexit__()
+            self.contexts.clear()
+            self.browsers.clear()
+            self.domain_slots.clear()
+            self.domain_slot_sizes.clear()
+            self.playwright_context_manager = None
+            self.playwright = None
+
+
+pool = BrowserPool()
+
+
+class SharedBrowserDownloadHandler(ScrapyPlaywrightDownloadHandler):
+    """scrapy-playwright handler that takes its browser and contexts from the process-wide pool"""
+
+    def __init__(self, crawler):
+        super().__init__(crawler)
+        self.max_pages_per_domain = (crawler.settings.getint("PLAYWRIGHT_MAX_PAGES_PER_DOMAIN")
+                                     or DEFAULT_MAX_PAGES_PER_DOMAIN)
+
+    async def _launch(self) -> None:
+        self.playwright_context_manager, self.playwright = await pool.acquire()
+        self.browser_type = getattr(self.playwright, self.config.browser_type_name)
+        for name, kwargs in self.config.startup_context_kwargs.items():
+            await self._create_browser_context(name=name, context_kwargs=kwargs)
+        self.stats.set_value("playwright/page_count", self._get_total_page_count())
+
+    async def _maybe_launch_browser(self) -> None:
+        if not hasattr(self, "browser"):
+            self.browser = await pool.browser(self.browser_type, self.config.launch_options)
+
+    async def _create_browser_context(self, name, context_kwargs, spider=None) -> BrowserContextWrapper:
+        context_kwargs = context_kwargs or {}
+        if context_kwargs.get(PERSISTENT_CONTEXT_PATH_KEY) or self.config.cdp_url:
+            return await super()._create_browser_context(name, context_kwargs, spider=spider)
+
+        key = (name, json.dumps(context_kwargs, sort_keys=True, default=str))
+        wrapper = pool.contexts.get(key)
+        if wrapper is None:
+            wrapper = await super()._create_browser_context(name, context_kwargs, spider=spider)
+            pool.contexts[key] = wrapper
+            wrapper.context.on("close", lambda _: pool.contexts.pop(key, None))
+        else:
+            self.stats.inc_value("browser_pool/context_reused")
+        self.context_wrappers[name] = wrapper
+        return wrapper
+
+    async def _create_page(self, request, spider):
+        slot = pool.domain_slot(urlparse_cached(request).hostname or "", self.max_pages_per_domain)
+        await slot.acquire()
+        try:
+            page = await super()._create_page(request, spider)
+        except Exception:
+            slot.release()
+            raise
+        released = False
+
+        def release_slot(_):
+            nonlocal released
+            if not released:
+                released = True
+                slot.release()
+
+        # A crashed page may never emit "close", which would hold its slot for the rest of the crawl
+        page.once("close", release_slot)
+        page.once("crash", release_slot)
+        return page
+
+    async def _close(self) -> None:
+        # Shared contexts and the browser are closed by the pool once its last user is done
+        self.context_wrappers.clear()
+        await pool.release()
+
+
+def peak_rss_mb() -> Optional[float]:
+    """RSS high-water mark of the crawler process"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+
+def children_rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Current RSS of every descendant process (the browser and its renderers); Linux only"""
+    if not os.path.isdir("/proc"):
+        return None
+    pid = pid or os.getpid()
+    parents: Dict[int, int] = {}
+    rss: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # The command name may contain spaces, so split after its closing parenthesis
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        parents[int(entry)] = int(fields[1])
+        rss[int(entry)] = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+
+    descendants = set()
+    frontier = [pid]
+    while frontier:
+        parent = frontier.pop()
+        children = [child for child, ppid in parents.items() if ppid == parent and child not in descendants]
+        descendants.update(children)
+        frontier.extend(children)
+    return round(sum(rss[child] for child in descendants) / (1024 * 1024), 2)
+
+
+class BrowserPoolStats:
+    """Extension that records browser pages per minute and peak RSS when a spider closes"""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.started = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        extension = cls(crawler.stats)
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+
+    def spider_closed(self, spider):
+        pages = self.stats.get_value("playwright/page_count")
+        if not pages or self.started is None:
+            return
+        minutes = (time.monotonic() - self.started) / 60
+        pages_per_minute = round(pages / minutes, 2) if minutes else None
+        blocked = self.stats.get_value("playwright/request_count/aborted", 0)
+        self.stats.set_value("browser_pool/pages_per_minute", pages_per_minute)
+        crawler_rss, browser_rss = peak_rss_mb(), children_rss_mb()
+        self.stats.set_value("browser_pool/crawler_peak_rss_mb", crawler_rss)
+        self.stats.set_value("browser_pool/browser_rss_mb", browser_rss)
+        spider.logger.info(f"🌐 {pages} browser pages ({pages_per_minute} pages/min), {blocked} requests blocked, "
+                           f"RSS {crawler_rss} MB crawler peak / {browser_rss} MB browser")
+
+
+SMOKE_PAGE = """<html><head><title>Smoke page {name}</title>
+<script src="https://www.google-analytics.com/analytics.js"></script></head>
+<body><h1>Part {name}</h1><img src="/images/{name}.png"><script>document.title += " rendered";</script></body></html>"""
+
+
+def serve_smoke_pages():
+    """Local HTTP server for the smoke test; counts the image requests that got through"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import threading
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/images/"):
+                self.server.image_requests += 1
+                body, content_type = b"\x89PNG\r\n\x1a\n", "image/png"
+            else:
+                body, content_type = SMOKE_PAGE.format(name=self.path.rsplit("/", 1)[-1]).encode(), "text/html"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.image_requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def smoke(pages: int = 10, spiders: int = 2, overrides: Optional[List[str]] = None) -> bool:
+    """Crawl local pages with several spiders through the shared pool and a real browser; True if it all worked"""
+    import scrapy
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.settings import Settings
+
+    class SmokeSpider(scrapy.Spider):
+        name = "browser_pool_smoke"
+
+        def __init__(self, base_url, pages, label, **kwargs):
+            super().__init__(**kwargs)
+            self.base_url, self.pages, self.label = base_url, pages, label
+
+        def start_requests(self):
+            for n in range(self.pages):
+                yield scrapy.Request(f"{self.base_url}/pages/{self.label}-{n}", meta={"playwright": True})
+
+        def parse(self, response):
+            yield {"url": response.url, "title": response.css("title::text").get()}
+
+    server = serve_smoke_pages()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    # No project middlewares or pipelines: the smoke test must not touch the catalog or crawl state
+    settings = Settings({
+        "DOWNLOAD_HANDLERS": {"http": "app.browser_pool.SharedBrowserDownloadHandler",
+                              "https": "app.browser_pool.SharedBrowserDownloadHandler"},
+        "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
+        "PLAYWRIGHT_ABORT_REQUEST": "app.browser_pool.should_abort_request",
+        "PLAYWRIGHT_LAUNCH_OPTIONS": {"headless": True, "args": ["--no-sandbox", "--disable-dev-shm-usage"]},
+        "EXTENSIONS": {"app.browser_pool.BrowserPoolStats": 500},
+        "ROBOTSTXT_OBEY": False,
+        "LOG_LEVEL": "WARNING",
+    })
+    for override in overrides or []:
+        name, _, value = override.partition("=")
+        settings.set(name, value, priority="cmdline")
+
+    rss_before = peak_rss_mb()
+    process = CrawlerProcess(settings)
+    crawlers = [process.create_crawler(SmokeSpider) for _ in range(spiders)]
+    for label, crawler in enumerate(crawlers):
+        process.crawl(crawler, base_url=base_url, pages=pages, label=label)
+    process.start()
+    server.shutdown()
+
+    ok = server.image_requests == 0
+    for label, crawler in enumerate(crawlers):
+        stats = crawler.stats
+        items = stats.get_value("item_scraped_count", 0)
+        ok = ok and items == pages
+        print(f"🌐 spider {label}: {items}/{pages} pages, {stats.get_value('browser_pool/pages_per_minute')} pages/min, "
+              f"{stats.get_value('playwright/request_count/aborted', 0)} requests blocked, "
+              f"contexts reused {stats.get_value('browser_pool/context_reused', 0)} times")
+    print(f"📈 RSS {rss_before} MB before, {peak_rss_mb()} MB crawler peak, "
+          f"{crawlers[-1].stats.get_value('browser_pool/browser_rss_mb')} MB browser; "
+          f"{server.image_requests} image requests reached the server")
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run Playwright spiders in one process so they share the browser pool")
+    parser.add_argument("command", choices=["crawl", "smoke"])
+    parser.add_argument("spiders", nargs="*", help="crawl: spider names")
+    parser.add_argument("-s", "--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a Scrapy setting")
+    parser.add_argument("--pages", type=int, default=10, help="smoke: pages per spider")
+    parser.add_argument("--spiders", dest="spider_count", type=int, default=2, help="smoke: spiders sharing the pool")
+    args = parser.parse_args(argv)
+
+    if args.command == "smoke":
+        if not smoke(args.pages, args.spider_count, args.set):
+            sys.exit("❌ Browser pool smoke test failed")
+        print("✅ Browser pool smoke test passed")
+        return
+    if not args.spiders:
+        parser.error("crawl needs at least one spider name")
+
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+    for override in args.set:
+        name, _, value = override.partition("=")
+        settings.set(name, value, priority="cmdline")
+    process = CrawlerProcess(settings)
+    for name in args.spiders:
+        process.crawl(name)
+    process.start()
+
+
+if __name__ == "__main__":
+    main()
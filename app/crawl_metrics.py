@@ -0,0 +1,410 @@
+"""Live crawl metrics per spider and a history of crawl runs.
+
+The ``CrawlMetrics`` extension counts requests, responses, items, blocked
+responses and demo-data fallbacks, and keeps histograms of response
+latency, parse time per page (``ParseTimingMiddleware``) and pipeline write
+latency (``RonaldoItemsPipeline``). Every few seconds it writes a snapshot
+to ``METRICS_DIR/<spider>-<pid>.json``; the API serves the snapshots of all
+crawler processes in the Prometheus text format at ``/api/metrics``. When
+a spider closes, a summary row goes to the ``crawl_runs`` table:
+
+    python -m app.crawl_metrics history --spider ebay
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from app.database import Base, SessionLocal, engine
+from app.models import CrawlRun
+
+DEFAULT_METRICS_DIR = "crawl_state/metrics"
+DEFAULT_SNAPSHOT_INTERVAL = 5.0
+# Snapshots stay on /metrics this long after their last update, so finished
+# crawls remain visible for a while and killed ones eventually drop off
+SNAPSHOT_TTL = 3600
+
+BLOCK_STATUSES = {403, 429, 503}
+COUNTERS = ("requests", "responses", "items", "blocked", "fallback")
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PARSE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+WRITE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+HISTOGRAMS = {
+    "response_latency_seconds": LATENCY_BUCKETS,
+    "parse_seconds": PARSE_BUCKETS,
+    "pipeline_write_seconds": WRITE_BUCKETS,
+}
+
+
+class Histogram:
+    """Observation counts per upper bucket bound, the last bucket being +Inf"""
+
+    def __init__(self, buckets: Iterable[float], counts: Optional[List[int]] = None, total: float = 0.0):
+        self.buckets = tuple(buckets)
+        self.counts = list(counts) if counts else [0] * (len(self.buckets) + 1)
+        self.sum = total
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, value: float) -> None:
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.sum += value
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating within its bucket, as Prometheus does"""
+        count = self.count
+        if not count:
+            return None
+        rank = q * count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def to_dict(self) -> dict:
+        return {"buckets": list(self.buckets), "counts": self.counts, "sum": self.sum}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        return cls(data["buckets"], data["counts"], data["sum"])
+
+
+class SpiderMetrics:
+    """Counters and histograms of one spider in this process; safe to update from the writer thread"""
+
+    def __init__(self, spider_name: str):
+        self.spider = spider_name
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Start over, keeping this object, which pipelines and spiders may already hold"""
+        with self.lock:
+            self.started = time.time()
+            self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+            self.histograms = {name: Histogram(buckets) for name, buckets in HISTOGRAMS.items()}
+
+    def inc(self, counter: str, count: int = 1) -> None:
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + count
+
+    def observe(self, histogram: str, value: float) -> None:
+        with self.lock:
+            self.histograms[histogram].observe(value)
+
+    def snapshot(self, finished: bool = False) -> dict:
+        with self.lock:
+            elapsed = max(time.time() - self.started, 1e-9)
+            return {
+                "spider": self.spider,
+                "pid": os.getpid(),
+                "started": self.started,
+                "updated": time.time(),
+                "finished": finished,
+                "counters": dict(self.counters),
+                "requests_per_second": round(self.counters["requests"] / elapsed, 3),
+                "items_per_second": round(self.counters["items"] / elapsed, 3),
+                "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+            }
+
+
+# Metrics of the spiders running in this process, by spider name
+registry: Dict[str, SpiderMetrics] = {}
+
+
+def metrics_for(spider_name: str) -> SpiderMetrics:
+    if spider_name not in registry:
+        registry[spider_name] = SpiderMetrics(spider_name)
+    return registry[spider_name]
+
+
+def count_event(spider, event: str) -> None:
+    """Count a block or demo-data fallback of a spider, also in its crawl stats"""
+    metrics_for(spider.name).inc(event)
+    crawler = getattr(spider, "crawler", None)
+    if crawler is not None and crawler.stats is not None:
+        crawler.stats.inc_value(f"metrics/{event}")
+
+
+def snapshot_path(directory: str, spider_name: str, pid: Optional[int] = None) -> str:
+    return os.path.join(directory, f"{spider_name}-{pid or os.getpid()}.json")
+
+
+def write_snapshot(directory: str, snapshot: dict) -> None:
+    os.makedirs(directory, exist_ok=True)
+    path = snapshot_path(directory, snapshot["spider"], snapshot["pid"])
+    # Written aside and renamed so the API never reads a half-written file
+    with open(path + ".tmp", "w") as f:
+        json.dump(snapshot, f)
+    os.replace(path + ".tmp", path)
+
+
+def load_snapshots(directory: str = DEFAULT_METRICS_DIR, now: Optional[float] = None) -> List[dict]:
+    """Snapshots updated within SNAPSHOT_TTL"""
+    now = now or time.time()
+    snapshots = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if now - snapshot.get("updated", 0) > SNAPSHOT_TTL:
+            continue
+        snapshots.append(snapshot)
+    return snapshots
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+def _bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def render_prometheus(snapshots: Iterable[dict]) -> str:
+    """Prometheus text exposition of the snapshots, summed per spider across crawler processes"""
+    spiders: Dict[str, dict] = {}
+    for snapshot in snapshots:
+        merged = spiders.setdefault(snapshot["spider"], {
+            "counters": dict.fromkeys(COUNTERS, 0), "running": 0,
+            "requests_per_second": 0.0, "items_per_second": 0.0, "histograms": {},
+        })
+        for counter, value in snapshot["counters"].items():
+            merged["counters"][counter] = merged["counters"].get(counter, 0) + value
+        if not snapshot.get("finished"):
+            merged["running"] += 1
+            merged["requests_per_second"] += snapshot["requests_per_second"]
+            merged["items_per_second"] += snapshot["items_per_second"]
+        for name, data in snapshot["histograms"].items():
+            histogram = Histogram.from_dict(data)
+            if name in merged["histograms"]:
+                merged["histograms"][name].merge(histogram)
+            else:
+                merged["histograms"][name] = histogram
+
+    lines = []
+    for counter in COUNTERS:
+        lines.append(f"# TYPE crawler_{counter}_total counter")
+        lines += [f"crawler_{counter}_total{_labels(spider=spider)} {merged['counters'][counter]}"
+                  for spider, merged in sorted(spiders.items())]
+    for gauge in ("running", "requests_per_second", "items_per_second"):
+        lines.append(f"# TYPE crawler_{gauge} gauge")
+        lines += [f"crawler_{gauge}{_labels(spider=spider)} {merged[gauge]}" for spider, merged in sorted(spiders.items())]
+    for name in HISTOGRAMS:
+        lines.append(f"# TYPE crawler_{name} histogram")
+        for spider, merged in sorted(spiders.items()):
+            histogram = merged["histograms"].get(name)
+            if histogram is None:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(histogram.buckets) + [float("inf")], histogram.counts):
+                cumulative += count
+                lines.append(f"crawler_{name}_bucket{_labels(spider=spider, le=_bound(bound))} {cumulative}")
+            lines.append(f"crawler_{name}_sum{_labels(spider=spider)} {round(histogram.sum, 6)}")
+            lines.append(f"crawler_{name}_count{_labels(spider=spider)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+def _round(value: Optional[float], digits: int = 4) -> Optional[float]:
+    return round(value, digits) if value is not None else None
+
+
+class CrawlMetrics:
+    """Extension that collects a spider's metrics, snapshots them for /metrics and records the run"""
+
+    def __init__(self, crawler, directory: str = DEFAULT_METRICS_DIR,
+                 interval: float = DEFAULT_SNAPSHOT_INTERVAL, session_factory=SessionLocal):
+        self.crawler = crawler
+        self.directory = directory
+        self.interval = interval
+        self.session_factory = session_factory
+        self.metrics: Optional[SpiderMetrics] = None
+        self.loop = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("METRICS_ENABLED", True):
+            raise NotConfigured
+        extension = cls(
+            crawler,
+            directory=crawler.settings.get("METRICS_DIR") or DEFAULT_METRICS_DIR,
+            interval=crawler.settings.getfloat("METRICS_SNAPSHOT_INTERVAL", DEFAULT_SNAPSHOT_INTERVAL),
+        )
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.request_reached_downloader, signal=signals.request_reached_downloader)
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        crawler.signals.connect(extension.item_scraped, signal=signals.item_scraped)
+        return extension
+
+    def spider_opened(self, spider):
+        # A fresh set per run, reset in place: Scrapy opens item pipelines before spider_opened is sent,
+        # so the pipeline may already have looked it up through metrics_for()
+        self.metrics = metrics_for(spider.name)
+        self.metrics.reset()
+        for path in glob.glob(os.path.join(self.directory, f"{spider.name}-*.json")):
+            try:
+                with open(path) as f:
+                    finished = json.load(f).get("finished")
+            except (OSError, ValueError):
+                finished = True
+            if finished:
+                os.remove(path)
+        if self.interval > 0:
+            self.loop = task.LoopingCall(self.write_snapshot)
+            self.loop.start(self.interval, now=True)
+
+    def write_snapshot(self, finished: bool = False) -> dict:
+        snapshot = self.metrics.snapshot(finished=finished)
+        try:
+            write_snapshot(self.directory, snapshot)
+        except OSError as e:
+            self.crawler.spider.logger.warning(f"⚠️ Could not write metrics snapshot: {e}")
+        return snapshot
+
+    def request_reached_downloader(self, request, spider):
+        self.metrics.inc("requests")
+
+    def response_received(self, response, request, spider):
+        self.metrics.inc("responses")
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            self.metrics.observe("response_latency_seconds", latency)
+        if response.status in BLOCK_STATUSES:
+            self.metrics.inc("blocked")
+
+    def item_scraped(self, item, response, spider):
+        self.metrics.inc("items")
+
+    def spider_closed(self, spider, reason="finished"):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        snapshot = self.write_snapshot(finished=True)
+        run = self.record_run(snapshot, reason)
+        spider.logger.info(f"📊 {run.requests} requests ({run.requests_per_second}/s), {run.items} items "
+                           f"({run.items_per_second}/s), latency p95 {run.latency_p95}s, "
+                           f"{run.blocked} blocked, {run.fallback} fallbacks")
+
+    def record_run(self, snapshot: dict, reason: str) -> CrawlRun:
+        histograms = {name: Histogram.from_dict(data) for name, data in snapshot["histograms"].items()}
+        counters = snapshot["counters"]
+        run = CrawlRun(
+            spider=snapshot["spider"],
+            started_at=datetime.datetime.utcfromtimestamp(snapshot["started"]),
+            finished_at=datetime.datetime.utcfromtimestamp(snapshot["updated"]),
+            finish_reason=reason,
+            duration_seconds=round(snapshot["updated"] - snapshot["started"], 2),
+            requests=counters["requests"],
+            responses=counters["responses"],
+            items=counters["items"],
+            blocked=counters["blocked"],
+            fallback=counters["fallback"],
+            requests_per_second=snapshot["requests_per_second"],
+            items_per_second=snapshot["items_per_second"],
+            latency_p50=_round(histograms["response_latency_seconds"].quantile(0.5)),
+            latency_p95=_round(histograms["response_latency_seconds"].quantile(0.95)),
+            parse_p95=_round(histograms["parse_seconds"].quantile(0.95), 6),
+            write_p95=_round(histograms["pipeline_write_seconds"].quantile(0.95), 6),
+        )
+        db = self.session_factory()
+        try:
+            Base.metadata.create_all(bind=db.get_bind(), tables=[CrawlRun.__table__])
+            db.add(run)
+            db.commit()
+            db.refresh(run)
+            db.expunge(run)
+        finally:
+            db.close()
+        return run
+
+
+class ParseTimingMiddleware:
+    """Spider middleware, closest to the spider, that times the callback's work per response"""
+
+    def process_spider_output(self, response, result, spider):
+        elapsed = 0.0
+        iterator = iter(result)
+        while True:
+            started = time.perf_counter()
+            try:
+                entry = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - started
+            yield entry
+        metrics_for(spider.name).observe("parse_seconds", elapsed)
+
+    async def process_spider_output_async(self, response, result, spider):
+        elapsed = 0.0
+        iterator = result.__aiter__()
+        while True:
+            started = time.perf_counter()
+            try:
+                entry = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - started
+            yield entry
+        metrics_for(spider.name).observe("parse_seconds", elapsed)
+
+
+def _seconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value}s"
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Crawl metrics and run history")
+    parser.add_argument("command", choices=["history", "live"])
+    parser.add_argument("--spider", help="only runs of this spider")
+    parser.add_argument("--limit", type=int, default=20, help="history: number of runs to show")
+    parser.add_argument("--dir", default=DEFAULT_METRICS_DIR, help="live: metrics snapshot directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "live":
+        snapshots = [s for s in load_snapshots(args.dir) if not args.spider or s["spider"] == args.spider]
+        print(render_prometheus(snapshots), end="")
+        return
+
+    Base.metadata.create_all(bind=engine, tables=[CrawlRun.__table__])
+    db = SessionLocal()
+    try:
+        query = db.query(CrawlRun)
+        if args.spider:
+            query = query.filter(CrawlRun.spider == args.spider)
+        for run in query.order_by(CrawlRun.started_at.desc()).limit(args.limit):
+            print(f"🕷️ {run.started_at:%Y-%m-%d %H:%M} {run.spider} ({run.finish_reason}, {run.duration_seconds}s): "
+                  f"{run.requests_per_second} req/s, {run.items_per_second} items/s, "
+                  f"latency p50/p95 {_seconds(run.latency_p50)}/{_seconds(run.latency_p95)}, "
+                  f"parse p95 {_seconds(run.parse_p95)}, write p95 {_seconds(run.write_p95)}, "
+                  f"{run.blocked} blocked, {run.fallback} fallbacks")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""Resumable crawls: a persistent request queue and dupefilter per spider.
+
+Scrapy's ``JOBDIR`` only writes its queue state when a spider closes
+cleanly, so a crawl killed with ``kill -9`` or by a container restart
+starts over from ``start_requests``. ``ResumableScheduler`` keeps every
+scheduled request in a SQLite table under ``CRAWL_STATE_DIR/<spider>/``
+instead, committed as it is enqueued. The same table records request
+fingerprints, so it is also the persistent dupefilter. A request is only
+marked done once its callback output has been consumed
+(``CrawlStateMiddleware``), so pages in flight when the process died are
+fetched again on resume.
+
+Every crawl records its state; a new crawl starts from scratch unless
+``CRAWL_STATE_RESUME`` is set:
+
+    scrapy crawl ebay -s CRAWL_STATE_RESUME=True
+    python run.py --resume
+"""
+import os
+import pickle
+import shutil
+import sqlite3
+from collections import deque
+from typing import Dict, Optional
+
+from scrapy.core.scheduler import BaseScheduler
+from scrapy.http import Request
+from scrapy.utils.request import request_from_dict
+
+DEFAULT_STATE_DIR = "crawl_state"
+STATE_FILE = "requests.db"
+STATE_ID_META = "crawl_state_id"
+
+QUEUED = "queued"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+
+
+class RequestStore:
+    """SQLite table of a spider's requests: its queue, in-flight set and seen fingerprints"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30)
+        # WAL keeps each commit durable across a killed process without a full fsync per request
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                unique_fingerprint TEXT UNIQUE,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                session INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS ix_requests_queue ON requests (status, priority DESC, id)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS ix_requests_fingerprint ON requests (fingerprint, status)")
+        self.db.commit()
+        previous = self.db.execute("SELECT MAX(session) FROM requests").fetchone()[0]
+        self.session = (previous or 0) + 1
+
+    def requeue_in_flight(self) -> int:
+        """Put requests that were being fetched when the last run died back in the queue"""
+        cursor = self.db.execute("UPDATE requests SET status = ? WHERE status = ?", (QUEUED, IN_FLIGHT))
+        self.db.commit()
+        return cursor.rowcount
+
+    def earlier_status(self, fingerprint: str) -> Optional[str]:
+        """DONE if a previous run's request was completed, QUEUED if it is still queued or being fetched, else None"""
+        rows = self.db.execute(
+            "SELECT DISTINCT status FROM requests WHERE fingerprint = ? AND session < ?",
+            (fingerprint, self.session),
+        ).fetchall()
+        statuses = {row[0] for row in rows}
+        if DONE in statuses:
+            return DONE
+        return QUEUED if statuses else None
+
+    def add(self, fingerprint: str, priority: int, data: bytes, unique: bool = True) -> bool:
+        """Queue a request; False if its fingerprint was already seen and it is not dont_filter"""
+        try:
+            self.db.execute(
+                "INSERT INTO requests (fingerprint, unique_fingerprint, priority, status, session, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (fingerprint, fingerprint if unique else None, priority, QUEUED, self.session, data),
+            )
+        except sqlite3.IntegrityError:
+            return False
+        self.db.commit()
+        return True
+
+    def seen(self, fingerprint: str) -> bool:
+        return self.db.execute("SELECT 1 FROM requests WHERE unique_fingerprint = ?", (fingerprint,)).fetchone() is not None
+
+    def pop(self) -> Optional[tuple]:
+        """The highest-priority queued request as (id, data), now marked in flight"""
+        row = self.db.execute(
+            "SELECT id, data FROM requests WHERE status = ? ORDER BY priority DESC, id LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if row:
+            self.db.execute("UPDATE requests SET status = ? WHERE id = ?", (IN_FLIGHT, row[0]))
+            self.db.commit()
+        return row
+
+    def done(self, request_id: int) -> None:
+        self.db.execute("UPDATE requests SET status = ? WHERE id = ?", (DONE, request_id))
+        self.db.commit()
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self.db.execute("SELECT status, COUNT(*) FROM requests GROUP BY status").fetchall())
+
+    def pending(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM requests WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def state_dir(settings, spider_name: str) -> str:
+    return os.path.join(settings.get("CRAWL_STATE_DIR") or DEFAULT_STATE_DIR, spider_name)
+
+
+class ResumableScheduler(BaseScheduler):
+    """Scheduler whose queue and seen fingerprints survive the crawler process being killed.
+
+    Requests that cannot be serialized (e.g. with a lambda callback) are kept
+    in memory as with Scrapy's default scheduler and are not resumable.
+    """
+
+    # Request meta holding the stored row; CrawlStateMiddleware strips it from requests the spider yields
+    id_meta = STATE_ID_META
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.settings = crawler.settings
+        self.resume = crawler.settings.getbool("CRAWL_STATE_RESUME")
+        self.memory = deque()
+        self.store: Optional[RequestStore] = None
+        self.spider = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def open(self, spider):
+        self.spider = spider
+        directory = state_dir(self.settings, spider.name)
+        if not self.resume and os.path.isdir(directory):
+            shutil.rmtree(directory)
+        self.store = RequestStore(os.path.join(directory, STATE_FILE))
+        if self.resume:
+            requeued = self.store.requeue_in_flight()
+            pending = self.store.pending()
+            self.stats.set_value("crawl_state/resumed_requests", pending)
+            spider.logger.info(f"♻️ Resuming {spider.name}: {pending} queued requests ({requeued} were in flight)")
+
+    def close(self, reason):
+        if self.store:
+            counts = self.store.counts()
+            self.spider.logger.info(f"💾 Crawl state for {self.spider.name}: {counts}")
+            self.store.close()
+            self.store = None
+
+    def has_pending_requests(self) -> bool:
+        return bool(self.memory) or self.store.pending() > 0
+
+    def _fingerprint(self, request) -> str:
+        return self.crawler.request_fingerprinter.fingerprint(request).hex()
+
+    def enqueue_request(self, request) -> bool:
+        # A retry or redirect of a stored request carries its id; the new row takes over its work
+        replaces_stored = request.meta.get(STATE_ID_META) is not None
+        self.mark_done(request)
+        fingerprint = self._fingerprint(request)
+        if request.dont_filter:
+            # Start requests are often dont_filter; a resumed run skips the ones already done and
+            # the ones still in the saved queue, which it fetches from there
+            status = self.store.earlier_status(fingerprint) if self.resume and not replaces_stored else None
+            if status == DONE:
+                self.stats.inc_value("crawl_state/skipped_completed")
+                return False
+            if status == QUEUED:
+                self.stats.inc_value("crawl_state/skipped_queued")
+                return False
+        elif self.store.seen(fingerprint):
+            self.stats.inc_value("dupefilter/filtered")
+            return False
+
+        try:
+            data = pickle.dumps(request.to_dict(spider=self.spider), protocol=4)
+        except Exception:
+            self.stats.inc_value("crawl_state/unserializable")
+            self.memory.append(request)
+            self.stats.inc_value("scheduler/enqueued/memory")
+            return True
+
+        if not self.store.add(fingerprint, request.priority, data, unique=not request.dont_filter):
+            self.stats.inc_value("dupefilter/filtered")
+            return False
+        self.stats.inc_value("scheduler/enqueued/disk")
+        return True
+
+    def next_request(self):
+        if self.memory:
+            self.stats.inc_value("scheduler/dequeued/memory")
+            return self.memory.popleft()
+        row = self.store.pop()
+        if row is None:
+            return None
+        request_id, data = row
+        request = request_from_dict(pickle.loads(data), spider=self.spider)
+        request.meta[STATE_ID_META] = request_id
+        self.stats.inc_value("scheduler/dequeued/disk")
+        return request
+
+    def mark_done(self, request) -> None:
+        request_id = request.meta.get(STATE_ID_META)
+        if request_id is not None and self.store:
+            self.store.done(request_id)
+
+
+class CrawlStateMiddleware:
+    """Spider middleware that marks a request done once its callback output has been consumed"""
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _scheduler(self):
+        engine = self.crawler.engine
+        # The engine slot is public in older Scrapy releases and private in newer ones
+        slot = getattr(engine, "slot", None) or getattr(engine, "_slot", None)
+        return getattr(slot, "scheduler", None)
+
+    def _mark_done(self, response) -> None:
+        scheduler = self._scheduler()
+        # Also used by the shared frontier's scheduler (app.frontier)
+        if hasattr(scheduler, "mark_done") and response.request is not None:
+            scheduler.mark_done(response.request)
+
+    def _detach(self, entry):
+        """Drop the scheduler's row id from a request the spider built, e.g. with meta=response.meta.
+
+        Only retries and redirects, which the downloader builds from the request
+        itself, may carry it; on anything else the scheduler would mark the
+        parent done (or replace it) when the child is enqueued.
+        """
+        id_meta = getattr(self._scheduler(), "id_meta", None)
+        if id_meta and isinstance(entry, Request) and id_meta in entry.meta:
+            del entry.meta[id_meta]
+        return entry
+
+    def process_spider_output(self, response, result, spider):
+        for entry in result:
+            yield self._detach(entry)
+        self._mark_done(response)
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for entry in result:
+            yield self._detach(entry)
+        self._mark_done(response)
+
+    def process_spider_exception(self, response, exception, spider):
+        # A callback that raised would raise again on resume
+        self._mark_done(response)
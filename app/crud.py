@@ -1,3 +1,4 @@
+import datetime
 from sqlalchemy.orm import Session
 from . import models
 
@@ -117,3 +118,61 @@ def get_story(db: Session, story_id: int):
 def get_stories_by_filter(db: Session, era: str | None = None, team: str | None = None, limit: int = 10):
     """Helper function for story generator"""
     return get_stories(db, era=era, team=team, limit=limit)
+
+def get_ranked_stories(db: Session, era: str | None = None, team: str | None = None,
+                       category: str | None = None, limit: int = 10):
+    """Stories the warmup ranked for this filter, best first; None if it ranked none"""
+    ranking = db.query(models.StoryRanking).filter(
+        models.StoryRanking.era == (era or ""),
+        models.StoryRanking.team == (team or ""),
+        models.StoryRanking.category == (category or ""),
+    ).first()
+    if ranking is None:
+        return None
+    ids = [int(story_id) for story_id in ranking.story_ids.split(",") if story_id][:limit]
+    stories = {story.id: story for story in db.query(models.Story).filter(models.Story.id.in_(ids))}
+    return [stories[story_id] for story_id in ids if story_id in stories]
+
+def save_story_ranking(db: Session, era: str | None, team: str | None, category: str | None, story_ids: list[int]):
+    key = {"era": era or "", "team": team or "", "category": category or ""}
+    ranking = db.query(models.StoryRanking).filter_by(**key).first()
+    if ranking is None:
+        ranking = models.StoryRanking(**key)
+        db.add(ranking)
+    ranking.story_ids = ",".join(str(story_id) for story_id in story_ids)
+    ranking.ranked_at = datetime.datetime.utcnow()
+    db.commit()
+    return ranking
+
+def get_crawl_runs(db: Session, spider: str | None = None, skip: int = 0, limit: int = 50):
+    query = db.query(models.CrawlRun)
+    if spider:
+        query = query.filter(models.CrawlRun.spider == spider)
+    return query.order_by(models.CrawlRun.started_at.desc()).offset(skip).limit(limit).all()
+
+def get_story_warmup_runs(db: Session, skip: int = 0, limit: int = 50):
+    return (db.query(models.StoryWarmupRun).order_by(models.StoryWarmupRun.started_at.desc())
+            .offset(skip).limit(limit).all())
+
+# Bulk upserts (used by the ingest log loader)
+def bulk_upsert(db: Session, model, key_field: str, rows: list[dict]):
+    """Insert or update rows keyed on a unique column with a single commit for the batch"""
+    column = getattr(model, key_field)
+    keys = {row.get(key_field, '') for row in rows}
+    existing = {getattr(obj, key_field): obj for obj in db.query(model).filter(column.in_(keys)).all()}
+
+    for row in rows:
+        key = row.get(key_field, '')
+        db_obj = existing.get(key)
+        if db_obj:
+            # Update existing row with new data
+            for field, value in row.items():
+                if hasattr(db_obj, field):
+                    setattr(db_obj, field, value)
+        else:
+            db_obj = model(**row)
+            db.add(db_obj)
+            existing[key] = db_obj
+
+    db.commit()
+    return len(rows)
@@ -0,0 +1,417 @@
+"""Bulk AI description enrichment for items.
+
+Items whose English or Hebrew description is missing, or was generated
+from a title, era, category or prompt that has since changed, get new
+descriptions from Gemini, with a SerpApi snippet as context when
+``SERPAPI_KEY`` is set. Up to ``--concurrency`` items are described at
+once and every provider is held to its requests-per-minute limit through
+``app.rate_limit``, shared with the API and other runs; these calls have
+bulk priority, so story generation for API requests goes first. Results
+are committed every ``--batch-size`` items together with a per-item record
+in ``item_descriptions``, which is the job's checkpoint: an interrupted run
+loses at most one batch, and the next run only picks up what is still
+missing, stale or failed.
+
+By default up to ``--items-per-prompt`` items, within an estimated token
+budget, are described by one structured-JSON request; entries that come
+back missing or invalid are retried one item at a time with the
+single-item prompts.
+
+    python -m app.descriptions                 # describe everything that needs it
+    python -m app.descriptions --dry-run       # only count it
+    python -m app.descriptions --rpm 1000 --concurrency 32
+"""
+import argparse
+import asyncio
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import yaml
+
+from app.database import Base, SessionLocal, engine
+from app.llm import LLMUnavailable, create_model
+from app.llm_cache import cached_model, forget_response
+from app.models import Item, ItemDescription
+from app.rate_limit import BULK, SharedLimiter, default_limiter
+
+try:
+    from serpapi import GoogleSearch
+except ImportError:
+    GoogleSearch = None
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_ITEMS_PER_PROMPT = 10
+# Estimated prompt plus answer tokens per batched request; Gemini Flash answers at most 8192 tokens
+DEFAULT_PROMPT_TOKEN_BUDGET = 8000
+# A Hebrew and an English description of the prompted lengths, in tokens
+ANSWER_TOKENS_PER_ITEM = 700
+BATCH_PROMPT_TOKENS = 400
+MIN_DESCRIPTION_EN_CHARS = 80
+MIN_DESCRIPTION_HE_CHARS = 150
+HEBREW_LETTERS = re.compile(r"[\u05d0-\u05ea]")
+# Gemini's free tier allows 15 requests per minute; raise it for a paid key
+DEFAULT_REQUESTS_PER_MINUTE = float(os.environ.get("GEMINI_RPM", 15))
+DEFAULT_SEARCH_REQUESTS_PER_MINUTE = float(os.environ.get("SERPAPI_RPM", 60))
+DEFAULT_BATCH_SIZE = 25
+DEFAULT_MAX_ATTEMPTS = 3
+PAGE_SIZE = 500
+RETRIES = 2
+RETRY_BACKOFF_SECONDS = 5.0
+
+DONE = "done"
+FAILED = "failed"
+# What the old update_descriptions.py stored when Gemini failed
+FALLBACK_DESCRIPTION_HE = "תיאור מפורט אינו זמין כעת."
+
+
+def load_prompts(path: str = "prompts.yaml") -> Dict[str, str]:
+    with open(path, "r") as f:
+        config = yaml.safe_load(f)
+    return {
+        "model": config["gemini_model"],
+        "en": config["generate_english_description"],
+        "he": config["generate_hebrew_description"],
+        "batch": config.get("generate_batch_descriptions"),
+    }
+
+
+def input_hash(title: str, era: Optional[str], category: Optional[str], prompts: Dict[str, str]) -> str:
+    """Fingerprint of everything a description is generated from"""
+    data = json.dumps([title, era, category, prompts["model"], prompts["en"], prompts["he"]])
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+
+
+def needs_description(row, record: Optional[ItemDescription], digest: str, now: datetime.datetime,
+                      max_age: Optional[datetime.timedelta] = None, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> bool:
+    """Whether an item's descriptions are missing or stale"""
+    if record is not None and record.input_hash == digest and record.status == FAILED:
+        # Failures are retried a few times, then left alone until the item changes
+        return record.attempts < max_attempts
+    missing = (not row.description_en or not row.description_he
+               or row.description_he == FALLBACK_DESCRIPTION_HE or row.description_en == row.title_en)
+    if missing:
+        return True
+    if record is None:
+        # Written by the scraper, not generated, so there is nothing to go stale
+        return False
+    if record.input_hash != digest:
+        return True
+    return max_age is not None and record.updated_at is not None and now - record.updated_at > max_age
+
+
+def stale_items(db, prompts: Dict[str, str], now: datetime.datetime, max_age: Optional[datetime.timedelta] = None,
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Iterator[dict]:
+    """Items that need descriptions, read page by page in id order"""
+    last_id = 0
+    while True:
+        rows = (db.query(Item.id, Item.title_en, Item.era, Item.category, Item.description_en,
+                         Item.description_he, ItemDescription)
+                .outerjoin(ItemDescription, ItemDescription.item_id == Item.id)
+                .filter(Item.id > last_id)
+                .order_by(Item.id)
+                .limit(PAGE_SIZE)
+                .all())
+        if not rows:
+            return
+        for row in rows:
+            digest = input_hash(row.title_en, row.era, row.category, prompts)
+            if row.title_en and needs_description(row, row.ItemDescription, digest, now, max_age, max_attempts):
+                yield {"id": row.id, "title_en": row.title_en, "era": row.era,
+                       "category": row.category, "input_hash": digest}
+        last_id = rows[-1].id
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English
+    return len(text) // 4 + 1
+
+
+def prompt_batches(items: Iterable[dict], max_items: int = DEFAULT_ITEMS_PER_PROMPT,
+                   token_budget: int = DEFAULT_PROMPT_TOKEN_BUDGET) -> Iterator[List[dict]]:
+    """Group items into prompts of at most max_items whose estimated size stays within the token budget"""
+    batch: List[dict] = []
+    tokens = BATCH_PROMPT_TOKENS
+    for item in items:
+        cost = estimate_tokens(json.dumps([item["title_en"], item["era"], item["category"]])) + ANSWER_TOKENS_PER_ITEM
+        if batch and (len(batch) >= max_items or tokens + cost > token_budget):
+            yield batch
+            batch, tokens = [], BATCH_PROMPT_TOKENS
+        batch.append(item)
+        tokens += cost
+    if batch:
+        yield batch
+
+
+def valid_descriptions(description_en, description_he) -> bool:
+    return (isinstance(description_en, str) and isinstance(description_he, str)
+            and len(description_en.strip()) >= MIN_DESCRIPTION_EN_CHARS
+            and len(description_he.strip()) >= MIN_DESCRIPTION_HE_CHARS
+            and HEBREW_LETTERS.search(description_he) is not None)
+
+
+def parse_batch_answer(text: str) -> List[dict]:
+    """The list of entries in a batched answer, tolerating a markdown code fence or a wrapping object"""
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = next((value for value in data.values() if isinstance(value, list)), [data])
+    if not isinstance(data, list):
+        raise ValueError("batched answer is not a JSON list")
+    return [entry for entry in data if isinstance(entry, dict)]
+
+
+class GeminiDescriber:
+    """Writes English and Hebrew descriptions with Gemini, using a search snippet as context"""
+
+    def __init__(self, model, prompts: Dict[str, str], serpapi_key: Optional[str] = None,
+                 requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 search_requests_per_minute: float = DEFAULT_SEARCH_REQUESTS_PER_MINUTE,
+                 limiter: Optional[SharedLimiter] = None, priority: int = BULK):
+        self.model = model
+        self.prompts = prompts
+        self.serpapi_key = serpapi_key if GoogleSearch is not None else None
+        # Without a shared limiter the rates only hold within this process
+        self.limiter = limiter or SharedLimiter(None)
+        self.limiter.configure("gemini", requests_per_minute=requests_per_minute)
+        self.limiter.configure("serpapi", requests_per_minute=search_requests_per_minute)
+        self.priority = priority
+
+    async def search_context(self, item: dict) -> str:
+        query = item["title_en"]
+        if not self.serpapi_key:
+            return query
+        params = {"q": query, "engine": "google", "api_key": self.serpapi_key}
+        try:
+            async with self.limiter.slot_async("serpapi", self.priority):
+                results = await asyncio.to_thread(lambda: GoogleSearch(params).get_dict())
+        except Exception as e:
+            print(f"  ⚠️ SerpApi search failed for {query[:50]}: {e}")
+            return query
+        organic = results.get("organic_results") or []
+        return organic[0].get("snippet", query) if organic else query
+
+    async def generate(self, prompt: str, **options) -> str:
+        # Cached answers cost no request, so they need no rate-limit slot
+        if hasattr(self.model, "is_cached") and self.model.is_cached(prompt, **options):
+            response = await self.model.generate_content_async(prompt, **options)
+        else:
+            async with self.limiter.slot_async("gemini", self.priority):
+                if hasattr(self.model, "generate_content_async"):
+                    response = await self.model.generate_content_async(prompt, **options)
+                else:
+                    response = await asyncio.to_thread(self.model.generate_content, prompt, **options)
+        text = response.text.strip()
+        if not text:
+            raise ValueError("empty response")
+        return text
+
+    async def describe(self, item: dict) -> Tuple[str, str]:
+        context = await self.search_context(item)
+        fields = {"item_title": item["title_en"], "item_context": context,
+                  "era": item["era"] or "General", "category": item["category"] or "collectibles"}
+        description_en = await self.generate(self.prompts["en"].format(**fields))
+        description_he = await self.generate(self.prompts["he"].format(**fields))
+        return description_en, description_he
+
+    async def describe_batch(self, items: List[dict]) -> Dict[int, Tuple[str, str]]:
+        """Descriptions of several items from one JSON request, by item id; invalid entries are left out"""
+        contexts = await asyncio.gather(*[self.search_context(item) for item in items])
+        payload = [{"id": item["id"], "title": item["title_en"], "context": context,
+                    "era": item["era"] or "General", "category": item["category"] or "collectibles"}
+                   for item, context in zip(items, contexts)]
+        prompt = self.prompts["batch"].format(items_json=json.dumps(payload, ensure_ascii=False, indent=1))
+        options = {"generation_config": {"response_mime_type": "application/json"}}
+        answer = await self.generate(prompt, **options)
+        try:
+            entries = parse_batch_answer(answer)
+        except ValueError:
+            forget_response(self.model, prompt, **options)
+            raise
+        wanted = {item["id"] for item in items}
+        described = {}
+        for entry in entries:
+            try:
+                item_id = int(entry.get("id"))
+            except (TypeError, ValueError):
+                continue
+            description_en, description_he = entry.get("description_en"), entry.get("description_he")
+            if item_id in wanted and valid_descriptions(description_en, description_he):
+                described[item_id] = (description_en.strip(), description_he.strip())
+        if not described:
+            # Nothing usable; the next run should not get the same answer from the cache
+            forget_response(self.model, prompt, **options)
+        return described
+
+
+def gemini_describer(prompts: Dict[str, str], requests_per_minute: float, search_requests_per_minute: float):
+    try:
+        model = create_model(prompts["model"])
+    except LLMUnavailable as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    return GeminiDescriber(cached_model(model), prompts, os.environ.get("SERPAPI_KEY"),
+                           requests_per_minute, search_requests_per_minute, limiter=default_limiter())
+
+
+async def describe_with_retries(describer, item: dict) -> dict:
+    for attempt in range(RETRIES + 1):
+        try:
+            description_en, description_he = await describer.describe(item)
+            return {**item, "description_en": description_en, "description_he": description_he, "error": None}
+        except Exception as e:
+            if attempt == RETRIES:
+                return {**item, "error": f"{type(e).__name__}: {e}"[:500]}
+            await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+
+async def describe_group(describer, items: List[dict]) -> List[dict]:
+    """Describe items with one batched request where possible and one at a time for the rest"""
+    described: Dict[int, Tuple[str, str]] = {}
+    if len(items) > 1 and hasattr(describer, "describe_batch"):
+        for attempt in range(RETRIES + 1):
+            try:
+                described = await describer.describe_batch(items)
+                break
+            except Exception as e:
+                print(f"  ⚠️ Batched request for {len(items)} items failed: {type(e).__name__}: {e}")
+                if attempt < RETRIES:
+                    await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
+    results = [{**item, "description_en": described[item["id"]][0], "description_he": described[item["id"]][1],
+                "error": None} for item in items if item["id"] in described]
+    # Entries that were missing or failed validation get their own requests, one at a time so a
+    # worker never has more than one request in flight
+    for item in items:
+        if item["id"] not in described:
+            results.append(await describe_with_retries(describer, item))
+    return results
+
+
+def commit_batch(db, results: List[dict], now: datetime.datetime) -> None:
+    """Store a batch of descriptions and their checkpoint records in one transaction"""
+    for result in results:
+        record = db.get(ItemDescription, result["id"])
+        if record is None:
+            record = ItemDescription(item_id=result["id"], attempts=0)
+            db.add(record)
+        if record.input_hash != result["input_hash"]:
+            record.attempts = 0
+        record.input_hash = result["input_hash"]
+        record.updated_at = now
+        if result["error"]:
+            record.status = FAILED
+            record.attempts = (record.attempts or 0) + 1
+            record.error = result["error"]
+            continue
+        item = db.get(Item, result["id"])
+        if item is not None:
+            item.description_en = result["description_en"]
+            item.description_he = result["description_he"]
+        record.status = DONE
+        record.attempts = 0
+        record.error = None
+    db.commit()
+
+
+async def enrich(describer, prompts: Dict[str, str], session_factory=SessionLocal,
+                 concurrency: int = DEFAULT_CONCURRENCY, batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_age: Optional[datetime.timedelta] = None, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 limit: Optional[int] = None, items_per_prompt: int = DEFAULT_ITEMS_PER_PROMPT,
+                 prompt_token_budget: int = DEFAULT_PROMPT_TOKEN_BUDGET) -> Dict[str, int]:
+    """Describe every item that needs it; returns counts of described and failed items"""
+    if not prompts.get("batch") or not hasattr(describer, "describe_batch"):
+        items_per_prompt = 1
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    results: List[dict] = []
+    counts = {"described": 0, "failed": 0}
+
+    async def worker():
+        while True:
+            group = await queue.get()
+            if group is None:
+                return
+            results.extend(await describe_group(describer, group))
+
+    def flush():
+        if not results:
+            return
+        batch = results[:]
+        results.clear()
+        commit_batch(db, batch, datetime.datetime.utcnow())
+        failed = sum(1 for result in batch if result["error"])
+        counts["failed"] += failed
+        counts["described"] += len(batch) - failed
+        print(f"💾 Committed {len(batch)} items ({counts['described']} described, {counts['failed']} failed so far)")
+
+    db = session_factory()
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        Base.metadata.create_all(bind=db.get_bind(), tables=[ItemDescription.__table__])
+        items = itertools.islice(stale_items(db, prompts, datetime.datetime.utcnow(), max_age, max_attempts), limit)
+        for group in prompt_batches(items, items_per_prompt, prompt_token_budget):
+            await queue.put(group)
+            if len(results) >= batch_size:
+                flush()
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        # Keep whatever finished, also when the run is interrupted
+        flush()
+        db.close()
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate missing or stale item descriptions with Gemini")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="items described at once")
+    parser.add_argument("--rpm", type=float, default=DEFAULT_REQUESTS_PER_MINUTE, help="Gemini requests per minute")
+    parser.add_argument("--search-rpm", type=float, default=DEFAULT_SEARCH_REQUESTS_PER_MINUTE,
+                        help="SerpApi requests per minute")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="items per commit")
+    parser.add_argument("--max-age-days", type=float, help="also regenerate descriptions older than this")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="runs that may fail on an item before it is skipped")
+    parser.add_argument("--limit", type=int, help="describe at most this many items")
+    parser.add_argument("--items-per-prompt", type=int, default=DEFAULT_ITEMS_PER_PROMPT,
+                        help="items described by one batched request; 1 sends one request per description")
+    parser.add_argument("--prompt-token-budget", type=int, default=DEFAULT_PROMPT_TOKEN_BUDGET,
+                        help="estimated prompt and answer tokens per batched request")
+    parser.add_argument("--dry-run", action="store_true", help="only count the items that need descriptions")
+    args = parser.parse_args(argv)
+
+    prompts = load_prompts()
+    max_age = datetime.timedelta(days=args.max_age_days) if args.max_age_days else None
+    Base.metadata.create_all(bind=engine, tables=[ItemDescription.__table__])
+
+    if args.dry_run:
+        db = SessionLocal()
+        try:
+            count = sum(1 for _ in stale_items(db, prompts, datetime.datetime.utcnow(), max_age, args.max_attempts))
+        finally:
+            db.close()
+        print(f"📝 {count} items need descriptions")
+        return
+
+    describer = gemini_describer(prompts, args.rpm, args.search_rpm)
+    started = time.monotonic()
+    counts = asyncio.run(enrich(describer, prompts, concurrency=args.concurrency, batch_size=args.batch_size,
+                                max_age=max_age, max_attempts=args.max_attempts, limit=args.limit,
+                                items_per_prompt=args.items_per_prompt,
+                                prompt_token_budget=args.prompt_token_budget))
+    print(f"✅ Described {counts['described']} items, {counts['failed']} failed, "
+          f"in {time.monotonic() - started:.0f}s")
+    if hasattr(describer.model, "hits"):
+        print(f"📦 Gemini cache: {describer.model.hits} hits, {describer.model.misses} misses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Shared title-attribute extraction for spiders, categorization and reprocessing.
+
+Every keyword is indexed by its first word in one phrase table, so a single
+pass over a title's words yields its era, year, size, condition, item
+category and part category together.
+
+Reprocess the stored catalog after changing the rules:
+
+    python -m app.extraction reprocess            # update items in place
+    python -m app.extraction reprocess --dry-run  # only count what would change
+"""
+import argparse
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Team for each Ronaldo career era
+TEAMS = {
+    "Sporting": "Sporting CP",
+    "United": "Manchester United",
+    "Madrid": "Real Madrid",
+    "Juventus": "Juventus",
+    "Portugal": "Portugal National Team",
+    "Al-Nassr": "Al-Nassr",
+}
+
+ERA_KEYWORDS = {
+    "Sporting": ["sporting cp", "sporting lisbon", "sporting"],
+    "United": ["manchester united", "man united", "man utd", "mufc"],
+    "Madrid": ["real madrid"],
+    "Juventus": ["juventus", "juve"],
+    "Portugal": ["portugal"],
+    "Al-Nassr": ["al nassr", "al-nassr", "alnassr"],
+}
+
+# The order matters; when several conditions are mentioned the first listed wins
+CONDITION_KEYWORDS = {
+    "New": ["brand new", "new"],
+    "Used": ["pre-owned", "used"],
+    "Vintage": ["vintage", "retro"],
+    "Replica": ["replica", "fake"],
+}
+EBAY_CONDITIONS = ("New", "Used", "Vintage")
+ALIEXPRESS_CONDITIONS = ("New", "Used", "Replica")
+
+# Item categories; the order matters, e.g. a signed jersey is a signed item
+ITEM_CATEGORY_KEYWORDS = {
+    "signed_items": ["autographed", "autograph", "signed"],
+    "cards": ["trading card", "card", "topps", "panini"],
+    "boots": ["boots", "cleats", "shoes"],
+    "jerseys": ["jersey", "shirt", "kit"],
+}
+
+# Part categories; the order matters, more specific categories come first
+PART_CATEGORIES = {
+    "Lighting": ["light", "headlight", "taillight", "blinker", "fog"],
+    "Wheels & Suspension": ["wheel", "suspension", "tie rod", "strut", "hub", "control arm"],
+    "Interior": ["trim", "handle", "knob", "button", "switch", "console", "dash", "seat", "carpet", "shifter"],
+    "Exterior": ["bumper", "grille", "fender", "door", "mirror", "spoiler", "seal", "decal"],
+    "Electronics": ["sensor", "camera", "radio", "computer", "obc", "harness", "actuator"],
+    "Mechanical": ["engine", "radiator", "transmission", "brake", "exhaust", "pump", "thermostat", "filter"],
+}
+
+WORD_PATTERN = re.compile(r"\w+")
+SIZES = {"xs", "s", "m", "l", "xl", "xxl", "xxxl"}
+APOSTROPHES = "'’"
+
+
+def _build_phrase_index() -> Dict[str, List[Tuple[Tuple[str, ...], str, str]]]:
+    """Map the first word of every keyword to its (words, field, label) entries, longest first"""
+    index: Dict[str, List[Tuple[Tuple[str, ...], str, str]]] = {}
+    for field, table in (("era", ERA_KEYWORDS), ("condition", CONDITION_KEYWORDS),
+                         ("category", ITEM_CATEGORY_KEYWORDS), ("part_category", PART_CATEGORIES)):
+        for label, keywords in table.items():
+            for keyword in keywords:
+                words = tuple(WORD_PATTERN.findall(keyword.lower()))
+                index.setdefault(words[0], []).append((words, field, label))
+    for entries in index.values():
+        # So "brand new" wins over "new" at the same position
+        entries.sort(key=lambda entry: len(entry[0]), reverse=True)
+    return index
+
+
+PHRASES = _build_phrase_index()
+
+
+def scan_title(title: str) -> Dict[str, List[str]]:
+    """Every attribute mentioned in a title, per field in title order, from one pass over its words"""
+    found: Dict[str, List[str]] = {"era": [], "year": [], "size": [], "condition": [], "category": [], "part_category": []}
+    lowered = title.lower() if title else ""
+    matches = list(WORD_PATTERN.finditer(lowered))
+    words = [match.group(0) for match in matches]
+    # "Ronaldo's" and "I'm" split into a word and a letter that is not a size
+    after_apostrophe = {i for i, match in enumerate(matches)
+                        if match.start() > 0 and lowered[match.start() - 1] in APOSTROPHES}
+    count = len(words)
+    i = 0
+    while i < count:
+        word = words[i]
+        entries = PHRASES.get(word)
+        if entries:
+            match = next((entry for entry in entries
+                          if len(entry[0]) == 1 or tuple(words[i:i + len(entry[0])]) == entry[0]), None)
+            if match:
+                found[match[1]].append(match[2])
+                i += len(match[0])
+                continue
+        if word.isdecimal():
+            if len(word) == 4 and word[:2] in ("19", "20"):
+                found["year"].append(word)
+        elif word in SIZES and not (len(word) == 1 and i in after_apostrophe):
+            found["size"].append(word.upper())
+        elif word == "size" and i + 1 < count and words[i + 1].isdecimal() and len(words[i + 1]) <= 2:
+            # Bare numbers are shirt numbers, years or part numbers far more often than
+            # sizes, so a number only counts as a size when it follows "size"
+            found["size"].append(words[i + 1])
+            i += 1
+        i += 1
+    return found
+
+
+def _by_priority(found: Sequence[str], priority: Iterable[str]) -> Optional[str]:
+    return next((label for label in priority if label in found), None)
+
+
+def team_for_era(era: Optional[str]) -> Optional[str]:
+    return TEAMS.get(era, era)
+
+
+def extract_attributes(title: str, era: Optional[str] = None, category: Optional[str] = None,
+                       conditions: Sequence[str] = EBAY_CONDITIONS,
+                       default_condition: str = "Unknown") -> Dict[str, Any]:
+    """Extract team, era, year, size, condition and categories from a title.
+
+    A known era or category (e.g. from the search that found the item) takes
+    precedence over what the title mentions.
+    """
+    found = scan_title(title)
+    era = era or (found["era"][0] if found["era"] else None)
+    return {
+        "team": team_for_era(era),
+        "era": era,
+        "year": found["year"][0] if found["year"] else None,
+        "size": found["size"][0] if found["size"] else None,
+        "condition": _by_priority(found["condition"], conditions) or default_condition,
+        "category": category or _by_priority(found["category"], ITEM_CATEGORY_KEYWORDS),
+        "part_category": _by_priority(found["part_category"], PART_CATEGORIES) or "Miscellaneous",
+    }
+
+
+def extract_batch(titles: Iterable[str], **kwargs) -> List[Dict[str, Any]]:
+    """extract_attributes for many titles with the same options"""
+    return [extract_attributes(title, **kwargs) for title in titles]
+
+
+# Condition rules per source, matching what each spider assigns at crawl time
+SOURCE_CONDITIONS = {
+    "AliExpress": {"conditions": ALIEXPRESS_CONDITIONS, "default_condition": "New"},
+}
+REPROCESSED_FIELDS = ("team", "era", "year", "size", "condition", "category")
+
+
+def reprocess_items(db, batch_size: int = 1000, dry_run: bool = False) -> Dict[str, int]:
+    """Re-run extraction over every stored item, committing once per batch"""
+    from app.models import Item
+
+    stats = {"items": 0, "updated": 0}
+    last_id = 0
+    while True:
+        items = (db.query(Item).filter(Item.id > last_id).order_by(Item.id).limit(batch_size).all())
+        if not items:
+            break
+        for item in items:
+            options = SOURCE_CONDITIONS.get(item.source, {})
+            attributes = extract_attributes(item.title_en, era=item.era, category=item.category, **options)
+            changes = {field: attributes[field] for field in REPROCESSED_FIELDS
+                       if attributes[field] != getattr(item, field)}
+            if changes:
+                stats["updated"] += 1
+                if not dry_run:
+                    for field, value in changes.items():
+                        setattr(item, field, value)
+        stats["items"] += len(items)
+        last_id = items[-1].id
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Re-run title attribute extraction over the stored items")
+    parser.add_argument("command", choices=["reprocess"])
+    parser.add_argument("--batch-size", type=int, default=1000, help="items per database commit")
+    parser.add_argument("--dry-run", action="store_true", help="count changes without writing them")
+    args = parser.parse_args(argv)
+
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        stats = reprocess_items(db, batch_size=args.batch_size, dry_run=args.dry_run)
+    finally:
+        db.close()
+    verb = "would change" if args.dry_run else "updated"
+    print(f"✅ Reprocessed {stats['items']} items, {verb} {stats['updated']}")
+
+
+if __name__ == "__main__":
+    main()
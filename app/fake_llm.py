@@ -0,0 +1,228 @@
+"""Local stand-in for the Gemini REST API, for offline runs and load tests.
+
+Answers ``POST /v1beta/models/<model>:generateContent`` like Gemini does
+(and ``:streamGenerateContent?alt=sse`` as a few Server-Sent Events spread
+over the latency), with an answer in the shape the prompt asks for: plain
+English or Hebrew descriptions, the JSON list of a batched description prompt keyed by the
+same item ids, a story's JSON object or a JSON list of contextual stories.
+Latency, error rate and a requests-per-minute quota are configurable, so
+timeouts, retries and rate limiting can be exercised without a key:
+
+    python -m app.fake_llm --port 8090 --latency 1.5 --jitter 0.5 --error-rate 0.05 --rpm 60
+    LLM_BASE_URL=http://127.0.0.1:8090 python run.py
+
+``GET /stats`` returns how many requests were answered, failed or rate limited.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import random
+import re
+import time
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_PORT = 8090
+DEFAULT_LATENCY_SECONDS = 1.0
+RATE_WINDOW_SECONDS = 60.0
+STREAM_CHUNKS = 8
+
+ITEMS_PATTERN = re.compile(r"\*\*Items:\*\*\s*(\[.*\])\s*---", re.DOTALL)
+ITEM_TITLE_PATTERN = re.compile(r'\*\*Item Title:\*\*\s*"(.*)"')
+STORY_TITLE_PATTERN = re.compile(r'\*\*Story Title:\*\*\s*"(.*)"')
+FILTER_PATTERN = re.compile(r"^- (Era|Category|Team): (.*)$", re.MULTILINE)
+STORY_TYPES = ["milestone", "record", "personal", "quote", "trivia", "match"]
+
+
+def english_description(title: str) -> str:
+    return (f"{title} is a standout piece for any Cristiano Ronaldo collection, recalling the seasons in which "
+            f"he set goal records, lifted Champions League trophies and won five Ballon d'Or awards. "
+            f"Authentic, well kept and increasingly hard to find, it is a prized item for collectors.")
+
+
+def hebrew_description(title: str) -> str:
+    return (f"{title} - פריט אספנות מיוחד מהקריירה האגדית של כריסטיאנו רונאלדו. "
+            "הפריט מזכיר את העונות שבהן שבר שיאי שערים, זכה בליגת האלופות וקטף חמישה כדורי זהב, "
+            "ומחבר כל אוהד לרגעים הגדולים ביותר של הכוכב הפורטוגלי. "
+            "פריט אותנטי ושמור היטב, שהולך ונעשה נדיר משנה לשנה, ולכן הוא אוצר אמיתי לכל אספן.")
+
+
+def story(title: str, era: str, team: str, index: int = 0) -> Dict:
+    return {
+        "title_en": title,
+        "title_he": f"סיפור: {title}",
+        "content_en": f"{title}. " + english_description("This moment") * 2,
+        "content_he": hebrew_description(title) * 2,
+        "summary_en": f"A defining moment of Ronaldo's {era} years.",
+        "summary_he": "רגע מכונן בקריירה של רונאלדו.",
+        "story_type": STORY_TYPES[index % len(STORY_TYPES)],
+        "era": era,
+        "team": team,
+        "year": "2008",
+        "category_relevance": "jerseys,memorabilia",
+        "importance_score": 8,
+        "related_search_terms": f"ronaldo,{era},{team}".lower(),
+    }
+
+
+def fake_answer(prompt: str) -> str:
+    """An answer in the format the prompt asks for"""
+    items = ITEMS_PATTERN.search(prompt)
+    if items:
+        return json.dumps([{"id": item["id"], "description_en": english_description(item["title"]),
+                            "description_he": hebrew_description(item["title"])}
+                           for item in json.loads(items.group(1))], ensure_ascii=False)
+    title = ITEM_TITLE_PATTERN.search(prompt)
+    if title:
+        if "Hebrew" in prompt:
+            return hebrew_description(title.group(1))
+        return english_description(title.group(1))
+    title = STORY_TITLE_PATTERN.search(prompt)
+    if title:
+        return json.dumps({key: value for key, value in story(title.group(1), "General", "").items()
+                           if key in ("content_en", "content_he", "summary_en", "summary_he")}, ensure_ascii=False)
+    filters = dict(FILTER_PATTERN.findall(prompt))
+    if filters:
+        era, team = filters.get("Era", "All Eras"), filters.get("Team", "All Teams")
+        return json.dumps([story(f"{era} story {i}", era, team, i) for i in range(1, 6)], ensure_ascii=False)
+    return "OK"
+
+
+class FakeGemini:
+    """Answers generateContent requests after a random delay, failing or rate limiting some of them"""
+
+    def __init__(self, latency: float = DEFAULT_LATENCY_SECONDS, jitter: float = 0.0, error_rate: float = 0.0,
+                 requests_per_minute: float = 0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests_per_minute = requests_per_minute
+        self.random = random.Random(seed)
+        self.accepted: collections.deque = collections.deque()
+        self.stats = {"requests": 0, "answered": 0, "errors": 0, "rate_limited": 0, "in_flight": 0}
+
+    def _rate_limited(self, now: float) -> bool:
+        while self.accepted and now - self.accepted[0] > RATE_WINDOW_SECONDS:
+            self.accepted.popleft()
+        if self.requests_per_minute and len(self.accepted) >= self.requests_per_minute:
+            return True
+        self.accepted.append(now)
+        return False
+
+    def _admit(self) -> Optional[JSONResponse]:
+        """The 429 for a request over the quota, or None once it counts against the quota"""
+        self.stats["requests"] += 1
+        if self._rate_limited(time.monotonic()):
+            self.stats["rate_limited"] += 1
+            return error(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota).")
+        return None
+
+    def _fails(self) -> bool:
+        if self.random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return True
+        return False
+
+    @staticmethod
+    def _chunk(text: str, prompt: str, finished: bool = True) -> dict:
+        chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}],
+                 "usageMetadata": {"promptTokenCount": len(prompt) // 4}}
+        if finished:
+            chunk["candidates"][0]["finishReason"] = "STOP"
+        return chunk
+
+    async def generate(self, body: dict) -> JSONResponse:
+        rejected = self._admit()
+        if rejected:
+            return rejected
+        self.stats["in_flight"] += 1
+        try:
+            await asyncio.sleep(max(0.0, self.random.gauss(self.latency, self.jitter)))
+        finally:
+            self.stats["in_flight"] -= 1
+        if self._fails():
+            return error(500, "INTERNAL", "An internal error has occurred.")
+        prompt = prompt_text(body)
+        self.stats["answered"] += 1
+        return JSONResponse(self._chunk(fake_answer(prompt), prompt))
+
+    async def stream(self, body: dict):
+        """Like generate, but the answer is sent as STREAM_CHUNKS Server-Sent Events spread over the latency"""
+        rejected = self._admit()
+        if rejected:
+            return rejected
+        if self._fails():
+            return error(500, "INTERNAL", "An internal error has occurred.")
+        prompt = prompt_text(body)
+        answer = fake_answer(prompt)
+        size = max(1, -(-len(answer) // STREAM_CHUNKS))
+        pieces = [answer[start:start + size] for start in range(0, len(answer), size)] or [""]
+        pause = max(0.0, self.random.gauss(self.latency, self.jitter)) / len(pieces)
+
+        async def events():
+            self.stats["in_flight"] += 1
+            try:
+                for i, piece in enumerate(pieces):
+                    await asyncio.sleep(pause)
+                    chunk = self._chunk(piece, prompt, finished=i == len(pieces) - 1)
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\r\n\r\n"
+            finally:
+                self.stats["in_flight"] -= 1
+            self.stats["answered"] += 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def prompt_text(body: dict) -> str:
+    return "".join(part.get("text", "") for content in body.get("contents", [])
+                   for part in content.get("parts", []))
+
+
+def error(code: int, status: str, message: str) -> JSONResponse:
+    return JSONResponse({"error": {"code": code, "message": message, "status": status}}, status_code=code)
+
+
+def create_app(gemini: Optional[FakeGemini] = None) -> FastAPI:
+    gemini = gemini or FakeGemini()
+    app = FastAPI(title="Fake Gemini")
+    app.state.gemini = gemini
+
+    @app.post("/v1beta/models/{model}:generateContent")
+    async def generate_content(model: str, request: Request):
+        return await gemini.generate(await request.json())
+
+    @app.post("/v1beta/models/{model}:streamGenerateContent")
+    async def stream_generate_content(model: str, request: Request):
+        return await gemini.stream(await request.json())
+
+    @app.get("/stats")
+    def stats():
+        return gemini.stats
+
+    return app
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY_SECONDS, help="mean seconds per answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument("--rpm", type=float, default=0, help="requests per minute before answering 429 (0: unlimited)")
+    parser.add_argument("--seed", type=int, help="random seed for latency and errors")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    gemini = FakeGemini(args.latency, args.jitter, args.error_rate, args.rpm, args.seed)
+    print(f"🤖 Fake Gemini on http://{args.host}:{args.port} ({args.latency}s ± {args.jitter}s, "
+          f"{args.error_rate:.0%} errors, {args.rpm or 'unlimited'} rpm)")
+    uvicorn.run(create_app(gemini), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
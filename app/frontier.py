@@ -0,0 +1,370 @@
+"""Shared crawl frontier for running one spider in several worker processes.
+
+Every scheduled request (search-term seeds and the listing pages they lead
+to) is a work unit in one SQLite table shared by all workers. A worker
+leases units for its spiders; a lease that is not completed within
+``FRONTIER_LEASE_SECONDS`` (the worker died or hung) expires and another
+worker picks the unit up. Per-domain request intervals are stored in the
+same database and enforced when a unit is leased, so adding workers adds
+capacity without ever exceeding a site's request budget.
+
+    python -m app.frontier seed ebay aliexpress           # queue the spiders' start requests
+    python -m app.frontier worker ebay aliexpress         # run a worker; start as many as needed
+    python -m app.frontier limit www.ebay.com 1.5         # at most one eBay request per 1.5 s
+    python -m app.frontier stats
+"""
+import argparse
+import os
+import pickle
+import socket
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from scrapy.core.scheduler import BaseScheduler
+from scrapy.utils.request import fingerprint as request_fingerprint
+from scrapy.utils.request import request_from_dict
+
+DEFAULT_FRONTIER_PATH = os.path.join("crawl_state", "frontier.db")
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_DOMAIN_DELAY = 2.0
+DEFAULT_MAX_ATTEMPTS = 3
+FRONTIER_ID_META = "frontier_id"
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+def request_domain(url: str) -> str:
+    return urlparse(url).hostname or ""
+
+
+class Frontier:
+    """Work units, leases and per-domain request intervals in one SQLite database"""
+
+    def __init__(self, path: str = DEFAULT_FRONTIER_PATH, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 default_delay: float = DEFAULT_DOMAIN_DELAY, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.default_delay = default_delay
+        self.max_attempts = max_attempts
+        # Autocommit mode; multi-statement updates use explicit IMMEDIATE transactions
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS work (
+                id INTEGER PRIMARY KEY,
+                spider TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                data BLOB NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_work_queue ON work (spider, status, priority DESC, id);
+            CREATE INDEX IF NOT EXISTS ix_work_fingerprint ON work (spider, fingerprint);
+            CREATE TABLE IF NOT EXISTS domains (
+                domain TEXT PRIMARY KEY,
+                min_interval REAL NOT NULL,
+                next_allowed REAL NOT NULL DEFAULT 0
+            );
+        """)
+
+    def _transaction(self):
+        return _Transaction(self.db)
+
+    def push(self, spider: str, fingerprint: str, url: str, priority: int, data: bytes,
+             dont_filter: bool = False, now: Optional[float] = None) -> Optional[int]:
+        """Add a work unit; None if it duplicates one already known to the frontier.
+
+        dont_filter units are only dropped while an identical unit is still
+        pending, so seeding from several workers at once queues each seed once.
+        """
+        now = time.time() if now is None else now
+        with self._transaction():
+            statuses = (QUEUED, LEASED) if dont_filter else (QUEUED, LEASED, DONE, FAILED)
+            duplicate = self.db.execute(
+                f"SELECT 1 FROM work WHERE spider = ? AND fingerprint = ? AND status IN ({','.join('?' * len(statuses))})",
+                (spider, fingerprint, *statuses),
+            ).fetchone()
+            if duplicate:
+                return None
+            cursor = self.db.execute(
+                "INSERT INTO work (spider, fingerprint, domain, priority, status, data, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (spider, fingerprint, request_domain(url), priority, QUEUED, data, now),
+            )
+            return cursor.lastrowid
+
+    def requeue(self, unit_id: int, priority: int, data: bytes) -> None:
+        """Put a leased unit back with new request data, e.g. for a retry or redirect"""
+        self.db.execute(
+            "UPDATE work SET status = ?, priority = ?, data = ?, lease_owner = NULL, lease_expires = NULL "
+            "WHERE id = ?",
+            (QUEUED, priority, data, unit_id),
+        )
+
+    def lease(self, spiders: Iterable[str], owner: str, now: Optional[float] = None) -> Optional[Tuple[int, str, bytes]]:
+        """Lease the best available unit whose domain may be requested now, as (id, spider, data)"""
+        spiders = list(spiders)
+        now = time.time() if now is None else now
+        placeholders = ",".join("?" * len(spiders))
+        with self._transaction():
+            # Expired leases go back in the queue, or fail once they used up their attempts
+            self.db.execute(
+                f"UPDATE work SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, lease_owner = NULL "
+                f"WHERE status = ? AND lease_expires < ? AND spider IN ({placeholders})",
+                (self.max_attempts, FAILED, QUEUED, LEASED, now, *spiders),
+            )
+            row = self.db.execute(
+                f"SELECT w.id, w.spider, w.domain, w.data FROM work w LEFT JOIN domains d ON d.domain = w.domain "
+                f"WHERE w.status = ? AND w.spider IN ({placeholders}) AND COALESCE(d.next_allowed, 0) <= ? "
+                f"ORDER BY w.priority DESC, w.id LIMIT 1",
+                (QUEUED, *spiders, now),
+            ).fetchone()
+            if row is None:
+                return None
+            unit_id, spider, domain, data = row
+            self.db.execute(
+                "UPDATE work SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                (LEASED, owner, now + self.lease_seconds, unit_id),
+            )
+            self.db.execute(
+                "INSERT INTO domains (domain, min_interval, next_allowed) VALUES (?, ?, ?) "
+                "ON CONFLICT(domain) DO UPDATE SET next_allowed = ? + min_interval",
+                (domain, self.default_delay, now + self.default_delay, now),
+            )
+            return unit_id, spider, data
+
+    def done(self, unit_id: int, status: str = DONE) -> None:
+        self.db.execute("UPDATE work SET status = ?, lease_owner = NULL, lease_expires = NULL WHERE id = ?",
+                        (status, unit_id))
+
+    def set_limit(self, domain: str, min_interval: float) -> None:
+        """Set the minimum seconds between two requests to a domain, across all workers"""
+        self.db.execute(
+            "INSERT INTO domains (domain, min_interval) VALUES (?, ?) "
+            "ON CONFLICT(domain) DO UPDATE SET min_interval = excluded.min_interval",
+            (domain, min_interval),
+        )
+
+    def next_ready_in(self, spiders: Iterable[str], now: Optional[float] = None) -> Optional[float]:
+        """Seconds until a queued unit of these spiders may be leased; None if nothing is queued"""
+        spiders = list(spiders)
+        now = time.time() if now is None else now
+        placeholders = ",".join("?" * len(spiders))
+        row = self.db.execute(
+            f"SELECT MIN(COALESCE(d.next_allowed, 0)) FROM work w LEFT JOIN domains d ON d.domain = w.domain "
+            f"WHERE w.status = ? AND w.spider IN ({placeholders})",
+            (QUEUED, *spiders),
+        ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - now)
+
+    def pending(self, spiders: Iterable[str], owner: Optional[str] = None) -> int:
+        """Units still to be crawled: queued, or leased by another worker that may yet fail"""
+        spiders = list(spiders)
+        placeholders = ",".join("?" * len(spiders))
+        return self.db.execute(
+            f"SELECT COUNT(*) FROM work WHERE spider IN ({placeholders}) "
+            f"AND (status = ? OR (status = ? AND lease_owner IS NOT ?))",
+            (*spiders, QUEUED, LEASED, owner),
+        ).fetchone()[0]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        result: Dict[str, Dict[str, int]] = {}
+        for spider, status, count in self.db.execute("SELECT spider, status, COUNT(*) FROM work GROUP BY spider, status"):
+            result.setdefault(spider, {})[status] = count
+        return result
+
+    def limits(self) -> List[Tuple[str, float]]:
+        return self.db.execute("SELECT domain, min_interval FROM domains ORDER BY domain").fetchall()
+
+    def close(self) -> None:
+        self.db.close()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, so concurrent workers never lease the same unit"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def serialize_request(request, spider) -> bytes:
+    return pickle.dumps(request.to_dict(spider=spider), protocol=4)
+
+
+def push_request(frontier: Frontier, spider, request) -> Optional[int]:
+    """Add a Scrapy request to the frontier as a work unit of its spider"""
+    return frontier.push(spider.name, request_fingerprint(request).hex(), request.url, request.priority,
+                         serialize_request(request, spider), dont_filter=request.dont_filter)
+
+
+class FrontierScheduler(BaseScheduler):
+    """Scheduler that takes its requests from the shared frontier instead of a local queue"""
+
+    # Request meta holding the leased unit; CrawlStateMiddleware strips it from requests the spider yields
+    id_meta = FRONTIER_ID_META
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        settings = crawler.settings
+        # New domains default to the spider's own DOWNLOAD_DELAY; `limit` overrides it centrally
+        default_delay = (settings.getfloat("FRONTIER_DOMAIN_DELAY") or settings.getfloat("DOWNLOAD_DELAY")
+                         or DEFAULT_DOMAIN_DELAY)
+        self.frontier = Frontier(
+            settings.get("FRONTIER_PATH") or DEFAULT_FRONTIER_PATH,
+            lease_seconds=settings.getfloat("FRONTIER_LEASE_SECONDS", DEFAULT_LEASE_SECONDS),
+            default_delay=default_delay,
+            max_attempts=settings.getint("FRONTIER_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS),
+        )
+        self.spider = None
+        self.owner = None
+        self._wakeup = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def open(self, spider):
+        self.spider = spider
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{spider.name}"
+
+    def close(self, reason):
+        if self._wakeup is not None and self._wakeup.active():
+            self._wakeup.cancel()
+        self.frontier.close()
+
+    def has_pending_requests(self) -> bool:
+        return self.frontier.pending([self.spider.name], owner=self.owner) > 0
+
+    def enqueue_request(self, request) -> bool:
+        unit_id = request.meta.get(FRONTIER_ID_META)
+        if unit_id is not None:
+            # A retry or redirect of a leased unit replaces it instead of adding a new one
+            self.frontier.requeue(unit_id, request.priority, serialize_request(request, self.spider))
+            return True
+        if push_request(self.frontier, self.spider, request) is None:
+            self.stats.inc_value("dupefilter/filtered")
+            return False
+        self.stats.inc_value("frontier/pushed")
+        return True
+
+    def next_request(self):
+        leased = self.frontier.lease([self.spider.name], self.owner)
+        if leased is None:
+            self._schedule_wakeup()
+            return None
+        unit_id, _, data = leased
+        request = request_from_dict(pickle.loads(data), spider=self.spider)
+        request.meta[FRONTIER_ID_META] = unit_id
+        self.stats.inc_value("frontier/leased")
+        return request
+
+    def mark_done(self, request) -> None:
+        unit_id = request.meta.get(FRONTIER_ID_META)
+        if unit_id is not None:
+            self.frontier.done(unit_id)
+
+    def _schedule_wakeup(self) -> None:
+        """Ask the engine for the next request as soon as a rate-limited domain opens up"""
+        if self._wakeup is not None and self._wakeup.active():
+            return
+        wait = self.frontier.next_ready_in([self.spider.name])
+        if wait is None:
+            return
+        from twisted.internet import reactor
+
+        engine = self.crawler.engine
+        slot = getattr(engine, "slot", None) or getattr(engine, "_slot", None)
+        if slot is not None:
+            self._wakeup = reactor.callLater(wait + 0.05, slot.nextcall.schedule)
+
+
+def frontier_settings(settings):
+    settings.set("SCHEDULER", "app.frontier.FrontierScheduler", priority="cmdline")
+    return settings
+
+
+def seed(spider_names: List[str], settings) -> Dict[str, int]:
+    """Queue the start requests of each spider without crawling them"""
+    from scrapy.spiderloader import SpiderLoader
+
+    loader = SpiderLoader.from_settings(settings)
+    frontier = Frontier(settings.get("FRONTIER_PATH") or DEFAULT_FRONTIER_PATH)
+    counts = {}
+    try:
+        for name in spider_names:
+            spider = loader.load(name)()
+            counts[name] = sum(1 for request in spider.start_requests()
+                               if push_request(frontier, spider, request) is not None)
+    finally:
+        frontier.close()
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Shared crawl frontier for several worker processes")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-s", "--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a Scrapy setting, e.g. FRONTIER_PATH")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("seed", parents=[common], help="queue the start requests of spiders").add_argument(
+        "spiders", nargs="+", help="spider names")
+    sub.add_parser("worker", parents=[common], help="crawl work leased from the frontier").add_argument(
+        "spiders", nargs="+", help="spider names")
+    limit_parser = sub.add_parser("limit", parents=[common], help="set the minimum seconds between requests to a domain")
+    limit_parser.add_argument("domain")
+    limit_parser.add_argument("seconds", type=float)
+    sub.add_parser("stats", parents=[common])
+    args = parser.parse_args(argv)
+
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+    for override in args.set:
+        name, _, value = override.partition("=")
+        settings.set(name, value, priority="cmdline")
+    path = settings.get("FRONTIER_PATH") or DEFAULT_FRONTIER_PATH
+
+    if args.command == "seed":
+        for name, count in seed(args.spiders, settings).items():
+            print(f"🌱 Queued {count} start requests for {name}")
+    elif args.command == "worker":
+        from scrapy.crawler import CrawlerProcess
+
+        process = CrawlerProcess(frontier_settings(settings))
+        for name in args.spiders:
+            process.crawl(name)
+        process.start()
+    elif args.command == "limit":
+        frontier = Frontier(path)
+        frontier.set_limit(args.domain, args.seconds)
+        frontier.close()
+        print(f"⏱️ {args.domain}: at most one request every {args.seconds}s across all workers")
+    else:
+        frontier = Frontier(path)
+        for spider, counts in sorted(frontier.stats().items()):
+            print(f"📊 {spider}: " + ", ".join(f"{status} {count}" for status, count in sorted(counts.items())))
+        for domain, interval in frontier.limits():
+            print(f"⏱️ {domain}: {interval}s between requests")
+        frontier.close()
+
+
+if __name__ == "__main__":
+    main()
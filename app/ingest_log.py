@@ -0,0 +1,288 @@
+"""Append-only ingest log that decouples spiders from the database.
+
+With ``INGEST_MODE = "log"`` the pipeline appends validated items to
+gzip-compressed NDJSON segments instead of writing to SQLite. Each spider
+process writes its own segments, so any number of spiders can crawl at the
+same time. A separate loader bulk-ingests sealed segments into the database
+and records its progress in a checkpoint file, so loads can be resumed or
+replayed from the start at any time.
+
+Usage:
+    python -m app.ingest_log load             # ingest everything not loaded yet
+    python -m app.ingest_log load --follow    # keep loading as new segments are sealed
+    python -m app.ingest_log load --replay    # ignore the checkpoint and reload all segments
+    python -m app.ingest_log status
+"""
+import argparse
+import datetime
+import glob
+import gzip
+import json
+import os
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_LOG_DIR = "ingest_log"
+DEFAULT_SEGMENT_MAX_RECORDS = 5000
+SEGMENT_SUFFIX = ".ndjson.gz"
+OPEN_SUFFIX = SEGMENT_SUFFIX + ".open"
+CHECKPOINT_FILE = "checkpoint.json"
+
+# Item fields stored as ISO strings in the log and restored on load
+DATETIME_FIELDS = ("fetched_at", "created_at", "updated_at")
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class IngestLogWriter:
+    """Appends records to rolling compressed segments owned by a single process.
+
+    Segments are written under a ``.open`` name and renamed once sealed, so the
+    loader never reads a segment that is still growing.
+    """
+
+    def __init__(self, directory: str = DEFAULT_LOG_DIR, writer_id: str = "writer",
+                 segment_max_records: int = DEFAULT_SEGMENT_MAX_RECORDS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        # The pid lets the loader tell abandoned segments from live ones
+        self.writer_id = f"{writer_id.replace('-', '_')}-{os.getpid()}"
+        self.segment_max_records = segment_max_records
+        self._file = None
+        self._path = None
+        self._records = 0
+        self._sequence = 0
+
+    def append(self, kind: str, item: Dict[str, Any], spider: Optional[str] = None) -> None:
+        if self._file is None:
+            self._open_segment()
+        record = {
+            "kind": kind,
+            "spider": spider,
+            "logged_at": datetime.datetime.utcnow().isoformat(),
+            "item": dict(item),
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False, default=_json_default).encode("utf-8") + b"\n")
+        # Sync-flush every record so a crashed spider loses nothing it already logged
+        self._file.flush()
+        self._records += 1
+        if self._records >= self.segment_max_records:
+            self._seal_segment()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._seal_segment()
+
+    def _open_segment(self) -> None:
+        self._sequence += 1
+        stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        name = f"{stamp}-{self.writer_id}-{self._sequence:05d}"
+        self._path = os.path.join(self.directory, name + OPEN_SUFFIX)
+        self._file = gzip.open(self._path, "wb")
+        self._records = 0
+
+    def _seal_segment(self) -> None:
+        self._file.close()
+        os.replace(self._path, self._path[:-len(".open")])
+        self._file = None
+        self._path = None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def seal_orphaned_segments(directory: str = DEFAULT_LOG_DIR) -> List[str]:
+    """Seal open segments left behind by writers that are no longer running"""
+    sealed = []
+    for path in glob.glob(os.path.join(directory, "*" + OPEN_SUFFIX)):
+        name = os.path.basename(path)[:-len(OPEN_SUFFIX)]
+        try:
+            pid = int(name.rsplit("-", 2)[1])
+        except (IndexError, ValueError):
+            continue
+        if not _pid_alive(pid):
+            os.replace(path, path[:-len(".open")])
+            sealed.append(name + SEGMENT_SUFFIX)
+    return sealed
+
+
+def list_segments(directory: str = DEFAULT_LOG_DIR) -> List[str]:
+    """Sealed segments in creation order"""
+    return sorted(glob.glob(os.path.join(directory, "*" + SEGMENT_SUFFIX)))
+
+
+def read_segment(path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (line number, record) pairs, tolerating a truncated tail from a crashed writer"""
+    line_number = 0
+    try:
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                line_number += 1
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError:
+                    # Partially written last record
+                    continue
+    except (EOFError, zlib.error, gzip.BadGzipFile):
+        return
+
+
+def load_checkpoint(directory: str = DEFAULT_LOG_DIR) -> Dict[str, Any]:
+    path = os.path.join(directory, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return {"completed": [], "current": None}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(checkpoint: Dict[str, Any], directory: str = DEFAULT_LOG_DIR) -> None:
+    """Atomically replace the checkpoint file"""
+    path = os.path.join(directory, CHECKPOINT_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def _restore_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    for field in DATETIME_FIELDS:
+        if isinstance(item.get(field), str):
+            try:
+                item[field] = datetime.datetime.fromisoformat(item[field])
+            except ValueError:
+                del item[field]
+    return item
+
+
+def _ingest_batch(db, records: List[Dict[str, Any]]) -> int:
+    """Upsert one batch grouped by record kind; returns the number of records that failed"""
+    from app import crud
+    from app.models import Item, Part, Story
+
+    targets = {"item": (Item, "item_url"), "part": (Part, "ebay_url"), "story": (Story, "title_en")}
+    rows_by_kind: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        rows_by_kind.setdefault(record["kind"], []).append(_restore_item(record["item"]))
+
+    failed = 0
+    for kind, rows in rows_by_kind.items():
+        if kind not in targets:
+            print(f"  ⚠️ Skipping {len(rows)} records of unknown kind '{kind}'")
+            failed += len(rows)
+            continue
+        model, key_field = targets[kind]
+        try:
+            crud.bulk_upsert(db, model, key_field, rows)
+        except Exception:
+            db.rollback()
+            # Fall back to one row at a time so a single bad record doesn't sink the batch
+            for row in rows:
+                try:
+                    crud.bulk_upsert(db, model, key_field, [row])
+                except Exception as e:
+                    db.rollback()
+                    failed += 1
+                    print(f"  ❌ Failed to load {kind} {row.get(key_field)}: {e}")
+    return failed
+
+
+def load_ingest_log(directory: str = DEFAULT_LOG_DIR, session_factory=None,
+                    batch_size: int = 500, replay: bool = False) -> Dict[str, int]:
+    """Bulk-ingest sealed segments into the database, checkpointing after every batch"""
+    if session_factory is None:
+        from app.database import SessionLocal as session_factory
+
+    os.makedirs(directory, exist_ok=True)
+    seal_orphaned_segments(directory)
+    checkpoint = {"completed": [], "current": None} if replay else load_checkpoint(directory)
+    completed = set(checkpoint["completed"])
+    stats = {"segments": 0, "records": 0, "failed": 0}
+
+    db = session_factory()
+    try:
+        for path in list_segments(directory):
+            name = os.path.basename(path)
+            if name in completed:
+                continue
+
+            current = checkpoint.get("current")
+            resume_after = current["line"] if current and current["segment"] == name else 0
+            batch = []
+            for line_number, record in read_segment(path):
+                if line_number <= resume_after:
+                    continue
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    stats["failed"] += _ingest_batch(db, batch)
+                    stats["records"] += len(batch)
+                    checkpoint["current"] = {"segment": name, "line": line_number}
+                    save_checkpoint(checkpoint, directory)
+                    batch = []
+            if batch:
+                stats["failed"] += _ingest_batch(db, batch)
+                stats["records"] += len(batch)
+
+            completed.add(name)
+            checkpoint["completed"] = sorted(completed)
+            checkpoint["current"] = None
+            save_checkpoint(checkpoint, directory)
+            stats["segments"] += 1
+    finally:
+        db.close()
+    return stats
+
+
+def log_status(directory: str = DEFAULT_LOG_DIR) -> Dict[str, int]:
+    checkpoint = load_checkpoint(directory)
+    sealed = [os.path.basename(p) for p in list_segments(directory)]
+    completed = set(checkpoint["completed"])
+    return {
+        "sealed": len(sealed),
+        "open": len(glob.glob(os.path.join(directory, "*" + OPEN_SUFFIX))),
+        "loaded": len([name for name in sealed if name in completed]),
+        "pending": len([name for name in sealed if name not in completed]),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Load the spider ingest log into the database")
+    parser.add_argument("command", choices=["load", "status"])
+    parser.add_argument("--dir", default=DEFAULT_LOG_DIR, help="ingest log directory")
+    parser.add_argument("--batch-size", type=int, default=500, help="records per database commit")
+    parser.add_argument("--replay", action="store_true", help="ignore the checkpoint and reload every segment")
+    parser.add_argument("--follow", action="store_true", help="keep loading new segments as they are sealed")
+    parser.add_argument("--interval", type=float, default=10.0, help="seconds between polls with --follow")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        status = log_status(args.dir)
+        print(f"📦 {status['sealed']} sealed segments ({status['loaded']} loaded, {status['pending']} pending), "
+              f"{status['open']} still being written")
+        return
+
+    replay = args.replay
+    while True:
+        stats = load_ingest_log(args.dir, batch_size=args.batch_size, replay=replay)
+        if stats["segments"]:
+            print(f"✅ Loaded {stats['records']} records from {stats['segments']} segments "
+                  f"({stats['failed']} failed)")
+        if not args.follow:
+            break
+        replay = False
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
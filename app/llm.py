@@ -0,0 +1,254 @@
+"""Pluggable LLM clients.
+
+Story generation and description enrichment only rely on the interface of
+``google.generativeai.GenerativeModel``: ``generate_content(prompt,
+**options)`` (and, where available, ``generate_content_async``) returning
+an object with a ``.text``. ``create_model`` picks the implementation:
+
+- ``LLM_BASE_URL`` set: ``RestClient`` against a Gemini-compatible REST
+  endpoint, e.g. the local stand-in started with ``python -m app.fake_llm``
+- otherwise the google-generativeai SDK, configured with ``GEMINI_API_KEY``
+
+so every AI path can run and be benchmarked without a Gemini key.
+``DeadlineRunner`` bounds AI calls made while serving a request: a hard
+deadline, a few dedicated threads and a ``CircuitBreaker`` that stops
+calling a provider that keeps failing or timing out.
+
+    python -m app.fake_llm --port 8090 --latency 1.5 &
+    LLM_BASE_URL=http://127.0.0.1:8090 python -m app.descriptions --limit 20
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Iterator, Optional, Tuple, Type
+
+import httpx
+
+try:
+    import google.generativeai as genai
+except ImportError:
+    genai = None
+
+DEFAULT_TIMEOUT_SECONDS = 60.0
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_SECONDS = 30.0
+
+
+class LLMUnavailable(Exception):
+    """No model can be created in this environment"""
+
+
+class LLMError(Exception):
+    """An error response from a REST endpoint"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class TextResponse:
+    """Stands in for a Gemini response; callers only read ``.text``"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def generation_config(options: dict) -> dict:
+    """The SDK's snake_case generation_config as the REST API's camelCase generationConfig"""
+    config = options.get("generation_config") or {}
+
+    def camel(name):
+        head, *rest = name.split("_")
+        return head + "".join(part.title() for part in rest)
+
+    return {camel(key): value for key, value in dict(config).items()}
+
+
+class RestClient:
+    """Gemini ``generateContent`` over plain HTTP, against Google or any endpoint speaking the same JSON"""
+
+    def __init__(self, base_url: str, model: str, api_key: Optional[str] = None,
+                 timeout: float = DEFAULT_TIMEOUT_SECONDS, transport=None):
+        self.base_url = base_url.rstrip("/")
+        self.model = model if model.startswith("models/") else f"models/{model}"
+        # Part of the response cache key, so answers from a stand-in never replay against the real model
+        self.model_name = f"{self.base_url}/{self.model}"
+        self.api_key = api_key
+        self.timeout = timeout
+        self.transport = transport
+
+    def _request(self, prompt: str, options: dict) -> dict:
+        body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        config = generation_config(options)
+        if config:
+            body["generationConfig"] = config
+        return body
+
+    def _headers(self) -> dict:
+        return {"x-goog-api-key": self.api_key} if self.api_key else {}
+
+    def _url(self, method: str = "generateContent") -> str:
+        return f"{self.base_url}/v1beta/{self.model}:{method}"
+
+    @staticmethod
+    def _parse(response: httpx.Response) -> TextResponse:
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        if response.status_code != 200:
+            message = (data.get("error") or {}).get("message") or response.text[:200]
+            raise LLMError(response.status_code, message)
+        return RestClient._text(data, response.status_code)
+
+    @staticmethod
+    def _text(data: dict, status: int = 200) -> TextResponse:
+        candidates = data.get("candidates") or []
+        if not candidates:
+            raise LLMError(status, "response has no candidates")
+        parts = (candidates[0].get("content") or {}).get("parts") or []
+        return TextResponse("".join(part.get("text", "") for part in parts))
+
+    def generate_content(self, prompt: str, stream: bool = False, **options):
+        """The response, or with stream=True an iterator of partial responses as Gemini sends them"""
+        if stream:
+            return self._stream(prompt, options)
+        with httpx.Client(timeout=self.timeout, transport=self.transport) as client:
+            response = client.post(self._url(), json=self._request(prompt, options), headers=self._headers())
+        return self._parse(response)
+
+    def _stream(self, prompt: str, options: dict) -> Iterator[TextResponse]:
+        with httpx.Client(timeout=self.timeout, transport=self.transport) as client:
+            with client.stream("POST", self._url("streamGenerateContent"), params={"alt": "sse"},
+                               json=self._request(prompt, options), headers=self._headers()) as response:
+                if response.status_code != 200:
+                    response.read()
+                    self._parse(response)
+                # Server-Sent Events; every data line is one partial GenerateContentResponse
+                for line in response.iter_lines():
+                    if line.startswith("data:"):
+                        yield self._text(json.loads(line[len("data:"):]))
+
+    async def generate_content_async(self, prompt: str, **options) -> TextResponse:
+        async with httpx.AsyncClient(timeout=self.timeout, transport=self.transport) as client:
+            response = await client.post(self._url(), json=self._request(prompt, options), headers=self._headers())
+        return self._parse(response)
+
+
+def create_model(model_name: str):
+    """The model to generate with, as configured by LLM_BASE_URL (and LLM_API_KEY) or GEMINI_API_KEY"""
+    base_url = os.environ.get("LLM_BASE_URL")
+    if base_url:
+        return RestClient(base_url, model_name, api_key=os.environ.get("LLM_API_KEY"),
+                          timeout=float(os.environ.get("LLM_TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS)))
+    if genai is None:
+        raise LLMUnavailable("google-generativeai is not installed")
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        raise LLMUnavailable("GEMINI_API_KEY environment variable not set")
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name)
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures; after reset_seconds one trial call is let through"""
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_seconds: float = DEFAULT_RESET_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.clock() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.clock() - self.opened_at >= self.reset_seconds and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """The allowed call never reached the provider; neither a success nor a failure"""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            # A failed trial call opens the breaker again right away
+            if self.failures >= self.failure_threshold or self.trial_in_flight:
+                self.opened_at = self.clock()
+            self.trial_in_flight = False
+
+
+class DeadlineRunner:
+    """Runs calls on a few dedicated threads and gives up on them after a deadline.
+
+    ``run`` returns None instead of a result when the breaker is open, every
+    thread is still busy or the deadline passes; errors and missed deadlines
+    count as breaker failures. Exceptions in ``busy_errors`` (e.g. no rate
+    limiter slot) mean the provider was never called and count as rejected.
+    A call that misses its deadline keeps running in the background and
+    keeps its thread until it returns.
+    """
+
+    def __init__(self, deadline_seconds: float, workers: int = 4, breaker: Optional[CircuitBreaker] = None,
+                 busy_errors: Tuple[Type[BaseException], ...] = ()):
+        self.deadline_seconds = deadline_seconds
+        self.breaker = breaker or CircuitBreaker()
+        self.busy_errors = busy_errors
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+        self.slots = threading.BoundedSemaphore(workers)
+        self.stats = {"calls": 0, "succeeded": 0, "failed": 0, "timed_out": 0, "rejected": 0}
+
+    def run(self, fn: Callable, *args, **kwargs):
+        if not self.slots.acquire(blocking=False):
+            self.stats["rejected"] += 1
+            return None
+        if not self.breaker.allow():
+            self.slots.release()
+            self.stats["rejected"] += 1
+            return None
+        self.stats["calls"] += 1
+        future = self.executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            result = future.result(timeout=self.deadline_seconds)
+        except FutureTimeout:
+            self.stats["timed_out"] += 1
+            self.breaker.record_failure()
+            print(f"⏱️ {getattr(fn, '__name__', 'LLM call')} missed its {self.deadline_seconds}s deadline "
+                  f"(breaker {self.breaker.state})")
+            return None
+        except self.busy_errors as e:
+            self.stats["rejected"] += 1
+            self.breaker.release_trial()
+            print(f"🚦 {getattr(fn, '__name__', 'LLM call')} skipped: {e}")
+            return None
+        except Exception as e:
+            self.stats["failed"] += 1
+            self.breaker.record_failure()
+            print(f"⚠️ {getattr(fn, '__name__', 'LLM call')} failed: {e} (breaker {self.breaker.state})")
+            return None
+        self.stats["succeeded"] += 1
+        self.breaker.record_success()
+        return result
@@ -0,0 +1,255 @@
+"""Persistent, content-addressed cache of Gemini responses.
+
+Story enrichment, contextual stories and item descriptions send the same
+rendered prompts again and again, e.g. every ``run.py`` start re-enriches
+all ``DEFAULT_STORIES``. ``CachedModel`` wraps a Gemini model and answers a
+``generate_content`` call from SQLite when the same model has already been
+given the same prompt (and generation options). Callers that cannot parse
+an answer drop it with ``forget_response``, so a retry asks the model again
+instead of replaying the broken text. Entries expire after
+``LLM_CACHE_TTL_DAYS`` and the least recently used ones are evicted once the
+cache is larger than ``LLM_CACHE_MAX_MB``. Hits and misses are counted in
+the cache file, so they add up across processes:
+
+    python -m app.llm_cache stats
+    python -m app.llm_cache prune
+    python -m app.llm_cache clear
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_CACHE_PATH = "cache/llm_cache.db"
+DEFAULT_TTL_DAYS = 30
+DEFAULT_MAX_MB = 50
+
+
+class CachedResponse:
+    """Stands in for a Gemini response; callers only read ``.text``"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class PromptCache:
+    """SQLite table of model responses keyed by a hash of the model name and rendered prompt"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: float = DEFAULT_TTL_DAYS * 86400,
+                 max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Shared by the API's worker threads; the lock serializes access
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_used ON responses (last_used)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @staticmethod
+    def key(model: str, prompt: str, options: Optional[dict] = None) -> str:
+        data = json.dumps([model, prompt, options or {}], sort_keys=True, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def _count(self, name: str) -> None:
+        self.db.execute("INSERT INTO counters (name, value) VALUES (?, 1) "
+                        "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self._count("misses")
+                return None
+            self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._count("hits")
+            return row[0]
+
+    def contains(self, key: str) -> bool:
+        """Whether a fresh entry exists, without counting a lookup"""
+        with self.lock:
+            row = self.db.execute("SELECT created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl_seconds
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def put(self, key: str, model: str, response: str) -> None:
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> int:
+        evicted = self.db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            # Drop least recently used entries until the cache fits again
+            for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+        return evicted
+
+    def prune(self) -> int:
+        with self.lock:
+            return self._evict(time.time())
+
+    def clear(self) -> None:
+        with self.lock:
+            self.db.execute("DELETE FROM responses")
+            self.db.execute("DELETE FROM counters")
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            counters = dict(self.db.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": counters.get("hits", 0), "misses": counters.get("misses", 0), "entries": entries, "bytes": size}
+
+    def close(self) -> None:
+        self.db.close()
+
+
+class CachedModel:
+    """Gemini model wrapper that serves repeated prompts from a PromptCache"""
+
+    def __init__(self, model, cache: PromptCache):
+        self.model = model
+        self.cache = cache
+        self.model_name = getattr(model, "model_name", type(model).__name__)
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, prompt: str, options: dict):
+        key = self.cache.key(self.model_name, prompt, options)
+        text = self.cache.get(key)
+        if text is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return key, text
+
+    def is_cached(self, prompt: str, **options) -> bool:
+        """Whether a call would be answered from the cache, e.g. to skip waiting for a rate limit"""
+        return self.cache.contains(self.cache.key(self.model_name, prompt, options))
+
+    def evict(self, prompt: str, **options) -> None:
+        """Drop the cached answer to a prompt, e.g. one the caller could not parse, so the next call asks again"""
+        self.cache.delete(self.cache.key(self.model_name, prompt, options))
+
+    def _store(self, key: str, response):
+        text = response.text
+        # Empty answers are not worth replaying
+        if text and text.strip():
+            self.cache.put(key, self.model_name, text)
+        return response
+
+    def generate_content(self, prompt: str, stream: bool = False, **options):
+        if stream:
+            return self._stream(prompt, options)
+        key, text = self._lookup(prompt, options)
+        if text is not None:
+            return CachedResponse(text)
+        return self._store(key, self.model.generate_content(prompt, **options))
+
+    def _stream(self, prompt: str, options: dict):
+        # Streamed and whole answers to the same prompt share an entry; a hit arrives as one chunk
+        key, text = self._lookup(prompt, options)
+        if text is not None:
+            yield CachedResponse(text)
+            return
+        parts = []
+        for chunk in self.model.generate_content(prompt, stream=True, **options):
+            parts.append(chunk.text)
+            yield chunk
+        self._store(key, CachedResponse("".join(parts)))
+
+    async def generate_content_async(self, prompt: str, **options):
+        key, text = self._lookup(prompt, options)
+        if text is not None:
+            return CachedResponse(text)
+        if hasattr(self.model, "generate_content_async"):
+            response = await self.model.generate_content_async(prompt, **options)
+        else:
+            response = await asyncio.to_thread(self.model.generate_content, prompt, **options)
+        return self._store(key, response)
+
+
+def forget_response(model, prompt: str, **options) -> None:
+    """Evict the answer to prompt from any response cache in a chain of model wrappers; callers use it
+    when an answer fails to parse, so retries reach the model instead of replaying the cached text"""
+    while model is not None:
+        if isinstance(model, CachedModel):
+            model.evict(prompt, **options)
+        model = getattr(model, "model", None)
+
+
+_default_cache: Optional[PromptCache] = None
+
+
+def default_cache() -> PromptCache:
+    """The process-wide cache, configured from LLM_CACHE_PATH, LLM_CACHE_TTL_DAYS and LLM_CACHE_MAX_MB"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PromptCache(
+            os.environ.get("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+            ttl_seconds=float(os.environ.get("LLM_CACHE_TTL_DAYS", DEFAULT_TTL_DAYS)) * 86400,
+            max_bytes=int(float(os.environ.get("LLM_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024),
+        )
+    return _default_cache
+
+
+def cached_model(model, cache: Optional[PromptCache] = None):
+    """Wrap a Gemini model with the response cache, unless LLM_CACHE_DISABLED is set"""
+    if model is None or os.environ.get("LLM_CACHE_DISABLED"):
+        return model
+    return CachedModel(model, cache or default_cache())
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Gemini response cache")
+    parser.add_argument("command", choices=["stats", "prune", "clear"])
+    args = parser.parse_args(argv)
+
+    cache = default_cache()
+    if args.command == "prune":
+        print(f"🧹 Evicted {cache.prune()} cached responses")
+    elif args.command == "clear":
+        cache.clear()
+        print("🧹 Cleared the response cache")
+    stats = cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    hit_rate = f"{stats['hits'] / lookups:.0%}" if lookups else "n/a"
+    print(f"📦 {stats['entries']} cached responses ({stats['bytes'] / 1024:.1f} KB), "
+          f"{stats['hits']} hits / {stats['misses']} misses ({hit_rate} hit rate)")
+
+
+if __name__ == "__main__":
+    main()
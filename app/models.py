@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float
+from sqlalchemy import Column, Integer, String, DateTime, Float, UniqueConstraint
 from .database import Base
 import datetime
 from pydantic import BaseModel
@@ -81,3 +81,106 @@ class Part(Base):
     description_en = Column(String)
     description_he = Column(String)
     fetched_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class QueryStat(Base):
+    """What one crawl of one search query produced, for yield-aware recrawl scheduling"""
+    __tablename__ = "query_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    query_id = Column(String, index=True)  # "<spider> <start URL>"
+    spider = Column(String, index=True)
+    crawled_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    requests = Column(Integer, default=0)
+    items = Column(Integer, default=0)
+    new_items = Column(Integer, default=0)
+    price_changes = Column(Integer, default=0)
+
+class QuerySchedule(Base):
+    """Recrawl interval and request budget assigned to a search query"""
+    __tablename__ = "query_schedule"
+
+    query_id = Column(String, primary_key=True)
+    spider = Column(String, index=True)
+    score = Column(Float)  # Smoothed new items and price changes per request
+    interval_hours = Column(Float)
+    budget_share = Column(Float)
+    max_requests = Column(Integer)
+    next_due = Column(DateTime, index=True)
+    last_crawled = Column(DateTime)
+
+class CrawlRun(Base):
+    """Throughput and latency summary of one spider run, for spotting regressions over time"""
+    __tablename__ = "crawl_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    spider = Column(String, index=True)
+    started_at = Column(DateTime, index=True)
+    finished_at = Column(DateTime)
+    finish_reason = Column(String)
+    duration_seconds = Column(Float)
+    requests = Column(Integer, default=0)
+    responses = Column(Integer, default=0)
+    items = Column(Integer, default=0)
+    blocked = Column(Integer, default=0)
+    fallback = Column(Integer, default=0)  # Pages answered with demo data
+    requests_per_second = Column(Float)
+    items_per_second = Column(Float)
+    # Estimated from the histograms, in seconds
+    latency_p50 = Column(Float)
+    latency_p95 = Column(Float)
+    parse_p95 = Column(Float)
+    write_p95 = Column(Float)
+
+class ItemDescription(Base):
+    """Progress of the description enrichment job per item, so interrupted runs resume"""
+    __tablename__ = "item_descriptions"
+
+    item_id = Column(Integer, primary_key=True)
+    input_hash = Column(String)  # Title, era, category and prompts the descriptions were written from
+    status = Column(String, index=True)  # done, failed
+    attempts = Column(Integer, default=0)
+    error = Column(String)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class Translation(Base):
+    """Translation memory: each distinct source text is sent to the translator once per language"""
+    __tablename__ = "translation_memory"
+    __table_args__ = (UniqueConstraint("source_key", "target_lang"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    source_key = Column(String, index=True)  # Normalized source text
+    target_lang = Column(String)
+    source_text = Column(String)
+    translated = Column(String)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class StoryRanking(Base):
+    """Stored stories the post-crawl warmup picked for a filter it could not fill with generated ones"""
+    __tablename__ = "story_rankings"
+    __table_args__ = (UniqueConstraint("era", "team", "category"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    # "" where the filter leaves the field open
+    era = Column(String, default="")
+    team = Column(String, default="")
+    category = Column(String, default="")
+    story_ids = Column(String)  # Comma-separated, best first
+    ranked_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class StoryWarmupRun(Base):
+    """Coverage and Gemini spend of one post-crawl story warmup"""
+    __tablename__ = "story_warmup_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    started_at = Column(DateTime, index=True)
+    duration_seconds = Column(Float)
+    combinations = Column(Integer, default=0)  # Filters found in the catalog
+    already_warm = Column(Integer, default=0)
+    generated = Column(Integer, default=0)  # Filled with newly generated stories
+    ranked = Column(Integer, default=0)  # Served from pre-ranked stored stories
+    failed = Column(Integer, default=0)  # Generation attempts that raised
+    stories_added = Column(Integer, default=0)
+    llm_calls = Column(Integer, default=0)
+    cache_hits = Column(Integer, default=0)
+    estimated_tokens = Column(Integer, default=0)
+    llm_seconds = Column(Float, default=0.0)
@@ -0,0 +1,256 @@
+"""Raw page archive for offline re-parsing.
+
+With ``PAGE_ARCHIVE_ENABLED = True`` every successful response a spider
+receives is stored in a compressed, WARC-like archive: each page is one
+independent gzip member (a JSON header line followed by the raw body)
+appended to a segment file, and a SQLite index maps (url, fetch time) to
+its segment and byte offset.
+
+When markup changes or an extractor is fixed, the archive can be re-parsed
+with the current spider callbacks in a process pool and the results fed
+through the normal item pipeline, instead of re-crawling politely:
+
+    python -m app.page_archive reparse --spider ebay --workers 8
+    python -m app.page_archive stats
+"""
+import argparse
+import datetime
+import gzip
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from scrapy.exceptions import NotConfigured
+from scrapy.http import TextResponse
+
+from app.parse_pool import json_safe, replayable_meta, run_callback
+
+DEFAULT_ARCHIVE_DIR = "page_archive"
+INDEX_FILE = "index.db"
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def request_context(request) -> Dict[str, Any]:
+    """The parts of a request needed to replay its callback offline"""
+    # Pages parsed in the parse pool record the callback that actually ran
+    callback_name = request.meta.get("pool_callback") or getattr(request.callback, "__name__", None)
+    cb_kwargs = {key: value for key, value in request.cb_kwargs.items() if json_safe(value)}
+    return {"callback": callback_name or "parse", "cb_kwargs": cb_kwargs, "meta": replayable_meta(request.meta)}
+
+
+class PageArchive:
+    """Append-only store of raw pages keyed by URL and fetch time"""
+
+    def __init__(self, directory: str = DEFAULT_ARCHIVE_DIR, segment_max_bytes: int = SEGMENT_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self._segment = None
+        self.index = sqlite3.connect(os.path.join(directory, INDEX_FILE), timeout=30)
+        self.index.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY,
+                spider TEXT NOT NULL,
+                url TEXT NOT NULL,
+                fetched_at TEXT NOT NULL,
+                status INTEGER,
+                segment TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            )
+        """)
+        self.index.execute("CREATE INDEX IF NOT EXISTS ix_pages_url_fetched ON pages (url, fetched_at)")
+        self.index.execute("CREATE INDEX IF NOT EXISTS ix_pages_spider ON pages (spider)")
+        self.index.commit()
+
+    def add(self, spider: str, url: str, body: bytes, status: int = 200, encoding: str = "utf-8",
+            headers: Optional[Dict[str, str]] = None, context: Optional[Dict[str, Any]] = None,
+            fetched_at: Optional[datetime.datetime] = None) -> int:
+        """Append one page and index it; returns the index row id"""
+        fetched_at = (fetched_at or datetime.datetime.utcnow()).isoformat()
+        header = {
+            "spider": spider,
+            "url": url,
+            "fetched_at": fetched_at,
+            "status": status,
+            "encoding": encoding,
+            "headers": headers or {},
+            **(context or {"callback": "parse", "cb_kwargs": {}, "meta": {}}),
+        }
+        # Each record is its own gzip member so it can be read back with one seek
+        record = gzip.compress(json.dumps(header).encode("utf-8") + b"\n" + body)
+
+        segment = self._segment_for(len(record))
+        with open(os.path.join(self.directory, segment), "ab") as f:
+            offset = f.tell()
+            f.write(record)
+
+        cursor = self.index.execute(
+            "INSERT INTO pages (spider, url, fetched_at, status, segment, offset, length) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (spider, url, fetched_at, status, segment, offset, len(record)),
+        )
+        self.index.commit()
+        return cursor.lastrowid
+
+    def _segment_for(self, record_size: int) -> str:
+        if self._segment is not None:
+            path = os.path.join(self.directory, self._segment)
+            if os.path.getsize(path) + record_size <= self.segment_max_bytes:
+                return self._segment
+        # Segments are per process so concurrent spiders never interleave writes
+        stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        self._segment = f"pages-{stamp}-{os.getpid()}.warc.gz"
+        open(os.path.join(self.directory, self._segment), "ab").close()
+        return self._segment
+
+    def records(self, spider: Optional[str] = None, latest_only: bool = True) -> List[Dict[str, Any]]:
+        """Index rows to replay, by default only the newest capture of each URL"""
+        query = "SELECT id, spider, url, fetched_at, status, segment, offset, length FROM pages"
+        params: List[Any] = []
+        where = []
+        if spider:
+            where.append("spider = ?")
+            params.append(spider)
+        if latest_only:
+            where.append("fetched_at = (SELECT MAX(p2.fetched_at) FROM pages p2 "
+                         "WHERE p2.url = pages.url AND p2.spider = pages.spider)")
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY id"
+        columns = ["id", "spider", "url", "fetched_at", "status", "segment", "offset", "length"]
+        return [dict(zip(columns, row)) for row in self.index.execute(query, params)]
+
+    def stats(self) -> List[tuple]:
+        return self.index.execute(
+            "SELECT spider, COUNT(*), COUNT(DISTINCT url), SUM(length) FROM pages GROUP BY spider ORDER BY spider"
+        ).fetchall()
+
+    def close(self) -> None:
+        self.index.close()
+
+
+def read_record(directory: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    """Load one archived page; returns its header fields plus the raw ``body``"""
+    with open(os.path.join(directory, record["segment"]), "rb") as f:
+        f.seek(record["offset"])
+        data = gzip.decompress(f.read(record["length"]))
+    header, body = data.split(b"\n", 1)
+    page = json.loads(header)
+    page["body"] = body
+    return page
+
+
+class PageArchiveMiddleware:
+    """Downloader middleware that archives every successful text response"""
+
+    def __init__(self, directory: str = DEFAULT_ARCHIVE_DIR):
+        self.archive = PageArchive(directory)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("PAGE_ARCHIVE_ENABLED"):
+            raise NotConfigured
+        return cls(crawler.settings.get("PAGE_ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR))
+
+    def process_response(self, request, response, spider):
+        if response.status == 200 and isinstance(response, TextResponse):
+            try:
+                self.archive.add(
+                    spider.name,
+                    response.url,
+                    response.body,
+                    status=response.status,
+                    encoding=response.encoding,
+                    headers={k.decode("latin-1"): v[0].decode("latin-1") for k, v in response.headers.items() if v},
+                    context=request_context(request),
+                )
+            except Exception as e:
+                spider.logger.warning(f"⚠️ Could not archive {response.url}: {e}")
+        return response
+
+
+# Worker-side spider instances, reused across pages in the same process
+_spiders: Dict[str, Any] = {}
+
+
+def _load_spider(name: str):
+    if name not in _spiders:
+        from scrapy.spiderloader import SpiderLoader
+        from scrapy.utils.project import get_project_settings
+
+        spider_cls = SpiderLoader.from_settings(get_project_settings()).load(name)
+        _spiders[name] = spider_cls()
+    return _spiders[name]
+
+
+def reparse_record(directory: str, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Run the current spider callback over one archived page and return its items"""
+    page = read_record(directory, record)
+    # Follow-up requests are ignored: the archive holds every page that was fetched
+    items, _ = run_callback(
+        _load_spider(page["spider"]), page["url"], page["body"], callback=page["callback"],
+        cb_kwargs=page["cb_kwargs"], meta=page["meta"], encoding=page["encoding"], status=page["status"],
+    )
+    return items
+
+
+def reparse_archive(directory: str = DEFAULT_ARCHIVE_DIR, spider: Optional[str] = None,
+                    workers: Optional[int] = None, session_factory=None) -> Dict[str, int]:
+    """Re-parse archived pages in a process pool and feed the items through the item pipeline"""
+    from app.pipelines import RonaldoItemsPipeline
+
+    archive = PageArchive(directory)
+    records = archive.records(spider=spider)
+    archive.close()
+
+    pipelines: Dict[str, RonaldoItemsPipeline] = {}
+    stats = {"pages": 0, "items": 0, "failed_pages": 0}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(record, pool.submit(reparse_record, directory, record)) for record in records]
+        for record, future in futures:
+            try:
+                items = future.result()
+            except Exception as e:
+                stats["failed_pages"] += 1
+                print(f"  ❌ Failed to re-parse {record['url']}: {e}")
+                continue
+
+            name = record["spider"]
+            if name not in pipelines:
+                kwargs = {"session_factory": session_factory} if session_factory else {}
+                pipelines[name] = RonaldoItemsPipeline(threaded=False, **kwargs)
+                pipelines[name].open_spider(_load_spider(name))
+            for item in items:
+                pipelines[name].process_item(item, _load_spider(name))
+            stats["pages"] += 1
+            stats["items"] += len(items)
+
+    for name, pipeline in pipelines.items():
+        pipeline.close_spider(_load_spider(name))
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Re-parse archived pages with the current spider callbacks")
+    parser.add_argument("command", choices=["reparse", "stats"])
+    parser.add_argument("--dir", default=DEFAULT_ARCHIVE_DIR, help="archive directory")
+    parser.add_argument("--spider", help="only re-parse pages fetched by this spider")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    if args.command == "stats":
+        archive = PageArchive(args.dir)
+        for spider, pages, urls, size in archive.stats():
+            print(f"🗄️ {spider}: {pages} pages ({urls} unique URLs), {size / (1024 * 1024):.1f} MB compressed")
+        archive.close()
+        return
+
+    stats = reparse_archive(args.dir, spider=args.spider, workers=args.workers)
+    print(f"✅ Re-parsed {stats['pages']} pages into {stats['items']} items "
+          f"({stats['failed_pages']} pages failed)")
+
+
+if __name__ == "__main__":
+    main()
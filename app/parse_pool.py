@@ -0,0 +1,173 @@
+"""Opt-in process pool for CPU-heavy parse callbacks.
+
+Parsing a large search page and running the per-item regex helpers happens
+on the reactor thread, so with several spiders in one process CPU becomes
+the bottleneck before the network does. With ``PARSE_POOL_ENABLED = True``
+spiders using ``PoolParsingMixin`` ship response bodies to worker processes,
+run the regular callback there and yield the items (and any follow-up
+requests) back asynchronously.
+
+    scrapy crawl ebay -s PARSE_POOL_ENABLED=True -s PARSE_POOL_WORKERS=4
+"""
+import asyncio
+import inspect
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.request import request_from_dict
+
+# Request meta set by Scrapy and its middlewares; it is rebuilt on the other side
+TRANSIENT_META_PREFIXES = ("download_", "playwright", "retry_", "redirect_", "proxy", "depth", "_")
+
+_pool: Optional[ProcessPoolExecutor] = None
+# Spiders that have submitted pages to the pool and not closed yet
+_pool_users = 0
+
+
+def json_safe(value) -> bool:
+    try:
+        json.dumps(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def replayable_meta(meta: Dict[str, Any]) -> Dict[str, Any]:
+    """The JSON-safe request meta a callback may read, without Scrapy's own bookkeeping"""
+    return {
+        key: value for key, value in meta.items()
+        if not key.startswith(TRANSIENT_META_PREFIXES) and json_safe(value)
+    }
+
+
+def run_callback(spider, url: str, body: bytes, callback: str = "parse", cb_kwargs: Optional[Dict[str, Any]] = None,
+                 meta: Optional[Dict[str, Any]] = None, encoding: str = "utf-8",
+                 status: int = 200) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Run a spider callback over a raw page; returns (items, follow-up requests as dicts)"""
+    cb_kwargs = cb_kwargs or {}
+    request = Request(url, meta=meta or {}, cb_kwargs=cb_kwargs)
+    response = HtmlResponse(url=url, body=body, encoding=encoding, status=status, request=request)
+    results = getattr(spider, callback)(response, **cb_kwargs)
+    if inspect.isasyncgen(results):
+        # Callbacks like parse_catalog_json are async generators; off the reactor there is no page to await
+        results = asyncio.run(_collect(results))
+    items, requests = [], []
+    for result in results:
+        if isinstance(result, Request):
+            requests.append(result.to_dict(spider=spider))
+        else:
+            items.append(dict(result))
+    return items, requests
+
+
+async def _collect(results) -> List[Any]:
+    return [result async for result in results]
+
+
+# Worker-side spider instances, reused across pages in the same process
+_worker_spiders: Dict[Any, Any] = {}
+
+
+def parse_in_worker(spider_cls, spider_kwargs: Dict[str, Any], page: Dict[str, Any]):
+    """Process pool entry point: run_callback on a spider instance cached per worker"""
+    key = (spider_cls, tuple(sorted(spider_kwargs.items())))
+    if key not in _worker_spiders:
+        _worker_spiders[key] = spider_cls(**spider_kwargs)
+    return run_callback(_worker_spiders[key], **page)
+
+
+def get_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """The process-wide parse pool, created on first use"""
+    global _pool
+    if _pool is None:
+        # Spawned rather than forked: the crawler process runs the reactor and writer threads
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool(wait: bool = True) -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=wait)
+        _pool = None
+
+
+def acquire_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """get_pool for a spider that will release it when it closes"""
+    global _pool_users
+    _pool_users += 1
+    return get_pool(workers)
+
+
+def release_pool() -> None:
+    """Drop a spider's use of the pool; the last one shuts it down without blocking the reactor thread"""
+    global _pool_users
+    _pool_users = max(0, _pool_users - 1)
+    if _pool_users == 0:
+        shutdown_pool(wait=False)
+
+
+class PoolParsingMixin:
+    """Spider mixin that runs the callbacks in ``pool_callbacks`` in the parse pool.
+
+    Wrap requests with ``self.pooled(request)``; without PARSE_POOL_ENABLED
+    they are returned unchanged and parsed inline as before.
+    """
+
+    pool_callbacks = ("parse",)
+    # Worker-side stand-ins for pooled callbacks whose follow-up requests depend on
+    # crawl state; the worker only extracts items and ``pool_followups`` runs here
+    pool_worker_callbacks: Dict[str, str] = {}
+
+    def pool_enabled(self) -> bool:
+        settings = getattr(self, "settings", None)
+        return bool(settings and settings.getbool("PARSE_POOL_ENABLED"))
+
+    def pool_spider_kwargs(self) -> Dict[str, Any]:
+        """Arguments to construct the worker-side copy of this spider"""
+        return {}
+
+    def pool_followups(self, response, items: List[Dict[str, Any]], **cb_kwargs) -> Iterable[Request]:
+        """Follow-up requests for a page parsed by a ``pool_worker_callbacks`` stand-in"""
+        return ()
+
+    def pooled(self, request: Request) -> Request:
+        callback = getattr(request.callback, "__name__", None)
+        if not self.pool_enabled() or callback not in self.pool_callbacks:
+            return request
+        return request.replace(callback=self.parse_in_pool, meta={**request.meta, "pool_callback": callback})
+
+    async def parse_in_pool(self, response, **cb_kwargs):
+        page = {
+            "url": response.url,
+            "body": response.body,
+            "callback": self.pool_worker_callbacks.get(response.meta["pool_callback"], response.meta["pool_callback"]),
+            "cb_kwargs": cb_kwargs,
+            "meta": replayable_meta(response.meta),
+            "encoding": response.encoding,
+            "status": response.status,
+        }
+        workers = self.settings.getint("PARSE_POOL_WORKERS") or None
+        if getattr(self, "_uses_pool", False):
+            pool = get_pool(workers)
+        else:
+            # Other spiders in the process may share the pool; it stays up until the last of them closes
+            self._uses_pool = True
+            pool = acquire_pool(workers)
+        future = pool.submit(parse_in_worker, type(self), self.pool_spider_kwargs(), page)
+        items, requests = await asyncio.wrap_future(future)
+        for item in items:
+            yield item
+        for data in requests:
+            yield self.pooled(request_from_dict(data, spider=self))
+        if response.meta["pool_callback"] in self.pool_worker_callbacks:
+            for request in self.pool_followups(response, items, **cb_kwargs):
+                yield self.pooled(request)
+
+    def closed(self, reason):
+        if getattr(self, "_uses_pool", False):
+            self._uses_pool = False
+            release_pool()
@@ -1,16 +1,64 @@
+import time
+
+from scrapy.exceptions import NotConfigured
+from twisted.internet import defer, threads
+from twisted.python.threadpool import ThreadPool
+
+from app.crawl_metrics import metrics_for
 from app.database import SessionLocal, engine
 from app.models import Item, Part, Story
 from app.crud import create_item, create_part, create_story
+from app.ingest_log import IngestLogWriter, DEFAULT_LOG_DIR, DEFAULT_SEGMENT_MAX_RECORDS
 
 class RonaldoItemsPipeline:
-    """Pipeline to handle Ronaldo items from multiple sources (eBay, AliExpress, Schmiedmann, etc.)"""
+    """Pipeline to handle Ronaldo items from multiple sources (eBay, AliExpress, Schmiedmann, etc.)
+
+    Validation runs on the reactor thread, but database writes are handed to a
+    dedicated writer thread so SQLite commits never stall downloads and parsing.
+    At most ``write_queue_size`` items wait for the writer; once that many are
+    pending, the returned Deferreds hold items back and Scrapy stops feeding
+    the pipeline until the writer catches up.
+    """
+
+    def __init__(self, threaded=True, write_queue_size=100, session_factory=SessionLocal):
+        self.threaded = threaded
+        self.write_queue_size = write_queue_size
+        self.session_factory = session_factory
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if crawler.settings.get('INGEST_MODE', 'db') == 'log':
+            # Items go to the ingest log instead, see IngestLogPipeline
+            raise NotConfigured
+        return cls(
+            threaded=crawler.settings.getbool('PIPELINE_WRITER_THREAD', True),
+            write_queue_size=crawler.settings.getint('PIPELINE_WRITE_QUEUE_SIZE', 100),
+        )
     
     def open_spider(self, spider):
-        self.session = SessionLocal()
+        self.session = self.session_factory()
         self.items_processed = 0
+        self.spider_name = spider.name
+        if self.threaded:
+            # SQLite allows a single writer, so one thread is all we need
+            self.threadpool = ThreadPool(minthreads=1, maxthreads=1, name=f"{spider.name}-db-writer")
+            self.threadpool.start()
+            self.write_slots = defer.DeferredSemaphore(self.write_queue_size)
+            self.pending_writes = set()
         spider.logger.info(f"🔧 Pipeline opened for spider: {spider.name}")
 
     def close_spider(self, spider):
+        if not self.threaded:
+            self._close(spider)
+            return None
+        # Let queued writes finish before tearing down the writer thread
+        drained = defer.DeferredList(list(self.pending_writes))
+        drained.addBoth(lambda _: self._close(spider))
+        return drained
+
+    def _close(self, spider):
+        if self.threaded:
+            self.threadpool.stop()
         spider.logger.info(f"✅ Pipeline processed {self.items_processed} items for {spider.name}")
         self.session.close()
 
@@ -19,33 +67,88 @@ class RonaldoItemsPipeline:
             # Check item type based on content
             if 'story_type' in item:
                 # This is a story item
-                return self._process_story(item, spider)
+                write = self._process_story(item, spider)
             elif 'item_url' in item or 'era' in item or 'category' in item:
                 # This is a new Ronaldo item format
-                return self._process_ronaldo_item(item, spider)
+                write = self._process_ronaldo_item(item, spider)
             else:
                 # This is legacy Part format - convert or handle separately
-                return self._process_legacy_part(item, spider)
+                write = self._process_legacy_part(item, spider)
             
         except Exception as e:
             spider.logger.error(f"❌ Error processing item: {e} - Item: {item}")
             # Return item anyway to not break the pipeline
             return item
 
+        if write is None:
+            return item
+        return self._store(write, item, spider)
+
+    def _store(self, write, item, spider):
+        """Hand a validated item to its database writer"""
+        if not self.threaded:
+            return self._write_now(write, item, spider)
+        # Tracked from the moment it is queued, so close_spider also waits for writes still waiting for a slot
+        d = self.write_slots.run(self._write_in_thread, write, item, spider)
+        self.pending_writes.add(d)
+
+        def settled(result):
+            self.pending_writes.discard(d)
+            return result
+
+        return d.addBoth(settled)
+
+    def _write_now(self, write, item, spider):
+        """Write an item synchronously on the calling thread"""
+        try:
+            self._write_row(write, item)
+            self.items_processed += 1
+        except Exception as e:
+            spider.logger.error(f"❌ Error writing item: {e} - Item: {item}")
+        return item
+
+    def _write_in_thread(self, write, item, spider):
+        """Queue a write on the writer thread; the Deferred fires with the item once committed"""
+        from twisted.internet import reactor
+
+        d = threads.deferToThreadPool(reactor, self.threadpool, self._write_row, write, item)
+
+        def written(_):
+            self.items_processed += 1
+            return item
+
+        def failed(failure):
+            spider.logger.error(f"❌ Error writing item: {failure.getErrorMessage()} - Item: {item}")
+            # Return item anyway to not break the pipeline
+            return item
+
+        d.addCallbacks(written, failed)
+        return d
+
+    def _write_row(self, write, item):
+        started = time.perf_counter()
+        try:
+            write(self.session, item)
+        except Exception:
+            self.session.rollback()
+            raise
+        finally:
+            metrics_for(self.spider_name).observe("pipeline_write_seconds", time.perf_counter() - started)
+
     def _process_ronaldo_item(self, item, spider):
-        """Process new Ronaldo item format"""
+        """Validate new Ronaldo item format and return its database writer"""
         # Validate required fields for Ronaldo items
         required_fields = ['title_en', 'price', 'source']
         missing_fields = [field for field in required_fields if not item.get(field)]
         
         if missing_fields:
             spider.logger.warning(f"⚠️ Ronaldo item missing required fields {missing_fields}: {item}")
-            return item
+            return None
         
         # Ensure price is valid
         if item.get('price', 0) <= 0:
             spider.logger.warning(f"⚠️ Ronaldo item has invalid price: {item}")
-            return item
+            return None
         
         # Set default item_url if not present
         if not item.get('item_url'):
@@ -59,26 +162,22 @@ class RonaldoItemsPipeline:
         category = item.get('category', 'Unknown')
         spider.logger.debug(f"💾 Processing {source} Ronaldo item: {title}... (${price}) [{era}/{category}]")
         
-        # Create item in database
-        created_item = create_item(self.session, item)
-        self.items_processed += 1
-        
-        return item
+        return create_item
 
     def _process_legacy_part(self, item, spider):
-        """Process legacy Part format for backward compatibility"""
+        """Validate legacy Part format for backward compatibility and return its database writer"""
         # Validate required fields
         required_fields = ['title_en', 'price', 'source']
         missing_fields = [field for field in required_fields if not item.get(field)]
         
         if missing_fields:
             spider.logger.warning(f"⚠️ Legacy part missing required fields {missing_fields}: {item}")
-            return item
+            return None
         
         # Ensure price is valid
         if item.get('price', 0) <= 0:
             spider.logger.warning(f"⚠️ Legacy part has invalid price: {item}")
-            return item
+            return None
         
         # Log item details
         source = item.get('source', 'Unknown')
@@ -86,21 +185,17 @@ class RonaldoItemsPipeline:
         price = item.get('price', 0)
         spider.logger.debug(f"💾 Processing {source} legacy part: {title}... (${price})")
         
-        # Create part in database (legacy)
-        created_part = create_part(self.session, item)
-        self.items_processed += 1
-        
-        return item
+        return create_part
 
     def _process_story(self, item, spider):
-        """Process story items from story spider"""
+        """Validate story items from story spider and return their database writer"""
         # Validate required fields for stories
         required_fields = ['title_en', 'content_en', 'story_type']
         missing_fields = [field for field in required_fields if not item.get(field)]
         
         if missing_fields:
             spider.logger.warning(f"⚠️ Story missing required fields {missing_fields}: {item}")
-            return item
+            return None
         
         # Log story details
         title = item.get('title_en', 'Unknown Title')[:50]
@@ -108,10 +203,44 @@ class RonaldoItemsPipeline:
         era = item.get('era', 'General')
         spider.logger.debug(f"📚 Processing {story_type} story: {title}... [{era}]")
         
-        # Create story in database
-        created_story = create_story(self.session, item)
+        return create_story
+
+class IngestLogPipeline(RonaldoItemsPipeline):
+    """Append validated items to the ingest log instead of writing to the database.
+
+    Enabled with ``INGEST_MODE = "log"``. Spiders then never touch SQLite, so
+    several can crawl at once without contending for its write lock; a separate
+    loader (``python -m app.ingest_log load``) bulk-ingests the log.
+    """
+
+    RECORD_KINDS = {create_item: 'item', create_part: 'part', create_story: 'story'}
+
+    def __init__(self, log_dir=DEFAULT_LOG_DIR, segment_max_records=DEFAULT_SEGMENT_MAX_RECORDS):
+        self.log_dir = log_dir
+        self.segment_max_records = segment_max_records
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if crawler.settings.get('INGEST_MODE', 'db') != 'log':
+            raise NotConfigured
+        return cls(
+            log_dir=crawler.settings.get('INGEST_LOG_DIR', DEFAULT_LOG_DIR),
+            segment_max_records=crawler.settings.getint('INGEST_LOG_SEGMENT_RECORDS', DEFAULT_SEGMENT_MAX_RECORDS),
+        )
+
+    def open_spider(self, spider):
+        self.log = IngestLogWriter(self.log_dir, writer_id=spider.name,
+                                   segment_max_records=self.segment_max_records)
+        self.items_processed = 0
+        spider.logger.info(f"🔧 Ingest log pipeline opened for spider: {spider.name} ({self.log_dir})")
+
+    def close_spider(self, spider):
+        self.log.close()
+        spider.logger.info(f"✅ Pipeline logged {self.items_processed} items for {spider.name}")
+
+    def _store(self, write, item, spider):
+        self.log.append(self.RECORD_KINDS[write], item, spider=spider.name)
         self.items_processed += 1
-        
         return item
 
 # Keep the old names for backward compatibility
@@ -0,0 +1,267 @@
+"""Rate limit and concurrency cap shared by every process that calls Gemini or SerpApi.
+
+The API's uvicorn workers, ``python -m app.descriptions`` and story
+generation each used to pace themselves, so together they still sent
+bursts the providers answered with 429s. ``SharedLimiter`` keeps one token
+bucket and one in-flight count per provider in a SQLite file that all of
+them open (``RATE_LIMIT_PATH``, ``cache/rate_limits.db`` by default).
+A call first waits for a token and a free slot:
+
+    with default_limiter().slot("gemini", INTERACTIVE):
+        model.generate_content(prompt)
+
+Waiting callers are served by priority, then in arrival order, so a user
+waiting on ``/stories/`` goes before bulk description enrichment, and bulk
+callers leave one slot free for interactive ones. Slots held by a process
+that died are freed after ``LEASE_SECONDS``.
+
+    python -m app.rate_limit status
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_LIMITER_PATH = "cache/rate_limits.db"
+INTERACTIVE = 0
+DEFAULT = 1
+BULK = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", DEFAULT: "default", BULK: "bulk"}
+# Slots of a process that died without releasing them
+LEASE_SECONDS = 300.0
+# Waiters refresh their row while they wait; older rows belong to a process that is gone
+WAITER_STALE_SECONDS = 5.0
+MAX_POLL_SECONDS = 0.5
+MIN_POLL_SECONDS = 0.05
+
+
+class LimiterTimeout(Exception):
+    """No slot became free before the caller's timeout"""
+
+
+@dataclass
+class Limit:
+    requests_per_minute: float = 0  # 0: no rate limit
+    max_concurrency: int = 0  # 0: no cap
+    burst: int = 1
+    # Slots only interactive callers may take
+    interactive_reserve: int = 1
+
+
+def limits_from_env() -> Dict[str, Limit]:
+    return {
+        "gemini": Limit(float(os.environ.get("GEMINI_RPM", 15)), int(os.environ.get("GEMINI_CONCURRENCY", 8))),
+        "serpapi": Limit(float(os.environ.get("SERPAPI_RPM", 60)), int(os.environ.get("SERPAPI_CONCURRENCY", 8))),
+    }
+
+
+class SharedLimiter:
+    """Token buckets and in-flight leases in SQLite; path None keeps them in this process only"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_LIMITER_PATH, limits: Optional[Dict[str, Limit]] = None):
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.limits = dict(limits or {})
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path or ":memory:", timeout=30, check_same_thread=False, isolation_level=None)
+        if path:
+            self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS buckets (provider TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+                        "updated_at REAL NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS leases (id INTEGER PRIMARY KEY AUTOINCREMENT, provider TEXT NOT NULL, "
+                        "priority INTEGER NOT NULL, pid INTEGER NOT NULL, expires_at REAL NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS waiters (id INTEGER PRIMARY KEY AUTOINCREMENT, provider TEXT NOT NULL, "
+                        "priority INTEGER NOT NULL, pid INTEGER NOT NULL, heartbeat REAL NOT NULL)")
+
+    def configure(self, provider: str, **changes) -> None:
+        """Change this process's limits for a provider, e.g. requests_per_minute from a CLI flag"""
+        limit = self.limits.get(provider, Limit())
+        self.limits[provider] = Limit(**{**limit.__dict__, **changes})
+
+    def _enqueue(self, provider: str, priority: int) -> int:
+        with self.lock:
+            return self.db.execute("INSERT INTO waiters (provider, priority, pid, heartbeat) VALUES (?, ?, ?, ?)",
+                                   (provider, priority, os.getpid(), time.time())).lastrowid
+
+    def _leave(self, waiter: int) -> None:
+        with self.lock:
+            self.db.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+
+    def _try_acquire(self, provider: str, priority: int, waiter: int) -> Tuple[Optional[int], float]:
+        """A lease id, or None and how long to wait before trying again"""
+        limit = self.limits.get(provider, Limit())
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+                self.db.execute("DELETE FROM waiters WHERE heartbeat < ? AND id != ?", (now - WAITER_STALE_SECONDS, waiter))
+                self.db.execute("UPDATE waiters SET heartbeat = ? WHERE id = ?", (now, waiter))
+                ahead = self.db.execute(
+                    "SELECT COUNT(*) FROM waiters WHERE provider = ? AND (priority < ? OR (priority = ? AND id < ?))",
+                    (provider, priority, priority, waiter)).fetchone()[0]
+                in_flight = self.db.execute("SELECT COUNT(*) FROM leases WHERE provider = ?", (provider,)).fetchone()[0]
+                tokens = self._refill(provider, limit, now)
+
+                capacity = limit.max_concurrency
+                if capacity and priority > INTERACTIVE:
+                    capacity = max(1, capacity - limit.interactive_reserve)
+                token_wait = (1 - tokens) * 60.0 / limit.requests_per_minute if limit.requests_per_minute else 0.0
+                if ahead or (capacity and in_flight >= capacity) or token_wait > 0:
+                    wait = token_wait
+                else:
+                    lease = self.db.execute(
+                        "INSERT INTO leases (provider, priority, pid, expires_at) VALUES (?, ?, ?, ?)",
+                        (provider, priority, os.getpid(), now + LEASE_SECONDS)).lastrowid
+                    self.db.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+                    if limit.requests_per_minute:
+                        self.db.execute("UPDATE buckets SET tokens = tokens - 1 WHERE provider = ?", (provider,))
+                    self.db.execute("COMMIT")
+                    return lease, 0.0
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return None, min(max(wait, MIN_POLL_SECONDS), MAX_POLL_SECONDS)
+
+    def _refill(self, provider: str, limit: Limit, now: float) -> float:
+        capacity = max(1, limit.burst)
+        row = self.db.execute("SELECT tokens, updated_at FROM buckets WHERE provider = ?", (provider,)).fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * limit.requests_per_minute / 60.0)
+        self.db.execute("INSERT INTO buckets (provider, tokens, updated_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(provider) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                        (provider, tokens, now))
+        return tokens
+
+    def acquire(self, provider: str, priority: int = DEFAULT, timeout: Optional[float] = None) -> int:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waiter = self._enqueue(provider, priority)
+        try:
+            while True:
+                lease, wait = self._try_acquire(provider, priority, waiter)
+                if lease is not None:
+                    return lease
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    raise LimiterTimeout(f"no {provider} slot within {timeout}s")
+                time.sleep(wait)
+        finally:
+            self._leave(waiter)
+
+    async def acquire_async(self, provider: str, priority: int = DEFAULT, timeout: Optional[float] = None) -> int:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waiter = self._enqueue(provider, priority)
+        try:
+            while True:
+                lease, wait = await asyncio.to_thread(self._try_acquire, provider, priority, waiter)
+                if lease is not None:
+                    return lease
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    raise LimiterTimeout(f"no {provider} slot within {timeout}s")
+                await asyncio.sleep(wait)
+        finally:
+            self._leave(waiter)
+
+    def release(self, lease: int) -> None:
+        with self.lock:
+            self.db.execute("DELETE FROM leases WHERE id = ?", (lease,))
+
+    @contextlib.contextmanager
+    def slot(self, provider: str, priority: int = DEFAULT, timeout: Optional[float] = None):
+        lease = self.acquire(provider, priority, timeout)
+        try:
+            yield
+        finally:
+            self.release(lease)
+
+    @contextlib.asynccontextmanager
+    async def slot_async(self, provider: str, priority: int = DEFAULT, timeout: Optional[float] = None):
+        lease = await self.acquire_async(provider, priority, timeout)
+        try:
+            yield
+        finally:
+            self.release(lease)
+
+    def status(self) -> Dict[str, dict]:
+        now = time.time()
+        with self.lock:
+            providers = {provider: {"tokens": round(tokens, 2), "in_flight": 0, "waiting": {}}
+                         for provider, tokens in self.db.execute("SELECT provider, tokens FROM buckets")}
+            for provider, count in self.db.execute(
+                    "SELECT provider, COUNT(*) FROM leases WHERE expires_at >= ? GROUP BY provider", (now,)):
+                providers.setdefault(provider, {"tokens": None, "in_flight": 0, "waiting": {}})["in_flight"] = count
+            for provider, priority, count in self.db.execute(
+                    "SELECT provider, priority, COUNT(*) FROM waiters WHERE heartbeat >= ? GROUP BY provider, priority",
+                    (now - WAITER_STALE_SECONDS,)):
+                entry = providers.setdefault(provider, {"tokens": None, "in_flight": 0, "waiting": {}})
+                entry["waiting"][PRIORITY_NAMES.get(priority, str(priority))] = count
+        return providers
+
+    def close(self) -> None:
+        self.db.close()
+
+
+class LimitedModel:
+    """Gemini model wrapper whose calls each wait for a slot of the shared limiter"""
+
+    def __init__(self, model, limiter: SharedLimiter, provider: str = "gemini", priority: int = DEFAULT,
+                 timeout: Optional[float] = None):
+        self.model = model
+        self.limiter = limiter
+        self.provider = provider
+        self.priority = priority
+        self.timeout = timeout
+        self.model_name = getattr(model, "model_name", type(model).__name__)
+
+    def generate_content(self, prompt: str, stream: bool = False, **options):
+        if stream:
+            return self._stream(prompt, options)
+        with self.limiter.slot(self.provider, self.priority, self.timeout):
+            return self.model.generate_content(prompt, **options)
+
+    def _stream(self, prompt: str, options: dict):
+        # The slot is held until the last chunk has arrived
+        with self.limiter.slot(self.provider, self.priority, self.timeout):
+            yield from self.model.generate_content(prompt, stream=True, **options)
+
+    async def generate_content_async(self, prompt: str, **options):
+        async with self.limiter.slot_async(self.provider, self.priority, self.timeout):
+            if hasattr(self.model, "generate_content_async"):
+                return await self.model.generate_content_async(prompt, **options)
+            return await asyncio.to_thread(self.model.generate_content, prompt, **options)
+
+
+_default_limiter: Optional[SharedLimiter] = None
+
+
+def default_limiter() -> SharedLimiter:
+    """The limiter shared with other processes, at RATE_LIMIT_PATH with limits from GEMINI_RPM, GEMINI_CONCURRENCY,
+    SERPAPI_RPM and SERPAPI_CONCURRENCY"""
+    global _default_limiter
+    if _default_limiter is None:
+        _default_limiter = SharedLimiter(os.environ.get("RATE_LIMIT_PATH", DEFAULT_LIMITER_PATH), limits_from_env())
+    return _default_limiter
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Shared rate limiter for Gemini and SerpApi calls")
+    parser.add_argument("command", choices=["status"])
+    parser.parse_args(argv)
+
+    limiter = default_limiter()
+    status = limiter.status()
+    if not status:
+        print("🚦 No provider has been called yet")
+    for provider, entry in status.items():
+        limit = limiter.limits.get(provider, Limit())
+        waiting = ", ".join(f"{count} {name}" for name, count in entry["waiting"].items()) or "none"
+        print(f"🚦 {provider}: {entry['in_flight']}/{limit.max_concurrency or '∞'} in flight, "
+              f"{entry['tokens']} tokens at {limit.requests_per_minute or '∞'} rpm, waiting: {waiting}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""Yield-aware recrawl scheduling for the search queries of each spider.
+
+``QueryYieldMiddleware`` tags every start request (one search query) and
+the pages that follow from it with a query id, and records per crawl how
+many requests the query cost and how many new items and price changes it
+found (``query_stats``). The planner turns that history into a smoothed
+yield score per query and gives each query its own recrawl interval and a
+share of a daily request budget (``query_schedule``): productive queries
+come round often with room for deep pagination, dead ones are checked
+rarely and shallowly.
+
+    python -m app.recrawl plan                  # recompute and print the schedule
+    python -m app.recrawl run-due               # crawl the queries that are due now
+    python -m app.recrawl daemon --every 600    # keep doing that
+"""
+import argparse
+import datetime
+import json
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Request
+from sqlalchemy import func
+
+from app.database import Base, SessionLocal, engine
+from app.models import Item, Part, QuerySchedule, QueryStat
+
+QUERY_ID_META = "query_id"
+RECRAWL_SPIDERS = ("ebay", "aliexpress", "schmiedmann_e28", "schmiedmann_f10")
+
+DEFAULT_DAILY_BUDGET = 2000
+BASE_INTERVAL_HOURS = 24.0
+MIN_INTERVAL_HOURS = 2.0
+MAX_INTERVAL_HOURS = 24.0 * 7
+# Weight of the latest crawl in the smoothed score
+SMOOTHING = 0.5
+# Share of the budget every query gets regardless of yield, so dead queries are still sampled
+EXPLORATION_SHARE = 0.1
+# Scraped URLs whose stored price is looked up in one query; below SQLite's bound parameter limit
+PRICE_LOOKUP_BATCH = 500
+
+
+def query_id(spider_name: str, request: Request) -> str:
+    return f"{spider_name} {request.url}"
+
+
+def listing_url(entry) -> Optional[str]:
+    """The URL a scraped entry is stored under: item_url for items, ebay_url for legacy parts (Schmiedmann)"""
+    if isinstance(entry, Request) or not hasattr(entry, "get"):
+        return None
+    return entry.get("item_url") or entry.get("ebay_url")
+
+
+class QueryYieldMiddleware:
+    """Spider middleware that records requests, new items and price changes per search query.
+
+    With ``RECRAWL_QUERY_BUDGETS`` (a JSON object of query id to maximum
+    requests) only those queries are crawled, each within its budget.
+    """
+
+    def __init__(self, crawler, budgets: Optional[Dict[str, int]] = None, session_factory=SessionLocal):
+        self.crawler = crawler
+        self.budgets = budgets
+        self.session_factory = session_factory
+        self.counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        # Stored prices of the URLs scraped so far, looked up in batches as pages are parsed
+        self.known_prices: Dict[str, float] = {}
+        self.looked_up: Set[str] = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("RECRAWL_STATS_ENABLED", True):
+            raise NotConfigured
+        budgets = crawler.settings.get("RECRAWL_QUERY_BUDGETS")
+        if isinstance(budgets, str):
+            budgets = json.loads(budgets) if budgets else None
+        middleware = cls(crawler, budgets)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        db = self.session_factory()
+        try:
+            Base.metadata.create_all(bind=db.get_bind(), tables=[QueryStat.__table__, QuerySchedule.__table__])
+        finally:
+            db.close()
+
+    def _look_up_prices(self, response, entries: List) -> None:
+        """Load the stored prices of the item URLs in entries that were not looked up yet"""
+        if response.meta.get(QUERY_ID_META) is None:
+            return
+        urls = {listing_url(entry) for entry in entries}
+        urls = [url for url in urls if url and url not in self.looked_up]
+        if not urls:
+            return
+        db = self.session_factory()
+        try:
+            for start in range(0, len(urls), PRICE_LOOKUP_BATCH):
+                batch = urls[start:start + PRICE_LOOKUP_BATCH]
+                self.known_prices.update(db.query(Item.item_url, Item.price).filter(Item.item_url.in_(batch)).all())
+                self.known_prices.update(db.query(Part.ebay_url, Part.price).filter(Part.ebay_url.in_(batch)).all())
+        finally:
+            db.close()
+        self.looked_up.update(urls)
+
+    def _track_batch(self, response, entries: List) -> List:
+        self._look_up_prices(response, entries)
+        return [entry for entry in (self._track(response, entry) for entry in entries) if entry is not None]
+
+    def _tag_start(self, request, spider):
+        if not isinstance(request, Request):
+            return request
+        query = query_id(spider.name, request)
+        if self.budgets is not None and query not in self.budgets:
+            return None
+        request.meta[QUERY_ID_META] = query
+        self.counts[query]["requests"] += 1
+        return request
+
+    def process_start_requests(self, start_requests, spider):
+        for request in start_requests:
+            request = self._tag_start(request, spider)
+            if request is not None:
+                yield request
+
+    async def process_start(self, start):
+        # Scrapy 2.13+ start hook
+        async for request in start:
+            request = self._tag_start(request, self.crawler.spider)
+            if request is not None:
+                yield request
+
+    def _track(self, response, entry):
+        query = response.meta.get(QUERY_ID_META)
+        if query is None:
+            return entry
+        if isinstance(entry, Request):
+            if QUERY_ID_META not in entry.meta:
+                counts = self.counts[query]
+                if self.budgets is not None and counts["requests"] >= self.budgets[query]:
+                    counts["over_budget"] += 1
+                    return None
+                entry.meta[QUERY_ID_META] = query
+                counts["requests"] += 1
+            return entry
+        url = listing_url(entry)
+        counts = self.counts[query]
+        counts["items"] += 1
+        if url:
+            price = entry.get("price")
+            if url not in self.known_prices:
+                counts["new_items"] += 1
+            elif price is not None and self.known_prices[url] != price:
+                counts["price_changes"] += 1
+            self.known_prices[url] = price
+        return entry
+
+    def process_spider_output(self, response, result, spider):
+        batch = []
+        for entry in result:
+            batch.append(entry)
+            if len(batch) >= PRICE_LOOKUP_BATCH:
+                yield from self._track_batch(response, batch)
+                batch = []
+        yield from self._track_batch(response, batch)
+
+    async def process_spider_output_async(self, response, result, spider):
+        batch = []
+        async for entry in result:
+            batch.append(entry)
+            if len(batch) >= PRICE_LOOKUP_BATCH:
+                for tracked in self._track_batch(response, batch):
+                    yield tracked
+                batch = []
+        for tracked in self._track_batch(response, batch):
+            yield tracked
+
+    def spider_closed(self, spider):
+        if not self.counts:
+            return
+        db = self.session_factory()
+        try:
+            now = datetime.datetime.utcnow()
+            for query, counts in self.counts.items():
+                db.add(QueryStat(query_id=query, spider=spider.name, crawled_at=now,
+                                 requests=counts["requests"], items=counts["items"],
+                                 new_items=counts["new_items"], price_changes=counts["price_changes"]))
+                schedule = db.query(QuerySchedule).filter(QuerySchedule.query_id == query).first()
+                if schedule is not None:
+                    schedule.last_crawled = now
+                    schedule.next_due = now + datetime.timedelta(hours=schedule.interval_hours or BASE_INTERVAL_HOURS)
+            db.commit()
+        finally:
+            db.close()
+        spider.logger.info(f"📈 Recorded yield for {len(self.counts)} queries")
+
+
+def query_scores(stats: Iterable[QueryStat]) -> Dict[str, float]:
+    """Exponentially smoothed (new items + price changes) per request, per query"""
+    scores: Dict[str, float] = {}
+    for stat in sorted(stats, key=lambda s: s.crawled_at):
+        value = (stat.new_items + stat.price_changes) / max(stat.requests, 1)
+        previous = scores.get(stat.query_id)
+        scores[stat.query_id] = value if previous is None else SMOOTHING * value + (1 - SMOOTHING) * previous
+    return scores
+
+
+def plan_schedule(db, daily_budget: int = DEFAULT_DAILY_BUDGET,
+                  now: Optional[datetime.datetime] = None) -> List[QuerySchedule]:
+    """Assign every known query an interval and a share of the daily request budget"""
+    now = now or datetime.datetime.utcnow()
+    scores = query_scores(db.query(QueryStat).all())
+    schedules = {schedule.query_id: schedule for schedule in db.query(QuerySchedule).all()}
+    spiders = dict(db.query(QueryStat.query_id, QueryStat.spider).distinct().all())
+    last_crawled = dict(db.query(QueryStat.query_id, func.max(QueryStat.crawled_at)).group_by(QueryStat.query_id).all())
+    for query in schedules:
+        spiders.setdefault(query, schedules[query].spider)
+    if not spiders:
+        return []
+
+    positive = [score for score in scores.values() if score > 0]
+    mean = sum(positive) / len(positive) if positive else 0.0
+    # Queries never crawled yet are scored at the mean so they get a fair first look
+    weights = {query: scores.get(query, mean) for query in spiders}
+    total = sum(weights.values())
+    count = len(weights)
+
+    for query, spider in spiders.items():
+        score = scores.get(query)
+        weight = weights[query]
+        share = EXPLORATION_SHARE / count + (1 - EXPLORATION_SHARE) * (weight / total if total else 1 / count)
+        if score is None or not mean:
+            interval = BASE_INTERVAL_HOURS
+        elif score <= 0:
+            interval = MAX_INTERVAL_HOURS
+        else:
+            interval = min(MAX_INTERVAL_HOURS, max(MIN_INTERVAL_HOURS, BASE_INTERVAL_HOURS * mean / score))
+        # The per-crawl allowance spends this query's share of the budget over its interval
+        max_requests = max(1, round(share * daily_budget * interval / 24.0))
+
+        schedule = schedules.get(query)
+        if schedule is None:
+            schedule = QuerySchedule(query_id=query, spider=spider, next_due=now)
+            db.add(schedule)
+        schedule.score = round(score, 4) if score is not None else None
+        schedule.interval_hours = round(interval, 2)
+        schedule.budget_share = round(share, 4)
+        schedule.max_requests = max_requests
+        schedule.last_crawled = last_crawled.get(query, schedule.last_crawled)
+        if schedule.last_crawled is not None:
+            schedule.next_due = schedule.last_crawled + datetime.timedelta(hours=interval)
+        schedules[query] = schedule
+    db.commit()
+    return sorted(schedules.values(), key=lambda s: (s.next_due or now, s.query_id))
+
+
+def due_queries(db, now: Optional[datetime.datetime] = None) -> Dict[str, Dict[str, int]]:
+    """Budgets of the queries that are due, grouped by spider"""
+    now = now or datetime.datetime.utcnow()
+    due: Dict[str, Dict[str, int]] = defaultdict(dict)
+    for schedule in db.query(QuerySchedule).filter(QuerySchedule.next_due <= now).all():
+        due[schedule.spider][schedule.query_id] = schedule.max_requests
+    return dict(due)
+
+
+def crawl_due(daily_budget: int = DEFAULT_DAILY_BUDGET, spiders: Iterable[str] = RECRAWL_SPIDERS) -> Dict[str, int]:
+    """Crawl each spider's due queries within their budgets; returns the query count per spider"""
+    db = SessionLocal()
+    try:
+        Base.metadata.create_all(bind=engine, tables=[QueryStat.__table__, QuerySchedule.__table__])
+        known = {spider for (spider,) in db.query(QueryStat.spider).distinct()}
+        plan_schedule(db, daily_budget)
+        due = due_queries(db)
+    finally:
+        db.close()
+
+    crawled = {}
+    for spider in spiders:
+        command = [sys.executable, "-m", "scrapy", "crawl", spider]
+        if spider in due:
+            command += ["-s", f"RECRAWL_QUERY_BUDGETS={json.dumps(due[spider])}"]
+            print(f"🕷️ Recrawling {len(due[spider])} due {spider} queries")
+        elif spider not in known:
+            # A spider without any history is crawled in full once to seed its schedule
+            print(f"🕷️ Crawling all {spider} queries to seed the schedule")
+        else:
+            continue
+        subprocess.run(command)
+        crawled[spider] = len(due.get(spider, {}))
+    return crawled
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Yield-aware recrawl scheduling of search queries")
+    parser.add_argument("command", choices=["plan", "run-due", "daemon"])
+    parser.add_argument("--budget", type=int, default=DEFAULT_DAILY_BUDGET, help="requests per day across all queries")
+    parser.add_argument("--every", type=int, default=600, help="daemon: seconds between checks for due queries")
+    args = parser.parse_args(argv)
+
+    if args.command == "plan":
+        Base.metadata.create_all(bind=engine, tables=[QueryStat.__table__, QuerySchedule.__table__])
+        db = SessionLocal()
+        try:
+            for s in plan_schedule(db, args.budget):
+                score = "new" if s.score is None else f"{s.score:.3f}"
+                print(f"📅 {s.query_id}\n    score {score}, every {s.interval_hours}h, "
+                      f"{s.budget_share:.1%} of budget, up to {s.max_requests} requests, due {s.next_due:%Y-%m-%d %H:%M}")
+        finally:
+            db.close()
+    elif args.command == "run-due":
+        crawl_due(args.budget)
+    else:
+        while True:
+            crawl_due(args.budget)
+            time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -78,3 +78,45 @@ class Part(PartBase):
 
     class Config:
         from_attributes = True
+
+# Crawl run history
+class CrawlRun(BaseModel):
+    id: int
+    spider: str
+    started_at: datetime
+    finished_at: datetime | None = None
+    finish_reason: str | None = None
+    duration_seconds: float | None = None
+    requests: int = 0
+    responses: int = 0
+    items: int = 0
+    blocked: int = 0
+    fallback: int = 0
+    requests_per_second: float | None = None
+    items_per_second: float | None = None
+    latency_p50: float | None = None
+    latency_p95: float | None = None
+    parse_p95: float | None = None
+    write_p95: float | None = None
+
+    class Config:
+        from_attributes = True
+
+# Story warmup history
+class StoryWarmupRun(BaseModel):
+    id: int
+    started_at: datetime
+    duration_seconds: float | None = None
+    combinations: int = 0
+    already_warm: int = 0
+    generated: int = 0
+    ranked: int = 0
+    failed: int = 0
+    stories_added: int = 0
+    llm_calls: int = 0
+    cache_hits: int = 0
+    estimated_tokens: int = 0
+    llm_seconds: float = 0.0
+
+    class Config:
+        from_attributes = True
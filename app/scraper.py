@@ -25,13 +25,16 @@ def scrape_and_store():
     
     try:
         items = run_spider()
-        stored_items = []
+        new_items = {}
         for item in items:
-            if crud.get_part_by_ebay_url(db, ebay_url=item['ebay_url']):
-                continue
-
-            title_he = translator.translate(item['title_en'])
+            if item['ebay_url'] not in new_items and not crud.get_part_by_ebay_url(db, ebay_url=item['ebay_url']):
+                new_items[item['ebay_url']] = item
+        new_items = list(new_items.values())
+        # One batch for all titles: repeated titles and ones seen before are not sent again
+        titles_he = translator.translate_batch([item['title_en'] for item in new_items])
 
+        stored_items = []
+        for item, title_he in zip(new_items, titles_he):
             part_data = {
                 "title_en": item['title_en'],
                 "title_he": title_he,
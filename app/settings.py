@@ -14,12 +14,83 @@ RANDOMIZE_DOWNLOAD_DELAY = True
 # Pipeline configuration
 ITEM_PIPELINES = {
    'app.pipelines.RonaldoItemsPipeline': 300,
+   'app.pipelines.IngestLogPipeline': 310,
 }
 
-# For spiders using Playwright
+# "db" writes items straight to SQLite; "log" appends them to the ingest log
+# for `python -m app.ingest_log load` to bulk-ingest separately
+INGEST_MODE = 'db'
+INGEST_LOG_DIR = 'ingest_log'
+INGEST_LOG_SEGMENT_RECORDS = 5000
+
+# Database writes run on a dedicated writer thread instead of the reactor thread.
+# When this many items are waiting to be written, the pipeline applies backpressure.
+PIPELINE_WRITER_THREAD = True
+PIPELINE_WRITE_QUEUE_SIZE = 100
+
+# Raw page archive for offline re-parsing (`python -m app.page_archive reparse`).
+# The middleware sits after HttpCompressionMiddleware so bodies are stored decompressed.
+DOWNLOADER_MIDDLEWARES = {
+    'app.page_archive.PageArchiveMiddleware': 100,
+}
+PAGE_ARCHIVE_ENABLED = False
+PAGE_ARCHIVE_DIR = 'page_archive'
+
+# Every crawl keeps its request queue and seen fingerprints under
+# CRAWL_STATE_DIR/<spider>/; set CRAWL_STATE_RESUME to continue a killed crawl
+# instead of starting over.
+SCHEDULER = 'app.crawl_state.ResumableScheduler'
+SPIDER_MIDDLEWARES = {
+    'app.crawl_state.CrawlStateMiddleware': 50,
+    'app.recrawl.QueryYieldMiddleware': 60,
+    'app.crawl_metrics.ParseTimingMiddleware': 950,
+}
+CRAWL_STATE_DIR = 'crawl_state'
+CRAWL_STATE_RESUME = False
+
+# Shared frontier for `python -m app.frontier worker` processes. Leases that are
+# not completed in time go back to the queue. FRONTIER_DOMAIN_DELAY 0 means new
+# domains start at the spider's DOWNLOAD_DELAY (`python -m app.frontier limit`).
+FRONTIER_PATH = 'crawl_state/frontier.db'
+FRONTIER_LEASE_SECONDS = 300
+FRONTIER_MAX_ATTEMPTS = 3
+FRONTIER_DOMAIN_DELAY = 0
+
+# Per-query yield history for `python -m app.recrawl`, which sets
+# RECRAWL_QUERY_BUDGETS to crawl only the queries that are due.
+RECRAWL_STATS_ENABLED = True
+RECRAWL_QUERY_BUDGETS = None
+
+# Parse callbacks of spiders using PoolParsingMixin run in worker processes
+# instead of on the reactor thread. 0 workers means one per CPU core.
+PARSE_POOL_ENABLED = False
+PARSE_POOL_WORKERS = 0
+
+# eBay search pagination: up to EBAY_MAX_PAGES pages of EBAY_ITEMS_PER_PAGE
+# listings per search, EBAY_PAGE_WINDOW pages in flight at once. A search stops
+# as soon as one of its pages adds no unseen listings.
+EBAY_MAX_PAGES = 5
+EBAY_ITEMS_PER_PAGE = 240
+EBAY_PAGE_WINDOW = 2
+
+# For spiders using Playwright. Crawlers in the same process share one browser
+# and its contexts; images, media, fonts and trackers are never downloaded.
 DOWNLOAD_HANDLERS = {
-    "http": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
-    "https": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
+    "http": "app.browser_pool.SharedBrowserDownloadHandler",
+    "https": "app.browser_pool.SharedBrowserDownloadHandler",
 }
+PLAYWRIGHT_ABORT_REQUEST = 'app.browser_pool.should_abort_request'
+PLAYWRIGHT_MAX_PAGES_PER_DOMAIN = 2
+
+EXTENSIONS = {
+    'app.browser_pool.BrowserPoolStats': 500,
+    'app.crawl_metrics.CrawlMetrics': 510,
+}
+
+# Live crawl metrics, snapshotted every METRICS_SNAPSHOT_INTERVAL seconds for
+# the API's /metrics endpoint; each run is summarised in the crawl_runs table.
+METRICS_ENABLED = True
+METRICS_DIR = 'crawl_state/metrics'
+METRICS_SNAPSHOT_INTERVAL = 5
 
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
@@ -1,8 +1,78 @@
 import scrapy
+import json
 import re
 import random
+from typing import Any, Dict, List, Optional
 from urllib.parse import quote
 
+from app.crawl_metrics import BLOCK_STATUSES, count_event
+from app.extraction import ALIEXPRESS_CONDITIONS, extract_attributes
+
+# Script assignments that carry the search state the listing is rendered from
+STATE_MARKERS = ("window._dida_config_._init_data_", "window.runParams")
+ITEM_URL = "https://www.aliexpress.com/item/{}.html"
+
+
+def _decode_state(text: str, start: int) -> Optional[Dict[str, Any]]:
+    """Decode the JSON object assigned after ``start``, unwrapping the ``{ data: {...} }`` literal"""
+    decoder = json.JSONDecoder()
+    brace = text.find("{", start)
+    while brace != -1:
+        try:
+            state, _ = decoder.raw_decode(text, brace)
+            return state if isinstance(state, dict) else None
+        except ValueError:
+            # The dida blob wraps the JSON in a JS object literal with unquoted keys
+            brace = text.find("{", brace + 1)
+    return None
+
+
+def find_embedded_state(html: str) -> Optional[Dict[str, Any]]:
+    """The search state object embedded in an AliExpress search page, if any"""
+    for marker in STATE_MARKERS:
+        position = html.find(marker)
+        if position == -1:
+            continue
+        equals = html.find("=", position + len(marker))
+        state = _decode_state(html, equals) if equals != -1 else None
+        if state:
+            return state
+    return None
+
+
+def find_listings(state: Any) -> List[Dict[str, Any]]:
+    """The ``itemList.content`` listings anywhere in the state, without assuming its nesting"""
+    stack = [state]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            item_list = node.get("itemList")
+            if isinstance(item_list, dict) and isinstance(item_list.get("content"), list):
+                return [listing for listing in item_list["content"] if isinstance(listing, dict)]
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return []
+
+
+def _listing_title(listing: Dict[str, Any]) -> Optional[str]:
+    title = listing.get("title")
+    if isinstance(title, dict):
+        title = title.get("displayTitle") or title.get("seoTitle")
+    return (title or listing.get("productTitle") or "").strip() or None
+
+
+def _listing_price(listing: Dict[str, Any]) -> Optional[Any]:
+    prices = listing.get("prices") or {}
+    for key in ("salePrice", "originalPrice"):
+        price = prices.get(key) or {}
+        if price.get("minPrice") is not None:
+            return price["minPrice"]
+        if price.get("formattedPrice"):
+            return price["formattedPrice"]
+    return listing.get("price")
+
+
 class AliexpressSpider(scrapy.Spider):
     name = "aliexpress"
     
@@ -66,6 +136,13 @@ class AliexpressSpider(scrapy.Spider):
     def parse(self, response, category, era):
         """Parse AliExpress search results with fallback to demo data"""
         
+        # The listing is rendered client-side from a state blob, so read that first
+        embedded = list(self.parse_embedded_state(response, category, era))
+        if embedded:
+            self.logger.info(f"✅ Found {len(embedded)} items in the embedded search state")
+            yield from embedded
+            return
+
         # Check for blocking indicators
         blocking_indicators = ["blocked", "captcha", "punish", "verification", "forbidden"]
         page_content = response.text.lower()
@@ -73,6 +150,10 @@ class AliexpressSpider(scrapy.Spider):
         
         if is_blocked or response.status == 403:
             self.logger.warning(f"🚫 Blocked/CAPTCHA detected for {response.url}. Using demo data.")
+            if response.status not in BLOCK_STATUSES:
+                # Blocking statuses are already counted by the CrawlMetrics extension
+                count_event(self, "blocked")
+            count_event(self, "fallback")
             yield from self._generate_demo_data(category, era)
             return
 
@@ -96,11 +177,12 @@ class AliexpressSpider(scrapy.Spider):
         
         if not items_found:
             self.logger.warning(f"⚠️ No items found with any selector. Using demo data for {category}/{era}")
+            count_event(self, "fallback")
             yield from self._generate_demo_data(category, era)
             return
             
         # Parse found items
-        for item in items[:10]:  # Limit to avoid overwhelming
+        for item in items:
             title = self._extract_text(item, [
                 "h1::text", "h2::text", "h3::text", ".item-title::text",
                 "a[title]::attr(title)", ".title::text"
@@ -121,31 +203,43 @@ class AliexpressSpider(scrapy.Spider):
             ])
 
             if title and price and link:
-                # Clean and process data
-                price_float = self._extract_price(price)
                 full_link = response.urljoin(link) if link else ""
-                
-                # Extract additional info
-                team = self._extract_team(title, era)
-                year = self._extract_year(title)
-                size = self._extract_size(title)
-                condition = self._extract_condition(title)
+                yield self._build_item(title, self._extract_price(price), full_link, image_url, category, era)
 
-                yield {
-                    "title_en": title,
-                    "price": price_float,
-                    "item_url": full_link,
-                    "img_url": image_url,
-                    "era": era,
-                    "category": category,
-                    "team": team,
-                    "year": year,
-                    "size": size,
-                    "condition": condition,
-                    "source": "AliExpress",
-                    "description_en": f"Cristiano Ronaldo {category.replace('_', ' ')} from {era} era. {title}",
-                    "description_he": f"פריט של כריסטיאנו רונאלדו מתקופת {era}. {title}",
-                }
+    def parse_embedded_state(self, response, category, era):
+        """Yield every listing from the search state embedded in the page, without a browser"""
+        state = find_embedded_state(response.text)
+        if not state:
+            return
+        for listing in find_listings(state):
+            title = _listing_title(listing)
+            price = _listing_price(listing)
+            product_id = listing.get("productId")
+            if not title or price is None or not product_id:
+                continue
+            image_url = (listing.get("image") or {}).get("imgUrl") or ""
+            if image_url.startswith("//"):
+                image_url = "https:" + image_url
+            price_float = float(price) if isinstance(price, (int, float)) else self._extract_price(str(price))
+            yield self._build_item(title, price_float, ITEM_URL.format(product_id), image_url, category, era)
+
+    def _build_item(self, title, price, item_url, image_url, category, era):
+        attributes = extract_attributes(title, era=era, conditions=ALIEXPRESS_CONDITIONS, default_condition="New")
+        return {
+            "title_en": title,
+            "price": price,
+            "item_url": item_url,
+            "img_url": image_url,
+            "era": era,
+            "category": category,
+            "team": attributes["team"],
+            "year": attributes["year"],
+            "size": attributes["size"],
+            "condition": attributes["condition"],
+            "source": "AliExpress",
+            "description_en": f"Cristiano Ronaldo {category.replace('_', ' ')} from {era} era. {title}",
+            "description_he": f"פריט של כריסטיאנו רונאלדו מתקופת {era}. {title}",
+        }
 
     def _extract_text(self, item, selectors):
         """Try multiple selectors to extract text"""
@@ -177,38 +271,6 @@ class AliexpressSpider(scrapy.Spider):
         except ValueError:
             return 0.0
 
-    def _extract_team(self, title, era):
-        """Extract team name from title based on era"""
-        teams = {
-            "Sporting": "Sporting CP",
-            "United": "Manchester United", 
-            "Madrid": "Real Madrid",
-            "Juventus": "Juventus",
-            "Portugal": "Portugal National Team",
-            "Al-Nassr": "Al-Nassr"
-        }
-        return teams.get(era, era)
-
-    def _extract_year(self, title):
-        """Extract year from title"""
-        year_match = re.search(r'\b(19|20)\d{2}\b', title)
-        return year_match.group() if year_match else None
-
-    def _extract_size(self, title):
-        """Extract clothing size from title"""
-        size_match = re.search(r'\b(XS|S|M|L|XL|XXL|\d+)\b', title.upper())
-        return size_match.group() if size_match else None
-
-    def _extract_condition(self, title):
-        """Extract condition from title"""
-        if re.search(r'\b(new|brand new)\b', title.lower()):
-            return "New"
-        elif re.search(r'\b(used|pre-owned)\b', title.lower()):
-            return "Used"
-        elif re.search(r'\b(replica|fake)\b', title.lower()):
-            return "Replica"
-        return "New"
-
     def _generate_demo_data(self, category, era):
         """Generate demo Ronaldo items when real scraping fails"""
         demo_items = {
@@ -1,9 +1,56 @@
 import scrapy
 import re
 import random
+import weakref
 from urllib.parse import urljoin, quote
 from datetime import datetime
-from typing import Generator, Dict, Any, Optional
+from typing import Generator, Dict, Any, List, Optional
+
+from app.crawl_metrics import BLOCK_STATUSES, count_event
+
+# Keys the catalog JSON may use for each field, matched case-insensitively
+CATALOG_TITLE_KEYS = ('name', 'title', 'productname', 'product_name', 'displayname', 'headline')
+CATALOG_PRICE_KEYS = ('price', 'priceinclvat', 'salesprice', 'saleprice', 'currentprice', 'finalprice', 'unitprice', 'amount')
+CATALOG_URL_KEYS = ('url', 'producturl', 'product_url', 'link', 'href', 'permalink', 'slug')
+CATALOG_IMAGE_KEYS = ('image', 'imageurl', 'image_url', 'images', 'img', 'thumbnail', 'thumb', 'picture', 'photo')
+CATALOG_WAIT_MS = 10000
+
+
+def _lower_keys(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {str(key).lower(): value for key, value in record.items()}
+
+
+def _first_value(record: Dict[str, Any], keys) -> Any:
+    for key in keys:
+        value = record.get(key)
+        # Prices and images are sometimes nested, e.g. {"price": {"amount": 12.5}}
+        if isinstance(value, dict):
+            value = _first_value(_lower_keys(value), ('value', 'amount', 'url', 'src', 'formatted') + tuple(keys))
+        elif isinstance(value, list):
+            value = value[0] if value and not isinstance(value[0], (dict, list)) else None
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def find_product_records(data: Any, max_depth: int = 6) -> List[Dict[str, Any]]:
+    """Find the product objects in a catalog JSON payload: dicts in a list that have a title and a price"""
+    records: List[Dict[str, Any]] = []
+    if max_depth < 0:
+        return records
+    if isinstance(data, list):
+        products = [entry for entry in data if isinstance(entry, dict)
+                    and _first_value(_lower_keys(entry), CATALOG_TITLE_KEYS) is not None
+                    and _first_value(_lower_keys(entry), CATALOG_PRICE_KEYS) is not None]
+        if products:
+            return products
+        for entry in data:
+            records.extend(find_product_records(entry, max_depth - 1))
+    elif isinstance(data, dict):
+        for value in data.values():
+            records.extend(find_product_records(value, max_depth - 1))
+    return records
+
 
 class SchmiedmannSpider(scrapy.Spider):
     """Base spider class for Schmiedmann.com BMW parts scraping."""
@@ -14,9 +61,13 @@ class SchmiedmannSpider(scrapy.Spider):
     # Custom settings for JavaScript-heavy content
     custom_settings = {
         'DOWNLOAD_HANDLERS': {
-            "http": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
-            "https": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
+            "http": "app.browser_pool.SharedBrowserDownloadHandler",
+            "https": "app.browser_pool.SharedBrowserDownloadHandler",
         },
+        'PLAYWRIGHT_ABORT_REQUEST': 'app.browser_pool.should_abort_request',
+        # Stricter than the project's 2. The cap is shared by every spider on the domain in the
+        # process and fixed by the first one to open a page, so all Schmiedmann spiders use 1
+        'PLAYWRIGHT_MAX_PAGES_PER_DOMAIN': 1,
         'PLAYWRIGHT_BROWSER_TYPE': 'chromium',
         'PLAYWRIGHT_LAUNCH_OPTIONS': {
             'headless': True,
@@ -59,12 +110,170 @@ class SchmiedmannSpider(scrapy.Spider):
         'HTTPERROR_ALLOWED_CODES': [403, 404],
     }
     
+    # Product container selectors, most specific first
+    PRODUCT_SELECTORS = [
+        '.product-inner',
+        '.product-card',
+        '.product-item',
+        '.item-card',
+        '[data-product-id]',
+        '.spare-part-item',
+        '.product-box',
+        '.article-item',
+        '.part-card',
+        '.catalog-item',
+        '.grid-item',
+        '.product-tile',
+        '.shop-item',
+        'article.product',
+        'div[class*="product"]',
+        'div[class*="item"]',
+        'li.product',
+        '.product-list-item',
+        '.catalog-product',
+        '.shop-product',
+    ]
+
     # EUR to USD conversion rate (should be updated regularly)
     EUR_TO_USD_RATE = 1.08
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, capture_xhr=False, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.series = getattr(self, 'series', 'E28')  # Default to E28
+        # Read the catalog JSON the page fetches instead of scraping the rendered DOM,
+        # e.g. `scrapy crawl schmiedmann_e28 -a capture_xhr=1`
+        self.capture_xhr = str(capture_xhr).lower() in ('1', 'true', 'yes')
+        # Keyed by the Playwright page itself, so responses of a closed page go with it
+        self._catalog_responses = weakref.WeakKeyDictionary()
+
+    def _page_request(self, url, **kwargs) -> scrapy.Request:
+        """Build a Playwright request for a listing page in the configured extraction mode"""
+        if not self.capture_xhr:
+            return scrapy.Request(url, callback=self.parse, meta={'playwright': True}, **kwargs)
+        return scrapy.Request(
+            url,
+            callback=self.parse_catalog_json,
+            errback=self._close_page,
+            meta={
+                'playwright': True,
+                'playwright_include_page': True,
+                # Handlers are given by name so the request stays serializable
+                'playwright_page_event_handlers': {'response': 'capture_catalog_response'},
+                # The grid is filled from JSON, so there is no need to wait for the full render
+                'playwright_page_goto_kwargs': {'wait_until': 'domcontentloaded'},
+            },
+            **kwargs
+        )
+
+    def _is_catalog_response(self, response) -> bool:
+        return (
+            response.request.resource_type in ('xhr', 'fetch')
+            and 'json' in (response.headers.get('content-type') or '')
+        )
+
+    def capture_catalog_response(self, response) -> None:
+        """Page 'response' event handler: keep JSON XHR/fetch responses per page"""
+        if self._is_catalog_response(response):
+            self._catalog_responses.setdefault(response.frame.page, []).append(response)
+
+    async def _catalog_records(self, page) -> List[Dict[str, Any]]:
+        responses = self._catalog_responses.pop(page, [])
+        if not responses:
+            try:
+                responses = [await page.wait_for_response(self._is_catalog_response, timeout=CATALOG_WAIT_MS)]
+            except Exception:
+                return []
+            self._catalog_responses.pop(page, None)
+        records = []
+        for catalog_response in responses:
+            try:
+                records.extend(find_product_records(await catalog_response.json()))
+            except Exception as e:
+                self.logger.debug(f"Skipping unreadable JSON from {catalog_response.url}: {e}")
+        return records
+
+    async def parse_catalog_json(self, response, **kwargs):
+        """Yield items from the catalog JSON captured while the page loaded, falling back to the DOM"""
+        page = response.meta.get('playwright_page')
+        try:
+            records = await self._catalog_records(page) if page else []
+            if page and not records:
+                response = await self._rendered_response(page, response)
+        finally:
+            if page:
+                await page.close()
+                # Responses arriving after the records were read
+                self._catalog_responses.pop(page, None)
+
+        if not records:
+            self.logger.warning(f"⚠️ No catalog JSON captured for {response.url}, parsing the DOM instead")
+            for result in self.parse(response, **kwargs):
+                yield result
+            return
+
+        self.logger.info(f"✅ Found {len(records)} products in catalog JSON for {response.url}")
+        item_count = 0
+        for record in records:
+            item = self._item_from_record(record, response)
+            if item and self._is_valid_item(item):
+                item_count += 1
+                yield item
+
+        next_page = self._find_next_page(response)
+        if next_page and item_count > 0:
+            yield self._page_request(urljoin(response.url, next_page), headers={'Referer': response.url})
+
+    async def _rendered_response(self, page, response):
+        """The response with the page's current DOM once the product grid rendered"""
+        # domcontentloaded fires before the client fills the grid, so the DOM fallback would see none of it
+        try:
+            # The catch-all class matches below would also match the page chrome
+            rendered = ', '.join(selector for selector in self.PRODUCT_SELECTORS if '*=' not in selector)
+            await page.wait_for_selector(rendered, timeout=CATALOG_WAIT_MS)
+            return response.replace(body=await page.content())
+        except Exception as e:
+            self.logger.debug(f"Product grid did not render on {response.url}: {e}")
+            return response
+
+    async def _close_page(self, failure):
+        page = failure.request.meta.get('playwright_page')
+        if page:
+            await page.close()
+            self._catalog_responses.pop(page, None)
+
+    def _item_from_record(self, record: Dict[str, Any], response) -> Optional[Dict[str, Any]]:
+        """Map one catalog JSON product to an item, like _extract_product_data does for the DOM"""
+        record = _lower_keys(record)
+        title = _first_value(record, CATALOG_TITLE_KEYS)
+        price = _first_value(record, CATALOG_PRICE_KEYS)
+        if not title or price is None:
+            return None
+
+        title = str(title).strip()
+        if isinstance(price, (int, float)):
+            price_float = round(float(price) * self.EUR_TO_USD_RATE, 2)
+        else:
+            price_float = self._parse_price(str(price))
+        if price_float <= 0:
+            return None
+
+        link = _first_value(record, CATALOG_URL_KEYS)
+        image_url = _first_value(record, CATALOG_IMAGE_KEYS)
+        link = urljoin(response.url, str(link)) if link else response.url
+        image_url = urljoin(response.url, str(image_url)) if image_url else (
+            "https://via.placeholder.com/300x300/CCCCCC/666666?text=Schmiedmann+Part"
+        )
+
+        return {
+            "title_en": self._enhance_title(title),
+            "price": price_float,
+            "ebay_url": link,
+            "img_url": image_url,
+            "series": self.series,
+            "source": "Schmiedmann",
+            "description_en": f"BMW {self.series} part from Schmiedmann: {title}",
+            "description_he": f"חלק BMW {self.series} מ-Schmiedmann: {title}",
+        }
         
     def start_requests(self) -> Generator[scrapy.Request, None, None]:
         """Generate initial requests for BMW parts. To be overridden by subclasses."""
@@ -76,37 +285,17 @@ class SchmiedmannSpider(scrapy.Spider):
         # Check for blocking or error pages
         if self._is_blocked_or_error(response):
             self.logger.error(f"🚫 Blocked or error detected for {response.url}")
+            if response.status not in BLOCK_STATUSES:
+                count_event(self, "blocked")
             return
             
         # Log response details
         self.logger.info(f"📄 Parsing {response.url} for {self.series} parts")
         
         # Try multiple selectors for product containers - comprehensive list
-        product_selectors = [
-            '.product-inner',
-            '.product-card',
-            '.product-item', 
-            '.item-card',
-            '[data-product-id]',
-            '.spare-part-item',
-            '.product-box',
-            '.article-item',
-            '.part-card',
-            '.catalog-item',
-            '.grid-item',
-            '.product-tile',
-            '.shop-item',
-            'article.product',
-            'div[class*="product"]',
-            'div[class*="item"]',
-            'li.product',
-            '.product-list-item',
-            '.catalog-product',
-            '.shop-product',
-        ]
         
         products = []
-        for selector in product_selectors:
+        for selector in self.PRODUCT_SELECTORS:
             products = response.css(selector)
             if products:
                 self.logger.info(f"✅ Found {len(products)} products using selector: {selector}")
@@ -135,12 +324,7 @@ class SchmiedmannSpider(scrapy.Spider):
         if next_page and item_count > 0:
             next_url = urljoin(response.url, next_page)
             self.logger.info(f"Following pagination to: {next_url}")
-            yield scrapy.Request(
-                next_url,
-                callback=self.parse,
-                meta={'playwright': True},
-                headers={'Referer': response.url}
-            )
+            yield self._page_request(next_url, headers={'Referer': response.url})
     
     def _extract_product_data(self, product, response) -> Optional[Dict[str, Any]]:
         """Extract product data from a product element."""
@@ -492,13 +676,7 @@ class SchmiedmannE28Spider(SchmiedmannSpider):
         ]
         
         for url in urls:
-            yield scrapy.Request(
-                url=url,
-                callback=self.parse,
-                meta={'playwright': True},
-                headers=self._get_random_headers(),
-                dont_filter=True
-            )
+            yield self._page_request(url, headers=self._get_random_headers(), dont_filter=True)
     
     def _get_random_headers(self) -> Dict[str, str]:
         """Generate randomized headers."""
@@ -553,13 +731,7 @@ class SchmiedmannF10Spider(SchmiedmannSpider):
         ]
         
         for url in urls:
-            yield scrapy.Request(
-                url=url,
-                callback=self.parse,
-                meta={'playwright': True},
-                headers=self._get_random_headers(),
-                dont_filter=True
-            )
+            yield self._page_request(url, headers=self._get_random_headers(), dont_filter=True)
     
     def _get_random_headers(self) -> Dict[str, str]:
         """Generate randomized headers."""
@@ -1,18 +1,15 @@
 import os
 import json
 import yaml
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from app import schemas
 from app.database import SessionLocal
 from app.models import Story
-from app.crud import create_story, get_stories_by_filter
-
-# Try to import Google Generative AI, but make it optional
-try:
-    import google.generativeai as genai
-    GENAI_AVAILABLE = True
-except ImportError:
-    GENAI_AVAILABLE = False
-    genai = None
+from app.crud import create_story, get_ranked_stories, get_stories_by_filter
+from app.llm import CircuitBreaker, DeadlineRunner, LLMUnavailable, create_model
+from app.llm_cache import cached_model, forget_response
+from app.rate_limit import INTERACTIVE, LimitedModel, LimiterTimeout, default_limiter
 
 # Load configuration
 try:
@@ -27,20 +24,42 @@ except (FileNotFoundError, KeyError) as e:
     CONTEXTUAL_STORIES_PROMPT = ""
     GEMINI_MODEL_NAME = "models/gemini-1.5-flash-latest"
 
-# Configure Gemini
+# AI calls made while serving a request give up after the deadline and stop for a while after repeated failures
+STORY_DEADLINE_SECONDS = float(os.environ.get("STORY_DEADLINE_SECONDS", 3.0))
+# Stored stories considered when ranking a fallback
+FALLBACK_CANDIDATES = 200
+# Waiting for a shared rate limiter token must leave the call most of its deadline
+STORY_LIMITER_WAIT_SECONDS = float(os.environ.get("STORY_LIMITER_WAIT_SECONDS", STORY_DEADLINE_SECONDS / 4))
+
+
+def story_runner() -> DeadlineRunner:
+    """The deadline runner for story generation; no limiter slot in time counts as busy, not as a provider failure"""
+    return DeadlineRunner(
+        STORY_DEADLINE_SECONDS,
+        workers=int(os.environ.get("STORY_GENERATION_WORKERS", 4)),
+        breaker=CircuitBreaker(int(os.environ.get("STORY_BREAKER_FAILURES", 3)),
+                               float(os.environ.get("STORY_BREAKER_RESET_SECONDS", 30))),
+        busy_errors=(LimiterTimeout,),
+    )
+
+
+def interactive_model(model, limiter):
+    """model behind the shared limiter with interactive priority, giving up on a slot after STORY_LIMITER_WAIT_SECONDS"""
+    return LimitedModel(model, limiter, "gemini", INTERACTIVE, timeout=STORY_LIMITER_WAIT_SECONDS)
+
+
+STORY_RUNNER = story_runner()
+
+# Configure Gemini, or the REST endpoint in LLM_BASE_URL
 GEMINI_MODEL = None
-if GENAI_AVAILABLE:
-    try:
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            GEMINI_MODEL = genai.GenerativeModel(GEMINI_MODEL_NAME)
-        else:
-            print("Warning: GEMINI_API_KEY not found in environment")
-    except Exception as e:
-        print(f"Warning: Could not configure Gemini: {e}")
-else:
-    print("Warning: google-generativeai not installed, AI features disabled")
+try:
+    # Repeated prompts (e.g. DEFAULT_STORIES on every start) are answered from the cache; the rest
+    # wait for the shared rate limit ahead of bulk description enrichment
+    GEMINI_MODEL = cached_model(interactive_model(create_model(GEMINI_MODEL_NAME), default_limiter()))
+except LLMUnavailable as e:
+    print(f"Warning: {e}, AI features disabled")
+except Exception as e:
+    print(f"Warning: Could not configure Gemini: {e}")
 
 
 def enrich_story_with_ai(story_data: Dict) -> Dict:
@@ -57,7 +76,11 @@ def enrich_story_with_ai(story_data: Dict) -> Dict:
         )
         
         response = GEMINI_MODEL.generate_content(prompt)
-        result = json.loads(response.text)
+        try:
+            result = json.loads(response.text)
+        except ValueError:
+            forget_response(GEMINI_MODEL, prompt)
+            raise
         
         # Update story data with AI-generated content
         story_data.update({
@@ -73,64 +96,226 @@ def enrich_story_with_ai(story_data: Dict) -> Dict:
     return story_data
 
 
-def generate_contextual_stories(era: Optional[str] = None, 
-                              category: Optional[str] = None,
-                              team: Optional[str] = None,
-                              count: int = 5) -> List[Dict]:
-    """Generate stories based on current filter context"""
-    if not GEMINI_MODEL:
+def _generate_contextual_stories(era: Optional[str] = None,
+                                 category: Optional[str] = None,
+                                 team: Optional[str] = None,
+                                 count: int = 5,
+                                 model=None) -> List[Dict]:
+    """Generate and store stories for the filter context with model (GEMINI_MODEL by default); errors are raised"""
+    model = model or GEMINI_MODEL
+    if not model:
         return []
-    
+
+    # Check if we already have enough stories for this context
+    db = SessionLocal()
     try:
-        # Check if we already have enough stories for this context
-        db = SessionLocal()
         existing_stories = get_stories_by_filter(db, era=era, team=team, limit=count)
+    finally:
         db.close()
-        
-        if len(existing_stories) >= count:
-            return []  # We have enough stories already
-        
-        prompt = CONTEXTUAL_STORIES_PROMPT.format(
-            era=era or "All Eras",
-            category=category or "All Categories",
-            team=team or "All Teams"
-        )
-        
-        response = GEMINI_MODEL.generate_content(prompt)
+    if len(existing_stories) >= count:
+        return []  # We have enough stories already
+
+    prompt = CONTEXTUAL_STORIES_PROMPT.format(
+        era=era or "All Eras",
+        category=category or "All Categories",
+        team=team or "All Teams"
+    )
+
+    response = model.generate_content(prompt)
+    try:
         stories_data = json.loads(response.text)
-        
-        # Save generated stories to database
-        db = SessionLocal()
+    except ValueError:
+        forget_response(model, prompt)
+        raise
+
+    # Save generated stories to database
+    db = SessionLocal()
+    try:
         for story_data in stories_data:
             create_story(db, story_data)
+    finally:
         db.close()
-        
-        return stories_data
-        
+
+    return stories_data
+
+
+def generate_contextual_stories(era: Optional[str] = None,
+                              category: Optional[str] = None,
+                              team: Optional[str] = None,
+                              count: int = 5) -> List[Dict]:
+    """Generate stories based on current filter context"""
+    try:
+        return _generate_contextual_stories(era, category, team, count)
     except Exception as e:
         print(f"Error generating contextual stories: {e}")
         return []
 
 
+def generate_within_deadline(era: Optional[str] = None,
+                             category: Optional[str] = None,
+                             team: Optional[str] = None,
+                             count: int = 5) -> Optional[List[Dict]]:
+    """Generate stories while serving a request; None if the provider is slow, failing or busy"""
+    if not GEMINI_MODEL:
+        return None
+    return STORY_RUNNER.run(_generate_contextual_stories, era, category, team, count)
+
+
 def get_or_generate_stories(era: Optional[str] = None,
                           category: Optional[str] = None,
                           team: Optional[str] = None,
                           limit: int = 10) -> List[Story]:
-    """Get stories from DB or generate new ones if needed"""
+    """Get stories from DB or generate new ones if needed, falling back to ranked stored stories"""
     db = SessionLocal()
-    
-    # First, try to get existing stories
-    stories = get_stories_by_filter(db, era=era, team=team, limit=limit)
-    
-    # If we don't have enough stories, generate some
-    if len(stories) < 5:
-        generated = generate_contextual_stories(era, category, team, count=5)
-        if generated:
-            # Fetch the newly created stories
-            stories = get_stories_by_filter(db, era=era, team=team, limit=limit)
-    
-    db.close()
-    return stories
+    try:
+        # First, try to get existing stories
+        stories = get_stories_by_filter(db, era=era, team=team, limit=limit)
+
+        # Filters the post-crawl warmup could not fill are served from the stories it ranked for them
+        if len(stories) < 5:
+            ranked = get_ranked_stories(db, era=era, team=team, category=category, limit=limit)
+            if ranked:
+                seen = {story.id for story in stories}
+                return (stories + [story for story in ranked if story.id not in seen])[:limit]
+
+        # If we don't have enough stories, generate some
+        if len(stories) < 5:
+            generated = generate_within_deadline(era, category, team, count=5)
+            if generated:
+                # Fetch the newly created stories
+                stories = get_stories_by_filter(db, era=era, team=team, limit=limit)
+
+        if len(stories) < 5:
+            stories = fallback_stories(db, era, category, team, limit, preferred=stories)
+        return stories
+    finally:
+        db.close()
+
+
+class StoryStreamParser:
+    """Picks the objects out of a JSON list of stories that arrives in pieces, each as soon as it is closed"""
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.start: Optional[int] = None
+
+    def feed(self, text: str) -> List[Dict]:
+        """Add the next piece of the answer; returns the objects completed by it"""
+        self.buffer += text
+        completed = []
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "[{":
+                self.depth += 1
+                # Depth 1 is the list itself (a code fence before it holds no brackets)
+                if char == "{" and self.depth == 2:
+                    self.start = self.position
+            elif char in "]}":
+                if char == "}" and self.depth == 2 and self.start is not None:
+                    try:
+                        completed.append(json.loads(self.buffer[self.start:self.position + 1]))
+                    except ValueError:
+                        pass
+                    self.start = None
+                self.depth -= 1
+            self.position += 1
+        if self.start is None:
+            # Nothing before this point is needed again
+            self.buffer, self.position = "", 0
+        return completed
+
+
+def validated_story(story_data, era: Optional[str] = None, team: Optional[str] = None) -> Optional[Dict]:
+    """A streamed story as it would be stored, or None if it lacks required fields"""
+    if not isinstance(story_data, dict):
+        return None
+    story_data = dict(story_data)
+    story_data.setdefault("era", era)
+    story_data.setdefault("team", team)
+    try:
+        return schemas.StoryCreate(**story_data).model_dump()
+    except ValidationError:
+        return None
+
+
+def stream_contextual_stories(era: Optional[str] = None,
+                              category: Optional[str] = None,
+                              team: Optional[str] = None,
+                              count: int = 5) -> Iterator[Tuple[str, Dict]]:
+    """Generate stories for the filter context with Gemini's streaming API.
+
+    Each story is validated and stored as soon as its JSON object is complete
+    and yielded as ("story", story); the stream ends with ("done", counts), or
+    ("error", message) if the provider failed. Nothing is generated when the
+    filter already has count stories or the provider's breaker is open.
+    """
+    db = SessionLocal()
+    try:
+        if len(get_stories_by_filter(db, era=era, team=team, limit=count)) >= count:
+            yield "done", {"generated": 0}
+            return
+        if get_ranked_stories(db, era=era, team=team, category=category, limit=1):
+            # The warmup already picked stored stories for this filter
+            yield "done", {"generated": 0, "ranked": True}
+            return
+        if not GEMINI_MODEL or not STORY_RUNNER.breaker.allow():
+            yield "done", {"generated": 0, "deferred": True}
+            return
+
+        prompt = CONTEXTUAL_STORIES_PROMPT.format(
+            era=era or "All Eras",
+            category=category or "All Categories",
+            team=team or "All Teams"
+        )
+        parser = StoryStreamParser()
+        generated = rejected = 0
+        try:
+            for chunk in GEMINI_MODEL.generate_content(prompt, stream=True):
+                for story_data in parser.feed(chunk.text):
+                    story = validated_story(story_data, era, team)
+                    if story is None:
+                        rejected += 1
+                        continue
+                    stored = create_story(db, story)
+                    generated += 1
+                    yield "story", schemas.Story.model_validate(stored).model_dump(mode="json")
+        except GeneratorExit:
+            # The client went away mid-stream; settle the breaker on what had arrived by then
+            if generated:
+                STORY_RUNNER.breaker.record_success()
+            else:
+                STORY_RUNNER.breaker.record_failure()
+            raise
+        except LimiterTimeout as e:
+            # Gemini was never called; the client keeps the stored stories it already has
+            STORY_RUNNER.breaker.release_trial()
+            print(f"🚦 Story stream skipped: {e}")
+            yield "done", {"generated": generated, "deferred": True}
+            return
+        except Exception as e:
+            print(f"Error streaming contextual stories: {e}")
+            STORY_RUNNER.breaker.record_failure()
+            yield "error", {"message": str(e), "generated": generated}
+            return
+        STORY_RUNNER.breaker.record_success()
+        if not generated:
+            forget_response(GEMINI_MODEL, prompt)
+        yield "done", {"generated": generated, "rejected": rejected}
+    finally:
+        db.close()
 
 
 # Predefined story templates for quick population
@@ -299,6 +484,48 @@ DEFAULT_STORIES = [
 ]
 
 
+def story_relevance(story, era: Optional[str], category: Optional[str], team: Optional[str]) -> float:
+    """How well a stored story fits the filters; importance breaks ties"""
+    era_value, team_value = story.era or "", story.team or ""
+    score = 0.0
+    if era and era_value.lower() == era.lower():
+        score += 4
+    elif era_value == "General":
+        score += 1
+    if team and team_value.lower() == team.lower():
+        score += 3
+    if category and category.lower() in (story.category_relevance or "").lower().split(","):
+        score += 2
+    return score + (story.importance_score or 0) / 10
+
+
+def fallback_stories(db, era: Optional[str] = None,
+                     category: Optional[str] = None,
+                     team: Optional[str] = None,
+                     limit: int = 10,
+                     preferred: Optional[List[Story]] = None) -> List[Story]:
+    """The filter's own stories first, then previously generated and default stories ranked by relevance"""
+    stories = list(preferred or [])
+    if seed_default_stories(db):
+        # The commit expired the stories loaded before it
+        for story in stories:
+            db.refresh(story)
+    seen = {story.id for story in stories}
+    candidates = [story for story in db.query(Story).order_by(Story.importance_score.desc()).limit(FALLBACK_CANDIDATES)
+                  if story.id not in seen]
+    candidates.sort(key=lambda story: story_relevance(story, era, category, team), reverse=True)
+    return (stories + candidates)[:limit]
+
+
+def seed_default_stories(db) -> int:
+    """Store DEFAULT_STORIES as they are, without AI, unless they are stored already; returns how many were added"""
+    titles = {title for (title,) in db.query(Story.title_en).all()}
+    missing = [story_data for story_data in DEFAULT_STORIES if story_data["title_en"] not in titles]
+    for story_data in missing:
+        create_story(db, dict(story_data))
+    return len(missing)
+
+
 def populate_default_stories():
     """Populate database with default stories"""
     db = SessionLocal()
@@ -308,6 +535,8 @@ def populate_default_stories():
             enriched = enrich_story_with_ai(story_data)
             create_story(db, enriched)
         print(f"✅ Populated {len(DEFAULT_STORIES)} default stories")
+        if GEMINI_MODEL is not None and hasattr(GEMINI_MODEL, "hits"):
+            print(f"📦 Gemini cache: {GEMINI_MODEL.hits} hits, {GEMINI_MODEL.misses} misses")
     except Exception as e:
         print(f"Error populating default stories: {e}")
     finally:
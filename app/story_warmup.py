@@ -0,0 +1,198 @@
+"""Post-crawl story warmup: every story filter the catalog offers becomes a database hit.
+
+The frontend asks ``/api/stories/`` for stories on every era/category
+change, and a filter with fewer than five stories of its own makes the API
+wait for Gemini. After a crawl this job walks every (era, team, category)
+combination found in ``items``, plus the era/category pairs the frontend
+asks for without a team, and for each one that is still cold:
+
+* generates its stories, while the run is within ``--max-calls`` Gemini
+  requests and ``--max-seconds`` (cached answers are free), with bulk
+  priority in the shared rate limiter;
+* otherwise, or when generation fails or brings back stories for another
+  era or team, stores a ranking of existing stories for it in
+  ``story_rankings``, which the API serves instead of generating.
+
+Coverage and spend (calls, cache hits, estimated tokens, model seconds) are
+printed and stored in ``story_warmup_runs``:
+
+    python -m app.story_warmup                       # after a crawl
+    python -m app.story_warmup --max-calls 5 --max-seconds 60
+    python -m app.story_warmup --dry-run             # only list the cold filters
+    python -m app.story_warmup history
+"""
+import argparse
+import datetime
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app import story_generator
+from app.crud import get_stories_by_filter, save_story_ranking
+from app.database import Base, SessionLocal, engine
+from app.descriptions import estimate_tokens
+from app.llm import LLMUnavailable, create_model
+from app.llm_cache import cached_model
+from app.models import Item, StoryRanking, StoryWarmupRun
+from app.rate_limit import BULK, LimitedModel, default_limiter
+
+# The API generates for a filter with fewer stories than this
+STORIES_PER_FILTER = 5
+RANKED_STORIES = 10
+DEFAULT_MAX_CALLS = int(os.environ.get("STORY_WARMUP_MAX_CALLS", 20))
+DEFAULT_MAX_SECONDS = float(os.environ.get("STORY_WARMUP_MAX_SECONDS", 600))
+# A provider failing this many times in a row is not asked again this run
+MAX_FAILURES_IN_A_ROW = 3
+
+Filter = Tuple[str, str, str]
+
+
+class SpendMeter:
+    """Model wrapper counting the calls, cache hits, estimated tokens and seconds spent through it"""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+        self.cache_hits = 0
+        self.tokens = 0
+        self.seconds = 0.0
+
+    def generate_content(self, prompt: str, **options):
+        hits = getattr(self.model, "hits", 0)
+        started = time.monotonic()
+        try:
+            response = self.model.generate_content(prompt, **options)
+        finally:
+            elapsed = time.monotonic() - started
+        if getattr(self.model, "hits", 0) > hits:
+            self.cache_hits += 1
+            return response
+        self.calls += 1
+        self.seconds += elapsed
+        self.tokens += estimate_tokens(prompt) + estimate_tokens(response.text)
+        return response
+
+
+def warmup_model() -> Optional[SpendMeter]:
+    """The story model with bulk priority, so the warmup never delays stories for API requests"""
+    try:
+        model = create_model(story_generator.GEMINI_MODEL_NAME)
+    except LLMUnavailable as e:
+        print(f"⚠️ {e}, filters will only be ranked")
+        return None
+    return SpendMeter(cached_model(LimitedModel(model, default_limiter(), "gemini", BULK)))
+
+
+def catalog_filters(db) -> List[Filter]:
+    """Every (era, team, category) in the catalog and the team-less filters the frontend sends; "" leaves a field open"""
+    filters = set()
+    for era, team, category in db.query(Item.era, Item.team, Item.category).distinct():
+        era, team, category = era or "", team or "", category or ""
+        filters.update({(era, team, category), (era, "", category), (era, "", ""), ("", "", category)})
+    filters.discard(("", "", ""))
+    return sorted(filters)
+
+
+def is_warm(db, era: str, team: str) -> bool:
+    # Stories are looked up by era and team; the category only shapes the generation prompt
+    return len(get_stories_by_filter(db, era=era or None, team=team or None, limit=STORIES_PER_FILTER)) >= STORIES_PER_FILTER
+
+
+def rank_filter(db, era: str, team: str, category: str) -> None:
+    own = get_stories_by_filter(db, era=era or None, team=team or None, limit=STORIES_PER_FILTER)
+    stories = story_generator.fallback_stories(db, era or None, category or None, team or None,
+                                               RANKED_STORIES, preferred=own)
+    save_story_ranking(db, era, team, category, [story.id for story in stories])
+
+
+def warm_filters(db, filters: List[Filter], model: Optional[SpendMeter] = None,
+                 max_calls: int = DEFAULT_MAX_CALLS, max_seconds: float = DEFAULT_MAX_SECONDS) -> Dict[str, int]:
+    """Generate or rank stories for every cold filter; returns what was done"""
+    counts = {"combinations": len(filters), "already_warm": 0, "generated": 0, "ranked": 0, "failed": 0,
+              "stories_added": 0}
+    started = time.monotonic()
+    failures_in_a_row = 0
+    for era, team, category in filters:
+        if is_warm(db, era, team):
+            counts["already_warm"] += 1
+            continue
+        within_budget = (model is not None and model.calls < max_calls
+                         and time.monotonic() - started < max_seconds
+                         and failures_in_a_row < MAX_FAILURES_IN_A_ROW)
+        if within_budget:
+            try:
+                added = story_generator._generate_contextual_stories(
+                    era or None, category or None, team or None, STORIES_PER_FILTER, model=model)
+                counts["stories_added"] += len(added)
+                failures_in_a_row = 0
+            except Exception as e:
+                print(f"⚠️ Could not generate stories for {describe_filter((era, team, category))}: {e}")
+                counts["failed"] += 1
+                failures_in_a_row += 1
+            if is_warm(db, era, team):
+                counts["generated"] += 1
+                continue
+        rank_filter(db, era, team, category)
+        counts["ranked"] += 1
+    return counts
+
+
+def record_run(db, counts: Dict[str, int], model: Optional[SpendMeter], started_at: datetime.datetime,
+               duration: float) -> StoryWarmupRun:
+    run = StoryWarmupRun(started_at=started_at, duration_seconds=round(duration, 1), **counts)
+    if model is not None:
+        run.llm_calls, run.cache_hits = model.calls, model.cache_hits
+        run.estimated_tokens, run.llm_seconds = model.tokens, round(model.seconds, 1)
+    db.add(run)
+    db.commit()
+    return run
+
+
+def describe_filter(story_filter: Filter) -> str:
+    return " / ".join(value for value in story_filter if value)
+
+
+def print_run(run: StoryWarmupRun) -> None:
+    print(f"🔥 {run.started_at:%Y-%m-%d %H:%M} warmed {run.generated + run.ranked} of {run.combinations} filters "
+          f"in {run.duration_seconds}s: {run.already_warm} already warm, {run.generated} generated "
+          f"({run.stories_added} stories), {run.ranked} ranked, {run.failed} failed")
+    print(f"💸 Spend: {run.llm_calls} Gemini calls, ~{run.estimated_tokens:,} tokens, {run.llm_seconds}s of model time, "
+          f"{run.cache_hits} cache hits")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate or rank stories for every filter in the catalog")
+    parser.add_argument("command", nargs="?", choices=["run", "history"], default="run")
+    parser.add_argument("--max-calls", type=int, default=DEFAULT_MAX_CALLS, help="Gemini requests per run")
+    parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS,
+                        help="stop generating after this long; the remaining filters are ranked")
+    parser.add_argument("--dry-run", action="store_true", help="only list the cold filters")
+    parser.add_argument("--limit", type=int, default=20, help="history: number of runs to show")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine, tables=[StoryRanking.__table__, StoryWarmupRun.__table__])
+    db = SessionLocal()
+    try:
+        if args.command == "history":
+            for run in db.query(StoryWarmupRun).order_by(StoryWarmupRun.started_at.desc()).limit(args.limit):
+                print_run(run)
+            return
+
+        filters = catalog_filters(db)
+        if args.dry_run:
+            cold = [story_filter for story_filter in filters if not is_warm(db, story_filter[0], story_filter[1])]
+            for story_filter in cold:
+                print(f"❄️ {describe_filter(story_filter)}")
+            print(f"📝 {len(cold)} of {len(filters)} filters are cold")
+            return
+
+        model = warmup_model() if args.max_calls > 0 else None
+        started_at, started = datetime.datetime.utcnow(), time.monotonic()
+        counts = warm_filters(db, filters, model, args.max_calls, args.max_seconds)
+        print_run(record_run(db, counts, model, started_at, time.monotonic() - started))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
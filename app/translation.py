@@ -1,5 +1,40 @@
+"""Hebrew translation of titles with a persistent translation memory.
+
+Glossary phrases from ``terms.yaml`` are swapped for placeholders before a
+title is machine-translated and put back, in their glossary translation,
+afterwards; a title made up only of glossary phrases needs no translator
+at all. Every text is then normalized (whitespace collapsed, case folded)
+and looked up in the ``translation_memory`` table before anything is sent
+to Google Translate, so a title that appears on hundreds of relisted items
+is translated once. The unique misses of a batch are joined into as few
+translator requests as the request size allows.
+
+    python -m app.translation backfill     # fill missing items.title_he
+    python -m app.translation stats
+"""
+import argparse
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
 import yaml
 from deep_translator import GoogleTranslator
+from sqlalchemy import func, or_
+
+from app.database import Base, SessionLocal, engine
+from app.models import Item, Translation
+
+# Google Translate accepts up to 5000 characters per request
+MAX_REQUEST_CHARS = 4500
+# Texts in one request are separated by newlines, which the translator keeps
+SEPARATOR = "\n"
+MEMORY_LOOKUP_CHUNK = 500
+BACKFILL_BATCH_SIZE = 200
+# terms.yaml holds Hebrew translations
+GLOSSARY_LANG = "he"
+PLACEHOLDER = "⟦{}⟧"
+# Translators sometimes add spaces inside the brackets
+PLACEHOLDER_PATTERN = re.compile(r"⟦\s*(\d+)\s*⟧")
+
 
 def load_term_overrides():
     try:
@@ -8,18 +43,260 @@ def load_term_overrides():
     except FileNotFoundError:
         return {}
 
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip().casefold()
+
+
+class Glossary:
+    """All glossary phrases compiled into one pattern, matched as whole words, longest phrase first"""
+
+    def __init__(self, terms: Dict[str, str]):
+        self.terms = {normalize(str(phrase)): translation for phrase, translation in terms.items() if phrase}
+        phrases = sorted(self.terms, key=len, reverse=True)
+        alternatives = "|".join(r"\s+".join(map(re.escape, phrase.split(" "))) for phrase in phrases)
+        self.pattern = re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)", re.IGNORECASE) if phrases else None
+
+    def protect(self, text: str) -> Tuple[str, List[str]]:
+        """The text with glossary phrases replaced by numbered placeholders, and their translations"""
+        if self.pattern is None:
+            return text, []
+        translations: List[str] = []
+
+        def placeholder(match):
+            translations.append(self.terms[normalize(match.group(0))])
+            return PLACEHOLDER.format(len(translations) - 1)
+
+        return self.pattern.sub(placeholder, text), translations
+
+    @staticmethod
+    def covers(protected: str) -> bool:
+        """Whether nothing but placeholders and punctuation is left to translate"""
+        return not re.search(r"\w", PLACEHOLDER_PATTERN.sub("", protected))
+
+    @staticmethod
+    def restore(translated: str, translations: List[str]) -> Optional[str]:
+        """Put the glossary translations back; None if the translator lost a placeholder"""
+        found = [int(index) for index in PLACEHOLDER_PATTERN.findall(translated)]
+        if sorted(found) != list(range(len(translations))):
+            return None
+        return PLACEHOLDER_PATTERN.sub(lambda match: translations[int(match.group(1))], translated)
+
+
+def default_translator_factory(dest_lang: str):
+    return GoogleTranslator(source='auto', target=dest_lang)
+
+
 class PartTranslator:
-    def __init__(self):
-        self.overrides = load_term_overrides()
+    """Translates through the glossary, then the translation memory, then Google Translate"""
+
+    def __init__(self, session_factory=SessionLocal,
+                 translator_factory: Callable[[str], object] = default_translator_factory,
+                 overrides: Optional[Dict[str, str]] = None):
+        self.overrides = load_term_overrides() if overrides is None else overrides
+        self.glossary = Glossary(self.overrides)
+        self.session_factory = session_factory
+        self.translator_factory = translator_factory
+        # One translator per target language instead of one per call
+        self.translators: Dict[str, object] = {}
+        self.memory: Dict[tuple, str] = {}
+        self.stats = {"glossary": 0, "memory": 0, "translated": 0, "requests": 0, "errors": 0}
+        self._memory_table_ready = False
+
+    def translator(self, dest_lang: str):
+        if dest_lang not in self.translators:
+            self.translators[dest_lang] = self.translator_factory(dest_lang)
+        return self.translators[dest_lang]
 
     def translate(self, text: str, dest_lang: str = "he") -> str:
-        # Check for a direct override first
-        if text.lower() in self.overrides:
-            return self.overrides[text.lower()]
+        return self.translate_batch([text], dest_lang)[0]
+
+    def translate_batch(self, texts: Iterable[str], dest_lang: str = "he") -> List[str]:
+        """Translations of the texts in order; texts that could not be translated come back unchanged"""
+        texts = list(texts)
+        results: List[Optional[str]] = [None] * len(texts)
+        # Normalized protected text -> positions in texts and their glossary translations
+        pending: Dict[str, List[Tuple[int, List[str]]]] = {}
+        sources: Dict[str, str] = {}
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                results[i] = text
+                continue
+            protected, phrases = self.glossary.protect(text) if dest_lang == GLOSSARY_LANG else (text, [])
+            if phrases and Glossary.covers(protected):
+                # Known phrases only; no translator needed
+                results[i] = Glossary.restore(protected, phrases)
+                self.stats["glossary"] += 1
+                continue
+            key = normalize(protected)
+            pending.setdefault(key, []).append((i, phrases))
+            sources.setdefault(key, protected)
+
+        remembered = self._recall(list(pending), dest_lang)
+        self.stats["memory"] += sum(len(pending[key]) for key in remembered)
+        misses = {key: sources[key] for key in pending if key not in remembered}
+        lost: Dict[str, str] = {}
+        translated = self._translate_remote(misses, dest_lang)
+        for key, translation in list(translated.items()):
+            if Glossary.restore(translation, pending[key][0][1]) is None:
+                # The translator mangled a placeholder; these titles are translated without the glossary below
+                del translated[key]
+                for i, _ in pending[key]:
+                    lost.setdefault(normalize(texts[i]), texts[i])
+        self._remember(translated, misses, dest_lang)
+        # Keyed by the normalized original title: titles sharing a protected key differ in their glossary phrases
+        unprotected = self._recall(list(lost), dest_lang) if lost else {}
+        fresh = self._translate_remote({key: text for key, text in lost.items() if key not in unprotected}, dest_lang)
+        self._remember(fresh, lost, dest_lang)
+        unprotected.update(fresh)
+
+        for key, positions in pending.items():
+            translation = remembered.get(key) or translated.get(key)
+            for i, phrases in positions:
+                plain = unprotected.get(normalize(texts[i]), texts[i])
+                if translation is not None:
+                    results[i] = Glossary.restore(translation, phrases) or plain
+                else:
+                    results[i] = plain
+        return results
+
+    def _recall(self, keys: List[str], dest_lang: str) -> Dict[str, str]:
+        found = {key: self.memory[(key, dest_lang)] for key in keys if (key, dest_lang) in self.memory}
+        unknown = [key for key in keys if key not in found]
+        if not unknown:
+            return found
+        db = self.session_factory()
+        try:
+            self._ensure_memory_table(db)
+            for start in range(0, len(unknown), MEMORY_LOOKUP_CHUNK):
+                chunk = unknown[start:start + MEMORY_LOOKUP_CHUNK]
+                rows = (db.query(Translation.source_key, Translation.translated)
+                        .filter(Translation.target_lang == dest_lang, Translation.source_key.in_(chunk))
+                        .all())
+                for key, translated in rows:
+                    found[key] = self.memory[(key, dest_lang)] = translated
+        finally:
+            db.close()
+        return found
 
-        # If no override, use deep-translator
+    def _remember(self, translated: Dict[str, str], sources: Dict[str, str], dest_lang: str) -> None:
+        if not translated:
+            return
+        db = self.session_factory()
         try:
-            return GoogleTranslator(source='auto', target=dest_lang).translate(text)
-        except Exception as e:
-            print(f"Error translating '{text}': {e}")
-            return text # Return original text on error
\ No newline at end of file
+            self._ensure_memory_table(db)
+            for key, text in translated.items():
+                self.memory[(key, dest_lang)] = text
+                exists = db.query(Translation.id).filter(Translation.source_key == key,
+                                                         Translation.target_lang == dest_lang).first()
+                if not exists:
+                    db.add(Translation(source_key=key, target_lang=dest_lang, source_text=sources[key], translated=text))
+            db.commit()
+        finally:
+            db.close()
+
+    def _ensure_memory_table(self, db) -> None:
+        if not self._memory_table_ready:
+            Base.metadata.create_all(bind=db.get_bind(), tables=[Translation.__table__])
+            self._memory_table_ready = True
+
+    def _translate_remote(self, sources: Dict[str, str], dest_lang: str) -> Dict[str, str]:
+        """Translate the texts in as few requests as fit; failed texts are left out"""
+        translated: Dict[str, str] = {}
+        chunk: List[tuple] = []
+        size = 0
+        for key, text in sources.items():
+            text = re.sub(r"\s+", " ", text).strip()
+            if chunk and size + len(text) + len(SEPARATOR) > MAX_REQUEST_CHARS:
+                translated.update(self._translate_chunk(chunk, dest_lang))
+                chunk, size = [], 0
+            chunk.append((key, text))
+            size += len(text) + len(SEPARATOR)
+        if chunk:
+            translated.update(self._translate_chunk(chunk, dest_lang))
+        return translated
+
+    def _translate_chunk(self, chunk: List[tuple], dest_lang: str) -> Dict[str, str]:
+        translator = self.translator(dest_lang)
+        if len(chunk) > 1:
+            try:
+                self.stats["requests"] += 1
+                lines = (translator.translate(SEPARATOR.join(text for _, text in chunk)) or "").split(SEPARATOR)
+                if len(lines) == len(chunk) and all(line.strip() for line in lines):
+                    self.stats["translated"] += len(chunk)
+                    return {key: line.strip() for (key, _), line in zip(chunk, lines)}
+            except Exception as e:
+                print(f"⚠️ Batch translation of {len(chunk)} texts failed: {e}")
+            # The lines did not come back one for one; translate this chunk text by text
+        translated = {}
+        for key, text in chunk:
+            try:
+                self.stats["requests"] += 1
+                result = translator.translate(text)
+            except Exception as e:
+                print(f"Error translating '{text}': {e}")
+                self.stats["errors"] += 1
+                continue
+            if result:
+                translated[key] = result
+                self.stats["translated"] += 1
+        return translated
+
+
+def backfill_titles(session_factory=SessionLocal, translator: Optional[PartTranslator] = None,
+                    batch_size: int = BACKFILL_BATCH_SIZE, dest_lang: str = "he") -> int:
+    """Fill in missing or untranslated items.title_he; returns the number of items updated"""
+    translator = translator or PartTranslator(session_factory)
+    db = session_factory()
+    updated = 0
+    last_id = 0
+    try:
+        while True:
+            items = (db.query(Item)
+                     .filter(Item.id > last_id, Item.title_en.isnot(None),
+                             or_(Item.title_he.is_(None), Item.title_he == "", Item.title_he == Item.title_en))
+                     .order_by(Item.id)
+                     .limit(batch_size)
+                     .all())
+            if not items:
+                break
+            last_id = items[-1].id
+            for item, title_he in zip(items, translator.translate_batch([item.title_en for item in items], dest_lang)):
+                if title_he and title_he != item.title_en:
+                    item.title_he = title_he
+                    updated += 1
+            db.commit()
+            print(f"🌐 {updated} titles translated so far ({translator.stats['requests']} translator requests)")
+    finally:
+        db.close()
+    return updated
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Title translation with a translation memory")
+    parser.add_argument("command", choices=["backfill", "stats"])
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE, help="items per translation batch")
+    parser.add_argument("--lang", default="he", help="target language")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine, tables=[Translation.__table__])
+    if args.command == "backfill":
+        translator = PartTranslator()
+        updated = backfill_titles(translator=translator, batch_size=args.batch_size, dest_lang=args.lang)
+        stats = translator.stats
+        print(f"✅ Translated {updated} titles: {stats['memory']} from memory, {stats['translated']} new "
+              f"in {stats['requests']} requests, {stats['errors']} errors")
+        return
+
+    db = SessionLocal()
+    try:
+        for lang, count in db.query(Translation.target_lang, func.count(Translation.id)).group_by(Translation.target_lang):
+            print(f"🌐 {count} remembered translations to '{lang}'")
+        missing = db.query(func.count(Item.id)).filter(or_(Item.title_he.is_(None), Item.title_he == "")).scalar()
+        print(f"📝 {missing} items without a Hebrew title")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
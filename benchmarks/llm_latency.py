@@ -0,0 +1,193 @@
+"""Benchmark API tail latency while story generation is in flight.
+
+Starts the local Gemini stand-in (``app.fake_llm``) and the API on a
+throwaway database, then probes ``GET /items/`` (or ``--probe``) at a steady rate, first
+with nothing else going on and then while ``--concurrency`` clients keep
+``POST /stories/generate`` busy. Reports p50/p95/p99 probe latency for
+both phases and how many generations completed; results are appended to
+``benchmarks/results/llm_latency.jsonl``. By default the shared rate
+limiter is switched off so the stand-in's ``--rpm`` is the only quota;
+``--limiter`` keeps it at its configured limits, as the API runs in production.
+
+Usage:
+    python -m benchmarks.llm_latency                                  # 16 generators, 1.5s answers
+    python -m benchmarks.llm_latency -c 64 --latency 3 --error-rate 0.1 -d 20
+    python -m benchmarks.llm_latency --latency 30 --probe "/stories/?era=Madrid&limit=5"
+    python -m benchmarks.llm_latency --limiter --latency 0.2 --probe "/stories/?era=Madrid&limit=5"
+"""
+import argparse
+import itertools
+import os
+import socket
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import uvicorn
+
+from app.fake_llm import FakeGemini, create_app
+
+# Nothing that imports app.database may be imported before run_scenario sets DATABASE_URL
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+RESULTS_FILE = os.path.join(ROOT_DIR, "benchmarks", "results", "llm_latency.jsonl")
+SEED_ITEMS = 200
+PROBE_INTERVAL_SECONDS = 0.05
+DEFAULT_PROBE_PATH = "/items/?limit=20"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def seed_items(count: int) -> None:
+    from app.database import SessionLocal
+    from app.models import Item
+
+    db = SessionLocal()
+    try:
+        for i in range(count):
+            db.add(Item(title_en=f"Ronaldo jersey {i}", item_url=f"https://www.ebay.com/itm/{i}", price=50.0 + i,
+                        img_url=f"https://i.ebayimg.com/images/{i}.jpg",
+                        source="eBay", era="Madrid", category="jerseys"))
+        db.commit()
+    finally:
+        db.close()
+
+
+def probe(base_url: str, duration: float, path: str = DEFAULT_PROBE_PATH) -> List[float]:
+    """Latencies in seconds of GET requests for path sent every PROBE_INTERVAL_SECONDS"""
+    latencies = []
+    deadline = time.monotonic() + duration
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            client.get(path).raise_for_status()
+            latencies.append(time.monotonic() - started)
+            time.sleep(max(0.0, PROBE_INTERVAL_SECONDS - latencies[-1]))
+    return latencies
+
+
+def generate_until(base_url: str, stop: threading.Event, counter, results: List[tuple]) -> None:
+    with httpx.Client(base_url=base_url, timeout=120) as client:
+        while not stop.is_set():
+            started = time.monotonic()
+            # A new era each time, so the generator never finds enough stored stories and skips the model
+            response = client.post("/stories/generate", params={"era": f"Bench {next(counter)}"})
+            generated = response.status_code == 200 and response.json().get("generated", 0) > 0
+            results.append((time.monotonic() - started, generated))
+
+
+def summarize(phase: str, probe_path: str, latencies: List[float], generations: List[tuple],
+              concurrency: int, limiter: bool = False) -> Dict[str, Any]:
+    completed = [seconds for seconds, generated in generations if generated]
+    return {
+        "benchmark": phase,
+        "concurrency": concurrency,
+        "limiter": limiter,
+        "probe": probe_path,
+        "probes": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(max(latencies, default=0) * 1000, 1),
+        "generations": len(completed),
+        "generation_failures": len(generations) - len(completed),
+        "generation_p50_s": round(percentile(completed, 0.5), 2),
+    }
+
+
+def run_scenario(concurrency: int, duration: float, gemini: FakeGemini,
+                 probe_path: str = DEFAULT_PROBE_PATH, limiter: bool = False) -> List[Dict[str, Any]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        # Read when the app modules are first imported
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/llm_latency.db"
+        os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{free_port()}"
+        os.environ["LLM_CACHE_DISABLED"] = "1"
+        os.environ["RATE_LIMIT_PATH"] = f"{tmp}/rate_limits.db"
+        if not limiter:
+            # The stand-in's --rpm plays the provider quota; the shared limiter stays out of the way
+            os.environ["GEMINI_RPM"] = os.environ["GEMINI_CONCURRENCY"] = "0"
+        fake_server = start_server(create_app(gemini), int(os.environ["LLM_BASE_URL"].rsplit(":", 1)[1]))
+        from app.api import app
+        from app.database import SQLALCHEMY_DATABASE_URL
+
+        if SQLALCHEMY_DATABASE_URL != os.environ["DATABASE_URL"]:
+            raise RuntimeError("app.database was imported before the benchmark database was set up")
+        seed_items(SEED_ITEMS)
+        api_port = free_port()
+        api_server = start_server(app, api_port)
+        base_url = f"http://127.0.0.1:{api_port}"
+        try:
+            results = [summarize("api_idle", probe_path, probe(base_url, duration, probe_path), [], 0, limiter)]
+
+            stop = threading.Event()
+            generations: List[tuple] = []
+            counter = itertools.count()
+            generators = [threading.Thread(target=generate_until, args=(base_url, stop, counter, generations))
+                          for _ in range(concurrency)]
+            for thread in generators:
+                thread.start()
+            # Let every generator get its first request in flight
+            time.sleep(min(1.0, gemini.latency))
+            latencies = probe(base_url, duration, probe_path)
+            stop.set()
+            for thread in generators:
+                thread.join()
+            results.append(summarize("api_generating", probe_path, latencies, generations, concurrency, limiter))
+        finally:
+            api_server.should_exit = True
+            fake_server.should_exit = True
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    parser = argparse.ArgumentParser(description="API tail latency while story generation is in flight")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="clients generating stories at once")
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="seconds of probing per phase")
+    parser.add_argument("--latency", type=float, default=1.5, help="mean seconds per fake Gemini answer")
+    parser.add_argument("--jitter", type=float, default=0.3, help="standard deviation of the answer latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake Gemini requests that fail")
+    parser.add_argument("--rpm", type=float, default=0, help="fake Gemini requests per minute (0: unlimited)")
+    parser.add_argument("--probe", default=DEFAULT_PROBE_PATH, help="API path whose latency is measured")
+    parser.add_argument("--limiter", action="store_true",
+                        help="keep the shared rate limiter on (GEMINI_RPM/GEMINI_CONCURRENCY, 15 rpm by default)")
+    parser.add_argument("--no-save", action="store_true", help="do not append results to the history file")
+    args = parser.parse_args(argv)
+
+    gemini = FakeGemini(args.latency, args.jitter, args.error_rate, args.rpm, seed=0)
+    results = run_scenario(args.concurrency, args.duration, gemini, args.probe, args.limiter)
+
+    print(f"🤖 Fake Gemini: {args.latency}s ± {args.jitter}s, {args.error_rate:.0%} errors; {gemini.stats}")
+    for result in results:
+        print(f"📊 {result['benchmark']:<15} p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms  "
+              f"p99 {result['p99_ms']:>8} ms  ({result['probes']} probes, {result['generations']} generations, "
+              f"{result['generation_failures']} deferred or failed)")
+
+    if not args.no_save:
+        from benchmarks.parsers import save_results
+
+        save_results(results, RESULTS_FILE)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark parse throughput of the process pool against core count.
+
+Parses the saved eBay search page inline on one thread and then through
+``app.parse_pool`` with 1, 2, 4, ... workers up to the CPU count, and
+reports pages/s and the speedup over inline parsing. Results are appended
+to ``benchmarks/results/parse_pool.jsonl``.
+
+Usage:
+    python -m benchmarks.parse_pool                  # 1..CPU count workers
+    python -m benchmarks.parse_pool -w 1 2 8 -n 200  # chosen worker counts, 200 pages each
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from app.parse_pool import parse_in_worker, run_callback
+from app.spiders.ebay_spider import EbaySpider
+from benchmarks.parsers import BENCHMARKS, ROOT_DIR, save_results
+
+RESULTS_FILE = os.path.join(ROOT_DIR, "benchmarks", "results", "parse_pool.jsonl")
+
+
+def load_page(name: str = "ebay") -> Dict[str, Any]:
+    config = BENCHMARKS[name]
+    with open(os.path.join(ROOT_DIR, config["fixture"]), "rb") as f:
+        body = f.read()
+    return {"url": config["url"], "body": body, "callback": config["callback"], "cb_kwargs": config["cb_kwargs"]}
+
+
+def default_worker_counts() -> List[int]:
+    cpus = os.cpu_count() or 1
+    counts = []
+    workers = 1
+    while workers < cpus:
+        counts.append(workers)
+        workers *= 2
+    return counts + [cpus]
+
+
+def run_inline(page: Dict[str, Any], pages: int) -> Dict[str, Any]:
+    spider = EbaySpider()
+    start = time.perf_counter()
+    for _ in range(pages):
+        run_callback(spider, **page)
+    elapsed = time.perf_counter() - start
+    return {"benchmark": "inline", "workers": 0, "pages": pages, "seconds": round(elapsed, 4),
+            "pages_per_second": round(pages / elapsed, 2)}
+
+
+def run_pool(page: Dict[str, Any], pages: int, workers: int) -> Dict[str, Any]:
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # Warm every worker up first so process start-up and imports are not timed
+        list(pool.map(parse_in_worker, [EbaySpider] * workers, [{}] * workers, [page] * workers))
+        start = time.perf_counter()
+        futures = [pool.submit(parse_in_worker, EbaySpider, {}, page) for _ in range(pages)]
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - start
+    return {"benchmark": f"pool_{workers}", "workers": workers, "pages": pages, "seconds": round(elapsed, 4),
+            "pages_per_second": round(pages / elapsed, 2)}
+
+
+def main(argv: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    parser = argparse.ArgumentParser(description="Benchmark process-pool parsing throughput against core count")
+    parser.add_argument("-w", "--workers", type=int, nargs="*", help="worker counts to try (default: 1, 2, 4 ... CPUs)")
+    parser.add_argument("-n", "--pages", type=int, default=100, help="pages to parse per run")
+    parser.add_argument("--no-save", action="store_true", help="do not append results to the history file")
+    args = parser.parse_args(argv)
+
+    page = load_page()
+    results = [run_inline(page, args.pages)]
+    for workers in args.workers or default_worker_counts():
+        results.append(run_pool(page, args.pages, workers))
+
+    baseline = results[0]["pages_per_second"]
+    print(f"🖥️ {os.cpu_count()} CPUs, {args.pages} eBay pages per run")
+    for result in results:
+        result["speedup"] = round(result["pages_per_second"] / baseline, 2)
+        print(f"📊 {result['benchmark']:<8} {result['pages_per_second']:>9} pages/s  {result['speedup']:>5}x inline")
+
+    if not args.no_save:
+        save_results(results, RESULTS_FILE)
+    return results
+
+
+if __name__ == "__main__":
+    main()
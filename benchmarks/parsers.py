@@ -0,0 +1,236 @@
+"""Offline benchmark for spider parse callbacks.
+
+Replays saved HTML fixtures through each spider's parse callback without
+touching the network and reports pages/s, items/s and peak memory per
+spider. Peak memory is reported both as the Python heap peak during one
+page and as the RSS high-water mark of the process that ran the benchmark;
+each benchmark runs in a fresh process, so the RSS of one is not carried
+into the next. Every run is appended to ``benchmarks/results/parsers.jsonl`` so
+results can be compared between commits.
+
+Usage:
+    python -m benchmarks.parsers                 # run all benchmarks
+    python -m benchmarks.parsers ebay -n 50      # run one benchmark, 50 iterations
+    python -m benchmarks.parsers --compare       # compare with the previous commit
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from scrapy.http import HtmlResponse, Request
+
+from app.spiders.aliexpress_spider import AliexpressSpider
+from app.spiders.ebay_spider import EbaySpider
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+RESULTS_FILE = os.path.join(ROOT_DIR, "benchmarks", "results", "parsers.jsonl")
+
+# Each benchmark replays one saved page through one spider callback
+BENCHMARKS = {
+    "ebay": {
+        "spider": EbaySpider,
+        "fixture": "ebay.html",
+        "url": "https://www.ebay.com/sch/i.html?_nkw=cristiano+ronaldo+manchester+united+jersey&_sacat=0",
+        "callback": "parse",
+        "cb_kwargs": {"era": "United", "category": "jerseys"},
+    },
+    # Same page through the parsel CSS path, to compare against the lxml fast path
+    "ebay_css": {
+        "spider": EbaySpider,
+        "spider_kwargs": {"fast_parse": False},
+        "fixture": "ebay.html",
+        "url": "https://www.ebay.com/sch/i.html?_nkw=cristiano+ronaldo+manchester+united+jersey&_sacat=0",
+        "callback": "parse",
+        "cb_kwargs": {"era": "United", "category": "jerseys"},
+    },
+    # Listings come from the search state embedded in the page, not the DOM
+    "aliexpress": {
+        "spider": AliexpressSpider,
+        "fixture": "tests/fixtures/aliexpress_search.html",
+        "url": "https://www.aliexpress.com/wholesale?SearchText=cristiano%20ronaldo%20manchester%20united%20jersey",
+        "callback": "parse",
+        "cb_kwargs": {"category": "jerseys", "era": "United"},
+    },
+    # No fcpeuro benchmark: fcpeuro.html is a saved Cloudflare challenge page and the spider's
+    # selectors are placeholders, so it would time a parse that finds nothing
+}
+
+
+def load_fixture_response(fixture: str, url: str, cb_kwargs: Optional[Dict[str, Any]] = None) -> HtmlResponse:
+    """Build an offline response from a saved HTML fixture"""
+    with open(os.path.join(ROOT_DIR, fixture), "rb") as f:
+        body = f.read()
+    request = Request(url=url, cb_kwargs=cb_kwargs or {})
+    return HtmlResponse(url=url, body=body, encoding="utf-8", request=request)
+
+
+def run_benchmark(name: str, iterations: int = 20) -> Dict[str, Any]:
+    """Replay a fixture through a spider callback and measure throughput"""
+    config = BENCHMARKS[name]
+    spider = config["spider"](**config.get("spider_kwargs", {}))
+    callback = getattr(spider, config["callback"])
+
+    def fresh_response():
+        # A fresh response per page so parsel's selector cache is cold
+        return load_fixture_response(config["fixture"], config["url"], config["cb_kwargs"])
+
+    def replay(response):
+        start = time.perf_counter()
+        count = sum(1 for result in callback(response, **config["cb_kwargs"])
+                    if not isinstance(result, Request))
+        return count, time.perf_counter() - start
+
+    items = 0
+    parse_time = 0.0
+    for _ in range(iterations):
+        count, elapsed = replay(fresh_response())
+        items += count
+        parse_time += elapsed
+    if not items:
+        raise ValueError(f"{name} parsed no items from {config['fixture']}; "
+                         f"the fixture or the spider's selectors no longer match")
+
+    # Peak memory is measured on a separate pass since tracemalloc skews timings
+    response = fresh_response()
+    tracemalloc.start()
+    replay(response)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "benchmark": name,
+        "spider": spider.name,
+        "fixture": config["fixture"],
+        "fixture_bytes": os.path.getsize(os.path.join(ROOT_DIR, config["fixture"])),
+        "iterations": iterations,
+        "items_per_page": items // iterations,
+        "seconds": round(parse_time, 4),
+        "pages_per_second": round(iterations / parse_time, 2) if parse_time else None,
+        "items_per_second": round(items / parse_time, 2) if parse_time else None,
+        "peak_memory_mb": round(peak / (1024 * 1024), 2),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_isolated(name: str, iterations: int = 20) -> Dict[str, Any]:
+    """run_benchmark in a freshly spawned process, so its peak RSS is its own and not the running maximum"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run_benchmark, name, iterations).result()
+
+
+def peak_rss_mb() -> Optional[float]:
+    """RSS high-water mark of this process, which also covers lxml's native allocations"""
+    # On Linux ru_maxrss survives fork and exec, so a spawned process would report its parent's
+    # peak; VmHWM belongs to the address space and starts over on exec
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 2)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+
+def current_commit() -> str:
+    """Return the short hash of HEAD, suffixed with -dirty for uncommitted changes"""
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                capture_output=True, text=True)
+        commit = result.stdout.strip()
+        if not commit:
+            return "unknown"
+        # Changes to the results history itself don't make a run dirty
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no",
+                                 "--", ".", ":!benchmarks/results"],
+                                cwd=ROOT_DIR, capture_output=True, text=True)
+        return f"{commit}-dirty" if status.stdout.strip() else commit
+    except FileNotFoundError:
+        return "unknown"
+
+
+def save_results(results: List[Dict[str, Any]], path: str = RESULTS_FILE) -> None:
+    """Append one line per benchmark result, tagged with commit and timestamp"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    commit = current_commit()
+    timestamp = datetime.datetime.utcnow().isoformat(timespec="seconds")
+    with open(path, "a", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps({"commit": commit, "timestamp": timestamp, **result}) + "\n")
+
+
+def load_results(path: str = RESULTS_FILE) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare_with_previous(results: List[Dict[str, Any]], history: List[Dict[str, Any]]) -> None:
+    """Print the change in pages/s against the latest run from another commit"""
+    commit = current_commit()
+    for result in results:
+        previous = [r for r in history
+                    if r["benchmark"] == result["benchmark"] and r["commit"] != commit]
+        if not previous or not previous[-1].get("pages_per_second"):
+            print(f"  {result['benchmark']}: no previous result to compare")
+            continue
+        before = previous[-1]
+        change = (result["pages_per_second"] / before["pages_per_second"] - 1) * 100
+        print(f"  {result['benchmark']}: {before['pages_per_second']} -> "
+              f"{result['pages_per_second']} pages/s ({change:+.1f}%) vs {before['commit']}")
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    print(f"📊 {result['benchmark']:<12} {result['pages_per_second']:>9} pages/s "
+          f"{result['items_per_second']:>11} items/s "
+          f"{result['items_per_page']:>5} items/page "
+          f"{result['peak_memory_mb']:>8} MB peak heap "
+          f"{result['peak_rss_mb']} MB peak RSS")
+
+
+def main(argv: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    parser = argparse.ArgumentParser(description="Benchmark spider parse callbacks against saved HTML fixtures")
+    parser.add_argument("benchmarks", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("-n", "--iterations", type=int, default=20, help="pages to parse per benchmark")
+    parser.add_argument("--compare", action="store_true", help="compare with the previous commit's results")
+    parser.add_argument("--no-save", action="store_true", help="do not append results to the history file")
+    args = parser.parse_args(argv)
+
+    history = load_results()
+    results = []
+    for name in args.benchmarks or list(BENCHMARKS):
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark '{name}'")
+        try:
+            result = run_isolated(name, iterations=args.iterations)
+        except ValueError as e:
+            sys.exit(f"❌ {e}")
+        print_result(result)
+        results.append(result)
+
+    if args.compare:
+        print("\n🔁 Comparison:")
+        compare_with_previous(results, history)
+    if not args.no_save:
+        save_results(results)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -125,24 +125,49 @@ function App() {
     });
   };
 
+  // Stream of newly generated stories for the current filters
+  const storyStreamRef = useRef(null);
+  const storyRequestRef = useRef(0);
+
   // Fetch stories based on current filters
   const fetchStories = useCallback(async () => {
+    storyStreamRef.current?.close();
+    storyStreamRef.current = null;
+    const request = ++storyRequestRef.current;
     try {
       const params = new URLSearchParams();
       if (era) params.append('era', era);
       if (category) params.append('category', category);
       
-      const response = await fetch(`/api/stories/?${params}`);
+      // Stored stories right away; new ones arrive one by one over the stream below
+      const response = await fetch(`/api/stories/?${params}&generate=false`);
       const storiesData = await response.json();
+      if (request !== storyRequestRef.current) return; // The filters changed meanwhile
       setStories(storiesData);
     } catch (error) {
       console.error("Failed to fetch stories:", error);
     }
+
+    if (request !== storyRequestRef.current || (!era && !category)) return;
+    const params = new URLSearchParams();
+    if (era) params.append('era', era);
+    if (category) params.append('category', category);
+    const source = new EventSource(`/api/stories/stream?${params}`);
+    storyStreamRef.current = source;
+    source.addEventListener('story', (event) => {
+      const story = JSON.parse(event.data);
+      setStories(prev => [story, ...prev.filter(s => s.id !== story.id)]);
+    });
+    // One generation per filter change; without this EventSource would reconnect and ask again
+    const close = () => source.close();
+    source.addEventListener('done', close);
+    source.addEventListener('error', close);
   }, [era, category]);
 
   // Fetch stories when filters change
   useEffect(() => {
     fetchStories();
+    return () => storyStreamRef.current?.close();
   }, [fetchStories]);
 
   // Handler for finding related items
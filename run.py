@@ -22,6 +22,10 @@ elif "--ebay-only" in sys.argv:
 elif "--schmiedmann-only" in sys.argv:
     SOURCE = "schmiedmann"
 
+# Continue crawls that were killed partway instead of starting them over
+RESUME = "--resume" in sys.argv
+CRAWL_ARGS = ["-s", "CRAWL_STATE_RESUME=True"] if RESUME else []
+
 # Check for frontend port argument
 for i, arg in enumerate(sys.argv):
     if arg == "--frontend-port" and i + 1 < len(sys.argv):
@@ -31,6 +35,8 @@ print(f"🚀 Starting BMW E28 Parts Scraper")
 print(f"Backend Port: {PORT}")
 print(f"Frontend Port: {FRONTEND_PORT}")
 print(f"Source: {SOURCE}")
+if RESUME:
+    print("Resuming interrupted crawls")
 
 # Kill existing processes on the target ports
 def kill_processes_on_port(port):
@@ -68,7 +74,7 @@ try:
     
     if SOURCE == "all" or SOURCE == "ebay":
         print("  Running eBay spider...")
-        result = subprocess.run(["scrapy", "crawl", "ebay"], 
+        result = subprocess.run(["scrapy", "crawl", "ebay", *CRAWL_ARGS], 
                               capture_output=True, text=True)
         if result.returncode == 0:
             print("  ✅ eBay spider completed successfully")
@@ -78,7 +84,7 @@ try:
     
     if SOURCE == "all" or SOURCE == "aliexpress":
         print("  Running AliExpress spider...")
-        result = subprocess.run(["scrapy", "crawl", "aliexpress"], 
+        result = subprocess.run(["scrapy", "crawl", "aliexpress", *CRAWL_ARGS], 
                               capture_output=True, text=True)
         if result.returncode == 0:
             print("  ✅ AliExpress spider completed successfully")
@@ -87,27 +93,19 @@ try:
             print(f"  ❌ AliExpress spider failed: {result.stderr[-200:]}")
     
     if SOURCE == "all" or SOURCE == "schmiedmann":
-        print("  Running Schmiedmann E28 spider...")
-        result = subprocess.run(["scrapy", "crawl", "schmiedmann_e28"], 
-                              capture_output=True, text=True)
-        if result.returncode == 0:
-            print("  ✅ Schmiedmann E28 spider completed successfully")
-            scraped_any = True
-        else:
-            print(f"  ❌ Schmiedmann E28 spider failed: {result.stderr[-200:]}")
-        
-        print("  Running Schmiedmann F10 spider...")
-        result = subprocess.run(["scrapy", "crawl", "schmiedmann_f10"], 
+        # Both Schmiedmann spiders run in one process so they share a single browser
+        print("  Running Schmiedmann E28 and F10 spiders...")
+        result = subprocess.run([sys.executable, "-m", "app.browser_pool", "crawl", "schmiedmann_e28", "schmiedmann_f10", *CRAWL_ARGS],
                               capture_output=True, text=True)
         if result.returncode == 0:
-            print("  ✅ Schmiedmann F10 spider completed successfully")
+            print("  ✅ Schmiedmann spiders completed successfully")
             scraped_any = True
         else:
-            print(f"  ❌ Schmiedmann F10 spider failed: {result.stderr[-200:]}")
+            print(f"  ❌ Schmiedmann spiders failed: {result.stderr[-200:]}")
     
     # Always run the stories spider to populate engaging content
     print("  Running Ronaldo Stories spider...")
-    result = subprocess.run(["scrapy", "crawl", "ronaldo_stories"], 
+    result = subprocess.run(["scrapy", "crawl", "ronaldo_stories", *CRAWL_ARGS], 
                           capture_output=True, text=True)
     if result.returncode == 0:
         print("  ✅ Ronaldo Stories spider completed successfully")
@@ -127,6 +125,15 @@ try:
     except Exception as e:
         print(f"  ⚠️ Story setup failed: {e}")
     
+    # Give every filter in the freshly crawled catalog its stories, so story reads never wait for Gemini
+    print("  Warming up stories for the catalog's filters...")
+    result = subprocess.run([sys.executable, "-m", "app.story_warmup"], capture_output=True, text=True)
+    if result.returncode == 0:
+        for line in result.stdout.strip().splitlines()[-2:]:
+            print(f"  {line}")
+    else:
+        print(f"  ⚠️ Story warmup warning: {result.stderr[-200:]}")
+    
     if not scraped_any:
         print("⚠️ Warning: No scrapers completed successfully")
     
@@ -188,6 +195,7 @@ try:
     print("  python run.py --schmiedmann-only                    # Run with only Schmiedmann items")
     print("  python run.py 8080 --schmiedmann-only               # Run on custom backend port with only Schmiedmann items")
     print("  python run.py --frontend-port 3000                  # Run with custom frontend port")
+    print("  python run.py --resume                              # Continue crawls that were interrupted")
     print("  python run.py 8080 --frontend-port 3000 --ebay-only # Run with custom backend and frontend ports")
     
     print(f"\n⏳ Press Ctrl+C to stop...")
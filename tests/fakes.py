@@ -0,0 +1,41 @@
+"""Model fakes shared by the story tests"""
+import time
+from types import SimpleNamespace
+
+from app.fake_llm import fake_answer
+
+
+class FakeModel:
+    def __init__(self, latency=0.0, fail=False):
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+
+    def generate_content(self, prompt, **options):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError("503 Service Unavailable")
+        return SimpleNamespace(text=fake_answer(prompt))
+
+
+class FakeStreamingModel(FakeModel):
+    """Streams the fake answer in small pieces; fail_after fails the stream after that many pieces"""
+
+    def __init__(self, chunk_size=7, fail_after=None, answer=None):
+        super().__init__()
+        self.chunk_size = chunk_size
+        self.fail_after = fail_after
+        self.answer = answer
+
+    def generate_content(self, prompt, stream=False, **options):
+        self.calls += 1
+        text = self.answer or fake_answer(prompt)
+        pieces = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        return self._stream(pieces)
+
+    def _stream(self, pieces):
+        for i, piece in enumerate(pieces):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise RuntimeError("stream interrupted")
+            yield SimpleNamespace(text=piece)
@@ -1,6 +1,8 @@
+import json
+import os
 import pytest
 from scrapy.http import HtmlResponse, Request
-from app.spiders.aliexpress_spider import AliexpressSpider
+from app.spiders.aliexpress_spider import AliexpressSpider, find_embedded_state, find_listings
 
 class TestAliexpressSpider:
     def setup_method(self):
@@ -335,4 +337,65 @@ class TestAliexpressSpider:
         
         # URLs should be converted to absolute
         assert item['ebay_url'].startswith('https://www.aliexpress.com')
-        assert item['img_url'].startswith('https://www.aliexpress.com')
\ No newline at end of file
+        assert item['img_url'].startswith('https://www.aliexpress.com')
+
+# Synthetic search page: the real page's embedded-state layout with 60 made-up listings
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "aliexpress_search.html")
+SEARCH_URL = "https://www.aliexpress.com/wholesale?SearchText=cristiano%20ronaldo%20manchester%20united%20jersey"
+
+
+def search_response(body):
+    request = Request(url=SEARCH_URL, cb_kwargs={"category": "jerseys", "era": "United"})
+    return HtmlResponse(url=SEARCH_URL, body=body, encoding="utf-8", request=request)
+
+
+class TestAliexpressEmbeddedState:
+    def setup_method(self):
+        self.spider = AliexpressSpider()
+        with open(FIXTURE, "rb") as f:
+            self.body = f.read()
+
+    def test_every_listing_is_yielded(self):
+        """Test that all listings in the embedded state are parsed, not just the first ten."""
+        items = list(self.spider.parse(search_response(self.body), category="jerseys", era="United"))
+        assert len(items) == 60
+        assert not any("demo" in item["item_url"] for item in items)
+        assert len({item["item_url"] for item in items}) == 60
+
+    def test_listing_fields(self):
+        """Test that title, price, link and image are read from the listing JSON."""
+        item = next(self.spider.parse(search_response(self.body), category="jerseys", era="United"))
+        assert item["title_en"].startswith("Cristiano Ronaldo #7")
+        assert isinstance(item["price"], float) and item["price"] > 0
+        assert item["item_url"] == "https://www.aliexpress.com/item/1005006000000000.html"
+        assert item["img_url"].startswith("https://ae-pic-a1.aliexpress-media.com/kf/")
+        assert item["team"] == "Manchester United"
+        assert item["source"] == "AliExpress"
+
+    def test_run_params_state(self):
+        """Test that the older window.runParams assignment is understood too."""
+        state = {"mods": {"itemList": {"content": [
+            {"productId": "42", "title": "Ronaldo replica shirt", "prices": {"salePrice": {"formattedPrice": "US $12.50"}}},
+        ]}}}
+        body = f"<html><script>window.runParams = {json.dumps(state)};</script></html>".encode()
+        items = list(self.spider.parse(search_response(body), category="jerseys", era="Portugal"))
+        assert [(item["price"], item["condition"]) for item in items] == [(12.5, "Replica")]
+
+    def test_selector_path_is_not_capped(self):
+        """Test that pages without embedded state yield every listing the selectors find, not just the first ten."""
+        cards = "".join(f'<div class="search-item-card-wrapper"><h3>Ronaldo shirt {i}</h3>'
+                        f'<span class="price">US $1{i}.00</span><a href="/item/{i}.html"></a></div>' for i in range(12))
+        items = list(self.spider.parse(search_response(f"<html><body>{cards}</body></html>".encode()),
+                                       category="jerseys", era="United"))
+        assert len(items) == 12
+
+    def test_falls_back_without_state(self):
+        """Test that pages without embedded state still go through the selector and demo paths."""
+        assert find_embedded_state("<html><body>No listing here</body></html>") is None
+        items = list(self.spider.parse(search_response(b"<html><body></body></html>"), category="jerseys", era="United"))
+        assert items and all("demo" in item["item_url"] for item in items)
+
+    def test_find_listings_skips_non_dict_entries(self):
+        """Test that the item list is found wherever it is nested."""
+        state = {"data": {"root": {"fields": {"mods": {"itemList": {"content": [{"productId": "1"}, "ad"]}}}}}}
+        assert find_listings(state) == [{"productId": "1"}]
@@ -0,0 +1,55 @@
+import pytest
+
+from benchmarks import parsers
+
+
+class TestParserBenchmarks:
+    def test_fixture_response_replays_offline(self):
+        """Test that saved fixtures are loaded into responses the spiders can parse."""
+        config = parsers.BENCHMARKS["ebay"]
+        response = parsers.load_fixture_response(config["fixture"], config["url"], config["cb_kwargs"])
+
+        spider = config["spider"]()
+        items = list(spider.parse(response, **config["cb_kwargs"]))
+
+        assert len(items) == 75
+        assert all(item["source"] == "eBay" for item in items)
+
+    def test_run_benchmark_reports_throughput(self):
+        """Test that a benchmark run reports pages/s, items/s and peak memory."""
+        result = parsers.run_benchmark("ebay", iterations=1)
+
+        assert result["items_per_page"] == 75
+        assert result["pages_per_second"] > 0
+        assert result["items_per_second"] > 0
+        assert result["peak_memory_mb"] > 0
+
+    def test_benchmark_without_items_fails(self, monkeypatch):
+        """Test that a fixture the spider finds no items in fails the benchmark instead of timing an empty parse."""
+        from app.spiders.fcpeuro_spider import FcpeuroSpider
+        monkeypatch.setitem(parsers.BENCHMARKS, "fcpeuro", {
+            "spider": FcpeuroSpider, "fixture": "fcpeuro.html", "url": "https://www.fcpeuro.com/search?q=bmw+e28+parts",
+            "callback": "parse", "cb_kwargs": {"series": "E28"},
+        })
+
+        with pytest.raises(ValueError, match="no items"):
+            parsers.run_benchmark("fcpeuro", iterations=1)
+
+    def test_isolated_run_reports_its_own_rss(self):
+        """Test that a benchmark in its own process reports a peak RSS that is not this process's running maximum."""
+        result = parsers.run_isolated("aliexpress", iterations=1)
+
+        assert result["items_per_page"] == 60
+        assert 0 < result["peak_rss_mb"]
+        assert result["peak_rss_mb"] != parsers.peak_rss_mb()
+
+    def test_results_history_roundtrip(self, tmp_path):
+        """Test that results are appended with the commit they were measured on."""
+        path = tmp_path / "results.jsonl"
+        parsers.save_results([{"benchmark": "ebay", "pages_per_second": 10.0}], path=str(path))
+        parsers.save_results([{"benchmark": "ebay", "pages_per_second": 12.0}], path=str(path))
+
+        history = parsers.load_results(str(path))
+
+        assert [r["pages_per_second"] for r in history] == [10.0, 12.0]
+        assert all("commit" in r and "timestamp" in r for r in history)
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import subprocess
+import sys
+from types import SimpleNamespace
+import pytest
+import scrapy
+from scrapy.utils.test import get_crawler
+from app import browser_pool
+
+
+class DummySpider(scrapy.Spider):
+    name = "dummy"
+
+
+class FakeClosable:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class TestResourceBlocking:
+    def test_blocks_heavy_resource_types(self):
+        """Test that images, media and fonts are aborted."""
+        for resource_type in ("image", "media", "font"):
+            request = SimpleNamespace(resource_type=resource_type, url="https://www.schmiedmann.com/img/part.jpg")
+            assert browser_pool.should_abort_request(request)
+
+    def test_blocks_trackers(self):
+        """Test that third-party trackers are aborted, including subdomains."""
+        request = SimpleNamespace(resource_type="script", url="https://www.google-analytics.com/analytics.js")
+        assert browser_pool.should_abort_request(request)
+        request = SimpleNamespace(resource_type="xhr", url="https://static.hotjar.com/c/hotjar.js")
+        assert browser_pool.should_abort_request(request)
+
+    def test_keeps_documents_and_site_scripts(self):
+        """Test that the page itself and first-party scripts and XHR still load."""
+        for resource_type in ("document", "script", "xhr", "fetch"):
+            request = SimpleNamespace(resource_type=resource_type, url="https://www.schmiedmann.com/en/bmw-E28/")
+            assert not browser_pool.should_abort_request(request)
+
+
+class TestBrowserPool:
+    def test_resources_closed_after_last_user(self):
+        """Test that shared contexts and browsers stay open until every handler has released the pool."""
+        pool = browser_pool.BrowserPool()
+        context, browser = FakeClosable(), FakeClosable()
+        pool.users = 2
+        pool.contexts[("default", "{}")] = SimpleNamespace(context=context)
+        pool.browsers[("chromium", "{}")] = browser
+
+        asyncio.run(pool.release())
+        assert not context.closed and not browser.closed
+        asyncio.run(pool.release())
+        assert context.closed and browser.closed
+        assert pool.contexts == {} and pool.browsers == {}
+
+    def test_domain_slots_are_shared(self):
+        """Test that every handler gets the same page cap for a domain."""
+        pool = browser_pool.BrowserPool()
+        slot = pool.domain_slot("www.schmiedmann.com", 1)
+        assert pool.domain_slot("www.schmiedmann.com", 5) is slot
+        assert pool.domain_slot("www.ebay.com", 1) is not slot
+
+    def test_different_cap_for_a_shared_domain_is_reported(self, caplog):
+        """Test that a spider asking for another cap on a domain that already has one is warned."""
+        pool = browser_pool.BrowserPool()
+        pool.domain_slot("www.schmiedmann.com", 1)
+        with caplog.at_level(logging.WARNING, logger="app.browser_pool"):
+            pool.domain_slot("www.schmiedmann.com", 1)
+            assert not caplog.records
+            pool.domain_slot("www.schmiedmann.com", 2)
+        assert "capped at 1 pages" in caplog.text
+
+    def test_crashed_page_releases_its_slot_once(self, monkeypatch):
+        """Test that a page that crashes frees its domain slot, and a close after the crash does not free it twice."""
+        class FakePage:
+            def __init__(self):
+                self.handlers = {}
+
+            def once(self, event, handler):
+                self.handlers[event] = handler
+
+        async def create_page(self, request, spider):
+            return FakePage()
+
+        monkeypatch.setattr(browser_pool, "pool", browser_pool.BrowserPool())
+        monkeypatch.setattr(browser_pool.ScrapyPlaywrightDownloadHandler, "_create_page", create_page)
+        handler = object.__new__(browser_pool.SharedBrowserDownloadHandler)
+        handler.max_pages_per_domain = 1
+        request = scrapy.Request("https://www.schmiedmann.com/en/bmw-E28/")
+
+        async def crawl():
+            page = await handler._create_page(request, DummySpider())
+            slot = browser_pool.pool.domain_slots["www.schmiedmann.com"]
+            assert slot.locked()
+            page.handlers["crash"](page)
+            page.handlers["close"](page)
+            assert not slot.locked() and slot._value == 1
+
+        asyncio.run(crawl())
+
+
+class TestBrowserPoolSmoke:
+    def test_spiders_share_a_real_browser(self):
+        """Test that two spiders crawl local pages through the shared pool with a real browser, with images blocked."""
+        playwright = pytest.importorskip("playwright.sync_api")
+        try:
+            with playwright.sync_playwright() as p:
+                p.chromium.launch(headless=True, args=["--no-sandbox"]).close()
+        except Exception as e:
+            pytest.skip(f"no browser to launch: {str(e).splitlines()[0]}")
+
+        result = subprocess.run([sys.executable, "-m", "app.browser_pool", "smoke", "--pages", "4"],
+                                capture_output=True, text=True, timeout=300)
+        assert result.returncode == 0, result.stdout + result.stderr
+        assert "4/4 pages" in result.stdout
+
+
+class TestBrowserPoolStats:
+    def test_records_pages_per_minute(self):
+        """Test that pages per minute and RSS are recorded when a spider closes."""
+        crawler = get_crawler(DummySpider)
+        extension = browser_pool.BrowserPoolStats(crawler.stats)
+        spider = DummySpider()
+        extension.spider_opened(spider)
+        extension.started -= 30
+        crawler.stats.set_value("playwright/page_count", 10)
+
+        extension.spider_closed(spider)
+
+        assert 15 < crawler.stats.get_value("browser_pool/pages_per_minute") <= 20
+        assert crawler.stats.get_value("browser_pool/crawler_peak_rss_mb") > 0
+
+    def test_skips_spiders_without_browser_pages(self):
+        """Test that spiders that never used Playwright report nothing."""
+        crawler = get_crawler(DummySpider)
+        extension = browser_pool.BrowserPoolStats(crawler.stats)
+        extension.spider_opened(DummySpider())
+        extension.spider_closed(DummySpider())
+        assert crawler.stats.get_value("browser_pool/pages_per_minute") is None
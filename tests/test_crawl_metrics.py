@@ -0,0 +1,148 @@
+import json
+import time
+import pytest
+import scrapy
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import crawl_metrics
+from app.database import Base
+from app.models import CrawlRun
+from app.pipelines import RonaldoItemsPipeline
+from app.spiders.aliexpress_spider import AliexpressSpider
+
+
+class DummySpider(scrapy.Spider):
+    name = "dummy"
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/metrics.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def response_for(url, status=200, latency=0.3):
+    request = Request(url, meta={"download_latency": latency})
+    return HtmlResponse(url=url, status=status, body=b"<html></html>", request=request)
+
+
+class TestHistogram:
+    def test_quantile_interpolates_within_bucket(self):
+        """Test that quantiles are estimated from the bucket that holds them."""
+        histogram = crawl_metrics.Histogram((1.0, 2.0, 4.0))
+        for value in (0.5, 1.5, 1.5, 3.0):
+            histogram.observe(value)
+        assert histogram.counts == [1, 2, 1, 0]
+        assert histogram.quantile(0.5) == pytest.approx(1.5)
+        assert histogram.quantile(1.0) == pytest.approx(4.0)
+        assert crawl_metrics.Histogram((1.0,)).quantile(0.5) is None
+
+
+class TestCrawlMetrics:
+    def test_counts_and_records_run(self, tmp_path, session_factory):
+        """Test that requests, responses, blocks and items are counted, snapshotted and stored as a crawl run."""
+        crawler = get_crawler(DummySpider)
+        extension = crawl_metrics.CrawlMetrics(crawler, directory=str(tmp_path / "metrics"),
+                                               interval=0, session_factory=session_factory)
+        spider = DummySpider()
+        extension.spider_opened(spider)
+        for status, latency in ((200, 0.2), (200, 0.4), (429, 1.5)):
+            response = response_for("https://www.ebay.com/sch/i.html", status, latency)
+            extension.request_reached_downloader(response.request, spider)
+            extension.response_received(response, response.request, spider)
+        extension.item_scraped({"title_en": "Jersey"}, None, spider)
+
+        extension.spider_closed(spider, "finished")
+
+        snapshot = json.load(open(crawl_metrics.snapshot_path(str(tmp_path / "metrics"), "dummy")))
+        assert snapshot["finished"]
+        assert snapshot["counters"] == {"requests": 3, "responses": 3, "items": 1, "blocked": 1, "fallback": 0}
+        run = session_factory().query(CrawlRun).one()
+        assert (run.spider, run.requests, run.items, run.blocked) == ("dummy", 3, 1, 1)
+        assert 0.25 < run.latency_p50 <= 0.5
+        assert run.requests_per_second > 0
+
+    def test_blocked_page_falls_back(self):
+        """Test that an AliExpress block page counts as a block and a demo-data fallback."""
+        spider = AliexpressSpider()
+        crawl_metrics.registry.pop(spider.name, None)
+        url = "https://www.aliexpress.com/w/wholesale-ronaldo.html"
+        response = HtmlResponse(url=url, body=b"<html>Please complete the captcha</html>", request=Request(url))
+        list(spider.parse(response, category="jerseys", era="Madrid"))
+        counters = crawl_metrics.metrics_for(spider.name).counters
+        assert (counters["blocked"], counters["fallback"]) == (1, 1)
+
+
+class TestParseTimingMiddleware:
+    def test_observes_one_parse_time_per_response(self):
+        """Test that the callback's time is measured once per response, excluding downstream consumers."""
+        crawl_metrics.registry.pop("dummy", None)
+        spider = DummySpider()
+
+        def callback():
+            time.sleep(0.02)
+            yield {"title_en": "Jersey"}
+            yield {"title_en": "Boots"}
+
+        middleware = crawl_metrics.ParseTimingMiddleware()
+        for entry in middleware.process_spider_output(response_for("https://example.com"), callback(), spider):
+            time.sleep(0.05)
+        histogram = crawl_metrics.metrics_for("dummy").histograms["parse_seconds"]
+        assert histogram.count == 1
+        assert 0.02 <= histogram.sum < 0.05
+
+
+class TestPipelineWriteLatency:
+    def test_writes_are_timed(self, session_factory):
+        """Test that every database write of the pipeline is observed."""
+        crawl_metrics.registry.pop("dummy", None)
+        spider = DummySpider()
+        pipeline = RonaldoItemsPipeline(threaded=False, session_factory=session_factory)
+        pipeline.open_spider(spider)
+        pipeline.process_item({"title_en": "Jersey", "price": 50.0, "source": "eBay",
+                               "item_url": "https://www.ebay.com/itm/1", "img_url": ""}, spider)
+        pipeline.close_spider(spider)
+        assert crawl_metrics.metrics_for("dummy").histograms["pipeline_write_seconds"].count == 1
+
+
+class TestPrometheusExposition:
+    def test_sums_processes_and_drops_stale_runs(self, tmp_path):
+        """Test that workers of a spider are summed and long-finished runs are left out."""
+        now = time.time()
+        for pid, finished, updated in ((1, False, now), (2, False, now), (3, True, now - 2 * 3600)):
+            metrics = crawl_metrics.SpiderMetrics("ebay")
+            metrics.inc("requests", 10)
+            metrics.observe("response_latency_seconds", 0.3)
+            snapshot = metrics.snapshot(finished=finished)
+            snapshot.update(pid=pid, updated=updated)
+            crawl_metrics.write_snapshot(str(tmp_path), snapshot)
+
+        snapshots = crawl_metrics.load_snapshots(str(tmp_path), now=now)
+        text = crawl_metrics.render_prometheus(snapshots)
+
+        assert len(snapshots) == 2
+        assert 'crawler_requests_total{spider="ebay"} 20' in text
+        assert 'crawler_running{spider="ebay"} 2' in text
+        assert 'crawler_response_latency_seconds_bucket{spider="ebay",le="0.5"} 2' in text
+        assert 'crawler_response_latency_seconds_count{spider="ebay"} 2' in text
+
+    def test_writes_reach_metrics_when_the_pipeline_opens_first(self, tmp_path, session_factory):
+        """Test that write timings show up in the run's snapshot when the pipeline is opened before the extension, as Scrapy does."""
+        crawl_metrics.registry.pop("dummy", None)
+        spider = DummySpider()
+        pipeline = RonaldoItemsPipeline(threaded=False, session_factory=session_factory)
+        pipeline.open_spider(spider)
+        extension = crawl_metrics.CrawlMetrics(get_crawler(DummySpider), directory=str(tmp_path / "metrics"),
+                                               interval=0, session_factory=session_factory)
+        extension.spider_opened(spider)
+        pipeline.process_item({"title_en": "Jersey", "price": 50.0, "source": "eBay",
+                               "item_url": "https://www.ebay.com/itm/1", "img_url": ""}, spider)
+        pipeline.close_spider(spider)
+        extension.spider_closed(spider, "finished")
+
+        snapshot = json.load(open(crawl_metrics.snapshot_path(str(tmp_path / "metrics"), "dummy")))
+        assert sum(snapshot["histograms"]["pipeline_write_seconds"]["counts"]) == 1
+        assert session_factory().query(CrawlRun).one().write_p95 is not None
@@ -0,0 +1,142 @@
+from types import SimpleNamespace
+import scrapy
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+from app.crawl_state import DONE, IN_FLIGHT, QUEUED, STATE_ID_META, CrawlStateMiddleware, ResumableScheduler
+
+
+class StateSpider(scrapy.Spider):
+    name = "state"
+
+    def parse(self, response):
+        yield {"url": response.url}
+
+
+def open_scheduler(tmp_path, resume=False):
+    crawler = get_crawler(StateSpider, {"CRAWL_STATE_DIR": str(tmp_path), "CRAWL_STATE_RESUME": resume})
+    spider = StateSpider.from_crawler(crawler)
+    scheduler = ResumableScheduler.from_crawler(crawler)
+    scheduler.open(spider)
+    return scheduler, spider
+
+
+class TestResumableScheduler:
+    def test_queue_survives_killed_process(self, tmp_path):
+        """Test that queued and in-flight requests come back when a killed crawl is resumed."""
+        scheduler, spider = open_scheduler(tmp_path)
+        for page in range(3):
+            assert scheduler.enqueue_request(Request(f"https://example.com/{page}", spider.parse))
+        first = scheduler.next_request()
+        scheduler.mark_done(first)
+        scheduler.next_request()
+        # No close(): the process was killed with a request in flight
+
+        resumed, spider = open_scheduler(tmp_path, resume=True)
+        urls = []
+        while resumed.has_pending_requests():
+            request = resumed.next_request()
+            assert request.callback == spider.parse
+            urls.append(request.url)
+        assert sorted(urls) == ["https://example.com/1", "https://example.com/2"]
+        resumed.close("finished")
+
+    def test_seen_fingerprints_persist(self, tmp_path):
+        """Test that requests seen by the killed run are filtered after resuming."""
+        scheduler, spider = open_scheduler(tmp_path)
+        scheduler.enqueue_request(Request("https://example.com/a", spider.parse))
+        assert not scheduler.enqueue_request(Request("https://example.com/a", spider.parse))
+
+        resumed, spider = open_scheduler(tmp_path, resume=True)
+        assert not resumed.enqueue_request(Request("https://example.com/a", spider.parse))
+        assert resumed.enqueue_request(Request("https://example.com/b", spider.parse))
+
+    def test_completed_start_requests_skipped_on_resume(self, tmp_path):
+        """Test that dont_filter start requests finished before the kill are not fetched again."""
+        scheduler, spider = open_scheduler(tmp_path)
+        scheduler.enqueue_request(Request("https://example.com/search", spider.parse, dont_filter=True))
+        scheduler.mark_done(scheduler.next_request())
+        # Within a run dont_filter still means what it says
+        assert scheduler.enqueue_request(Request("https://example.com/search", spider.parse, dont_filter=True))
+
+        resumed, spider = open_scheduler(tmp_path, resume=True)
+        assert not resumed.enqueue_request(Request("https://example.com/search", spider.parse, dont_filter=True))
+
+    def test_queued_start_requests_not_added_again_on_resume(self, tmp_path):
+        """Test that dont_filter start requests still queued at the kill run once, from the saved queue."""
+        scheduler, spider = open_scheduler(tmp_path)
+        for page in ("a", "b"):
+            scheduler.enqueue_request(Request(f"https://example.com/{page}", spider.parse, dont_filter=True))
+        scheduler.next_request()
+
+        resumed, spider = open_scheduler(tmp_path, resume=True)
+        for page in ("a", "b"):
+            assert not resumed.enqueue_request(Request(f"https://example.com/{page}", spider.parse, dont_filter=True))
+        assert resumed.store.counts() == {QUEUED: 2}
+
+        # A retry of a resumed start request still takes over its row
+        request = resumed.next_request()
+        assert resumed.enqueue_request(request.replace(dont_filter=True))
+        assert resumed.store.counts() == {DONE: 1, QUEUED: 2}
+
+    def test_fresh_crawl_starts_over(self, tmp_path):
+        """Test that without CRAWL_STATE_RESUME the previous state is discarded."""
+        scheduler, spider = open_scheduler(tmp_path)
+        scheduler.enqueue_request(Request("https://example.com/a", spider.parse))
+        scheduler.close("shutdown")
+
+        fresh, spider = open_scheduler(tmp_path)
+        assert not fresh.has_pending_requests()
+        assert fresh.enqueue_request(Request("https://example.com/a", spider.parse))
+
+    def test_unserializable_requests_kept_in_memory(self, tmp_path):
+        """Test that requests with a lambda callback are still crawled, just not resumable."""
+        scheduler, spider = open_scheduler(tmp_path)
+        assert scheduler.enqueue_request(Request("https://example.com/a", lambda response: None))
+        assert scheduler.next_request().url == "https://example.com/a"
+        assert scheduler.stats.get_value("crawl_state/unserializable") == 1
+
+
+class TestCrawlStateMiddleware:
+    def test_marks_request_done_after_output(self, tmp_path):
+        """Test that a request is marked done only once its callback output is consumed."""
+        scheduler, spider = open_scheduler(tmp_path)
+        scheduler.enqueue_request(Request("https://example.com/a", spider.parse))
+        request = scheduler.next_request()
+        assert STATE_ID_META in request.meta
+
+        scheduler.crawler.engine = SimpleNamespace(slot=SimpleNamespace(scheduler=scheduler))
+        middleware = CrawlStateMiddleware.from_crawler(scheduler.crawler)
+        response = HtmlResponse(url=request.url, body=b"<html></html>", request=request)
+        output = middleware.process_spider_output(response, spider.parse(response), spider)
+        assert next(output) == {"url": "https://example.com/a"}
+        assert scheduler.store.counts() == {IN_FLIGHT: 1}
+        list(output)
+        assert scheduler.store.counts() == {DONE: 1}
+
+    def test_child_request_with_parent_meta_is_new_work(self, tmp_path):
+        """Test that a request built from the parent's meta is queued as its own row and does not finish the parent."""
+        scheduler, spider = open_scheduler(tmp_path)
+        scheduler.enqueue_request(Request("https://example.com/a", spider.parse))
+        request = scheduler.next_request()
+        scheduler.crawler.engine = SimpleNamespace(slot=SimpleNamespace(scheduler=scheduler))
+        middleware = CrawlStateMiddleware.from_crawler(scheduler.crawler)
+        response = HtmlResponse(url=request.url, body=b"<html></html>", request=request)
+
+        output = middleware.process_spider_output(
+            response, iter([Request("https://example.com/b", spider.parse, meta=response.meta)]), spider)
+        child = next(output)
+        assert STATE_ID_META not in child.meta and STATE_ID_META in response.meta
+        assert scheduler.enqueue_request(child)
+        assert scheduler.store.counts() == {IN_FLIGHT: 1, QUEUED: 1}
+        list(output)
+        assert scheduler.store.counts() == {DONE: 1, QUEUED: 1}
+
+    def test_retry_replaces_its_request(self, tmp_path):
+        """Test that a retry of a stored request, which keeps its meta, takes over the original row."""
+        scheduler, spider = open_scheduler(tmp_path)
+        scheduler.enqueue_request(Request("https://example.com/a", spider.parse))
+        request = scheduler.next_request()
+        retry = request.replace(dont_filter=True)
+        retry.meta["retry_times"] = 1
+        assert scheduler.enqueue_request(retry)
+        assert scheduler.store.counts() == {DONE: 1, QUEUED: 1}
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import descriptions
+from app.database import Base
+from app.models import Item, ItemDescription
+
+PROMPTS = descriptions.load_prompts()
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    monkeypatch.setattr(descriptions, "RETRY_BACKOFF_SECONDS", 0)
+    engine = create_engine(f"sqlite:///{tmp_path}/descriptions.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def add_items(session_factory, *items):
+    db = session_factory()
+    for i, fields in enumerate(items, start=1):
+        db.add(Item(title_en=f"Ronaldo jersey {i}", item_url=f"https://www.ebay.com/itm/{i}", price=50.0,
+                    era="Madrid", category="jerseys", **fields))
+    db.commit()
+    db.close()
+
+
+class FakeDescriber:
+    def __init__(self, fail_titles=()):
+        self.fail_titles = set(fail_titles)
+        self.described = []
+        self.active = 0
+        self.peak = 0
+
+    async def describe(self, item):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if item["title_en"] in self.fail_titles:
+            raise RuntimeError("quota exceeded")
+        self.described.append(item["title_en"])
+        return f"About {item['title_en']}", f"על {item['title_en']}"
+
+
+class FakeBatchDescriber(FakeDescriber):
+    """Answers whole batches, leaving out the titles in skip_titles"""
+
+    def __init__(self, skip_titles=()):
+        super().__init__()
+        self.skip_titles = set(skip_titles)
+        self.batches = []
+
+    async def describe_batch(self, items):
+        self.batches.append([item["title_en"] for item in items])
+        return {item["id"]: (f"About {item['title_en']}", f"על {item['title_en']}")
+                for item in items if item["title_en"] not in self.skip_titles}
+
+
+def run(describer, session_factory, **kwargs):
+    return asyncio.run(descriptions.enrich(describer, PROMPTS, session_factory=session_factory, **kwargs))
+
+
+class TestEnrich:
+    def test_only_missing_descriptions_are_generated(self, session_factory):
+        """Test that items without descriptions are described and scraped descriptions are left alone."""
+        add_items(session_factory,
+                  {},
+                  {"description_en": "Scraped", "description_he": "נאסף"},
+                  {"description_en": "Ronaldo jersey 3", "description_he": descriptions.FALLBACK_DESCRIPTION_HE})
+        describer = FakeDescriber()
+
+        counts = run(describer, session_factory, concurrency=2, batch_size=1)
+
+        assert counts == {"described": 2, "failed": 0}
+        assert sorted(describer.described) == ["Ronaldo jersey 1", "Ronaldo jersey 3"]
+        db = session_factory()
+        assert db.get(Item, 1).description_he == "על Ronaldo jersey 1"
+        assert db.get(Item, 2).description_en == "Scraped"
+        assert run(FakeDescriber(), session_factory) == {"described": 0, "failed": 0}
+
+    def test_failures_are_checkpointed_and_retried(self, session_factory):
+        """Test that a failing item is recorded, retried by later runs and skipped after max attempts."""
+        add_items(session_factory, {}, {})
+        failing = FakeDescriber(fail_titles={"Ronaldo jersey 2"})
+
+        assert run(failing, session_factory, max_attempts=2) == {"described": 1, "failed": 1}
+        record = session_factory().get(ItemDescription, 2)
+        assert (record.status, record.attempts) == (descriptions.FAILED, 1)
+        assert "quota exceeded" in record.error
+
+        assert run(failing, session_factory, max_attempts=2) == {"described": 0, "failed": 1}
+        assert run(failing, session_factory, max_attempts=2) == {"described": 0, "failed": 0}
+
+    def test_changed_item_is_stale(self, session_factory):
+        """Test that generated descriptions are regenerated once the item's title changes."""
+        add_items(session_factory, {})
+        run(FakeDescriber(), session_factory)
+        db = session_factory()
+        db.get(Item, 1).title_en = "Ronaldo signed jersey"
+        db.commit()
+
+        describer = FakeDescriber()
+        run(describer, session_factory)
+        assert describer.described == ["Ronaldo signed jersey"]
+
+    def test_concurrency_is_bounded(self, session_factory):
+        """Test that no more than the configured number of items are described at once."""
+        add_items(session_factory, *[{} for _ in range(12)])
+        describer = FakeDescriber()
+        run(describer, session_factory, concurrency=3, batch_size=5)
+        assert len(describer.described) == 12
+        assert describer.peak == 3
+
+
+class TestBatchedPrompts:
+    def test_items_share_prompts_and_map_back_by_id(self, session_factory):
+        """Test that items are described in batches and each description lands on its own item."""
+        add_items(session_factory, *[{} for _ in range(5)])
+        describer = FakeBatchDescriber()
+
+        assert run(describer, session_factory, items_per_prompt=2) == {"described": 5, "failed": 0}
+        assert sorted(map(len, describer.batches)) == [2, 2]
+        # A lone last item uses the single-item prompts
+        assert describer.described == ["Ronaldo jersey 5"]
+        db = session_factory()
+        assert [item.description_en for item in db.query(Item).order_by(Item.id)] == [
+            f"About Ronaldo jersey {i}" for i in range(1, 6)]
+
+    def test_missing_entries_are_described_alone(self, session_factory):
+        """Test that an item left out of a batched answer gets a single-item request."""
+        add_items(session_factory, {}, {}, {})
+        describer = FakeBatchDescriber(skip_titles={"Ronaldo jersey 2"})
+
+        assert run(describer, session_factory) == {"described": 3, "failed": 0}
+        assert describer.batches == [["Ronaldo jersey 1", "Ronaldo jersey 2", "Ronaldo jersey 3"]]
+        assert describer.described == ["Ronaldo jersey 2"]
+
+    def test_batches_respect_the_token_budget(self):
+        """Test that a batch is closed before its estimated size would exceed the token budget."""
+        items = [{"id": i, "title_en": "Ronaldo jersey", "era": "Madrid", "category": "jerseys"} for i in range(10)]
+        budget = descriptions.BATCH_PROMPT_TOKENS + 3 * (descriptions.ANSWER_TOKENS_PER_ITEM + 20)
+        batches = list(descriptions.prompt_batches(items, max_items=10, token_budget=budget))
+        assert [len(batch) for batch in batches] == [3, 3, 3, 1]
+
+
+class TestGeminiDescriber:
+    def test_prompts_are_filled_and_rate_limited(self):
+        """Test that both prompts get the item fields they expect and calls are spaced by the rate limit."""
+        prompts_seen = []
+
+        class FakeModel:
+            def generate_content(self, prompt):
+                prompts_seen.append(prompt)
+                return SimpleNamespace(text=" Description ")
+
+        describer = descriptions.GeminiDescriber(FakeModel(), PROMPTS, requests_per_minute=600)
+        item = {"title_en": "Ronaldo 2008 United shirt", "era": "United", "category": "jerseys"}
+        started = time.monotonic()
+        assert asyncio.run(describer.describe(item)) == ("Description", "Description")
+        assert time.monotonic() - started >= 0.09
+        assert all('"Ronaldo 2008 United shirt"' in prompt and '"United"' in prompt for prompt in prompts_seen)
+
+    def test_batched_answer_is_validated(self):
+        """Test that a batched JSON answer is mapped by id and entries that are short or not Hebrew are dropped."""
+        english, hebrew = "A" * 100, "תיאור " * 40
+        answer = [{"id": 1, "description_en": english, "description_he": hebrew},
+                  {"id": 2, "description_en": english, "description_he": english * 2},
+                  {"id": 3, "description_en": "Short", "description_he": hebrew},
+                  {"id": 9, "description_en": english, "description_he": hebrew}]
+        prompts_seen = []
+
+        class FakeModel:
+            def generate_content(self, prompt, **options):
+                prompts_seen.append((prompt, options))
+                return SimpleNamespace(text="```json\n" + json.dumps(answer) + "\n```")
+
+        describer = descriptions.GeminiDescriber(FakeModel(), PROMPTS, requests_per_minute=6000)
+        items = [{"id": i, "title_en": f"Ronaldo jersey {i}", "era": "Madrid", "category": "jerseys"} for i in (1, 2, 3)]
+        assert asyncio.run(describer.describe_batch(items)) == {1: (english, hebrew.strip())}
+        prompt, options = prompts_seen[0]
+        assert '"Ronaldo jersey 3"' in prompt
+        assert options["generation_config"]["response_mime_type"] == "application/json"
@@ -0,0 +1,74 @@
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+from app.spiders.ebay_spider import EbaySpider, listing_id
+from benchmarks.parsers import BENCHMARKS, load_fixture_response
+
+
+class TestEbaySpider:
+    def setup_method(self):
+        config = BENCHMARKS["ebay"]
+        self.cb_kwargs = config["cb_kwargs"]
+        self.response = load_fixture_response(config["fixture"], config["url"], self.cb_kwargs)
+
+    def test_fast_parse_matches_css_parse(self):
+        """Test that the lxml fast path yields exactly the same items as the parsel path."""
+        fast_items = list(EbaySpider().parse(self.response, **self.cb_kwargs))
+        css_items = list(EbaySpider(fast_parse=False).parse(self.response, **self.cb_kwargs))
+
+        assert len(fast_items) == 75
+        assert fast_items == css_items
+
+    def test_fast_parse_spider_argument(self):
+        """Test that the fast path can be switched off from the command line."""
+        assert EbaySpider().fast_parse is True
+        assert EbaySpider(fast_parse="0").fast_parse is False
+        assert EbaySpider(fast_parse="false").fast_parse is False
+
+    def test_parse_empty_page(self):
+        """Test that an empty or non-listing page yields nothing on either path."""
+        url = "https://www.ebay.com/sch/i.html?_nkw=cristiano+ronaldo"
+        for body in [b"", b"<html><body><p>No results</p></body></html>"]:
+            response = HtmlResponse(url=url, body=body, encoding="utf-8", request=Request(url))
+            assert list(EbaySpider().parse(response, "United", "jerseys")) == []
+            assert list(EbaySpider(fast_parse=False).parse(response, "United", "jerseys")) == []
+
+
+class TestEbayPagination:
+    def setup_method(self):
+        config = BENCHMARKS["ebay"]
+        with open(config["fixture"], "rb") as f:
+            self.body = f.read()
+        self.spider = EbaySpider.from_crawler(get_crawler(EbaySpider, {"EBAY_MAX_PAGES": 4, "EBAY_PAGE_WINDOW": 2}))
+        self.search_url = config["url"]
+
+    def page(self, number, body=None):
+        request = self.spider.search_request(self.search_url, "United", "jerseys", number)
+        return HtmlResponse(url=request.url, body=self.body if body is None else body, encoding="utf-8", request=request)
+
+    def next_urls(self, response):
+        return [r.url for r in self.spider.parse_search(response, "United", "jerseys") if isinstance(r, Request)]
+
+    def test_start_requests_use_large_first_pages(self):
+        """Test that every search starts at page 1 with 240 listings per page."""
+        requests = list(self.spider.start_requests())
+        assert len(requests) == 10
+        assert all("_ipg=240" in r.url and "_pgn=1" in r.url for r in requests)
+        assert all(r.callback == self.spider.parse_search for r in requests)
+
+    def test_schedules_window_of_pages_ahead(self):
+        """Test that new listings schedule the next pages, up to the configured depth."""
+        assert [u.rsplit("_pgn=", 1)[1] for u in self.next_urls(self.page(1))] == ["2", "3"]
+        self.setup_method()
+        assert self.next_urls(self.page(4)) == []
+
+    def test_stops_when_page_adds_no_new_listings(self):
+        """Test that a page repeating already seen listings ends the search."""
+        list(self.spider.parse_search(self.page(1), "United", "jerseys"))
+        assert self.next_urls(self.page(2)) == []
+        assert self.next_urls(self.page(3)) == []
+        assert self.spider.crawler.stats.get_value("ebay/searches_exhausted") == 1
+
+    def test_listing_id_ignores_tracking_parameters(self):
+        """Test that the same listing with different tracking parameters is recognised."""
+        assert listing_id("https://www.ebay.com/itm/184452549212?_skw=bmw&hash=item2a") == "184452549212"
+        assert listing_id("https://www.ebay.com/itm/ronaldo-jersey/184452549212") == "184452549212"
@@ -0,0 +1,97 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import extraction
+from app.categorization import categorize_part
+from app.database import Base
+from app.models import Item
+
+
+class TestExtractAttributes:
+    def test_all_fields_in_one_pass(self):
+        """Test that every attribute is pulled from a single title."""
+        attributes = extraction.extract_attributes("Brand New Cristiano Ronaldo Real Madrid 2014 Home Jersey Size XL")
+        assert attributes == {
+            "team": "Real Madrid",
+            "era": "Madrid",
+            "year": "2014",
+            "size": "XL",
+            "condition": "New",
+            "category": "jerseys",
+            "part_category": "Miscellaneous",
+        }
+
+    def test_known_era_and_category_take_precedence(self):
+        """Test that the search era and category override what the title mentions."""
+        attributes = extraction.extract_attributes("Ronaldo Portugal jersey", era="United", category="memorabilia")
+        assert attributes["era"] == "United"
+        assert attributes["team"] == "Manchester United"
+        assert attributes["category"] == "memorabilia"
+
+    def test_possessives_are_not_sizes(self):
+        """Test that the letter after an apostrophe is not read as a size, while a standalone size still is."""
+        assert extraction.extract_attributes("Cristiano Ronaldo's signed Real Madrid jersey")["size"] is None
+        assert extraction.extract_attributes("Ronaldo’s Jersey Men's M")["size"] == "M"
+
+    def test_numbers_are_not_sizes(self):
+        """Test that shirt numbers, years and part numbers are not reported as sizes."""
+        assert extraction.extract_attributes("Ronaldo #7 Jersey 2008")["size"] is None
+        assert extraction.extract_attributes("Ronaldo 2008 Jersey")["year"] == "2008"
+        assert extraction.extract_attributes("Kids Ronaldo Jersey Size 10")["size"] == "10"
+
+    def test_condition_profiles(self):
+        """Test eBay and AliExpress condition rules and defaults."""
+        assert extraction.extract_attributes("Ronaldo jersey")["condition"] == "Unknown"
+        assert extraction.extract_attributes("Vintage pre-owned Ronaldo shirt")["condition"] == "Used"
+        assert extraction.extract_attributes("Retro Ronaldo shirt")["condition"] == "Vintage"
+        aliexpress = {"conditions": extraction.ALIEXPRESS_CONDITIONS, "default_condition": "New"}
+        assert extraction.extract_attributes("Ronaldo jersey", **aliexpress)["condition"] == "New"
+        assert extraction.extract_attributes("Ronaldo replica jersey", **aliexpress)["condition"] == "Replica"
+
+    @pytest.mark.parametrize("title, category", [
+        ("BMW E28 Fog Light Assembly", "Lighting"),
+        ("E28 front tie rod end", "Wheels & Suspension"),
+        ("Door handle trim", "Interior"),
+        ("Slightly used mirror", "Exterior"),
+        ("E28 brake pads", "Mechanical"),
+        ("E28 owner's manual", "Miscellaneous"),
+    ])
+    def test_categorize_part(self, title, category):
+        """Test that part categories keep their priority order and word boundaries."""
+        assert categorize_part(title) == category
+
+    def test_extract_batch(self):
+        """Test the batch API applies the same options to every title."""
+        results = extraction.extract_batch(["Ronaldo 2008 shirt", "Ronaldo boots"], era="United")
+        assert [r["year"] for r in results] == ["2008", None]
+        assert all(r["team"] == "Manchester United" for r in results)
+
+
+class TestReprocessItems:
+    @pytest.fixture(autouse=True)
+    def setup_db(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path}/extract.db", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        self.db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+        self.db.add_all([
+            Item(title_en="Ronaldo #7 United Jersey 2008 XL", item_url="https://www.ebay.com/itm/1", era="United",
+                 category="jerseys", source="eBay", size="7", year="2008", condition="Unknown", team="Manchester United"),
+            Item(title_en="Ronaldo Portugal replica jersey", item_url="https://www.aliexpress.com/item/2", era="Portugal",
+                 category="jerseys", source="AliExpress", condition="New", team="Portugal National Team"),
+        ])
+        self.db.commit()
+        yield
+        self.db.close()
+
+    def test_reprocess_updates_changed_rows(self):
+        """Test that stored items are re-extracted in batches with per-source rules."""
+        stats = extraction.reprocess_items(self.db, batch_size=1)
+        assert stats == {"items": 2, "updated": 2}
+        items = self.db.query(Item).order_by(Item.id).all()
+        assert items[0].size == "XL"
+        assert items[1].condition == "Replica"
+
+    def test_dry_run_writes_nothing(self):
+        """Test that a dry run only counts changes."""
+        assert extraction.reprocess_items(self.db, dry_run=True)["updated"] == 2
+        assert self.db.query(Item).filter(Item.size == "7").count() == 1
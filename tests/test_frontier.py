@@ -0,0 +1,99 @@
+import scrapy
+from scrapy.http import Request
+from scrapy.utils.test import get_crawler
+from app.frontier import FAILED, FRONTIER_ID_META, LEASED, QUEUED, Frontier, FrontierScheduler
+
+
+class FrontierSpider(scrapy.Spider):
+    name = "frontier"
+
+    def parse(self, response):
+        pass
+
+
+class TestFrontier:
+    def setup_method(self):
+        self.frontier = None
+
+    def open(self, tmp_path, **kwargs):
+        self.frontier = Frontier(str(tmp_path / "frontier.db"), **kwargs)
+        return self.frontier
+
+    def teardown_method(self):
+        if self.frontier:
+            self.frontier.close()
+
+    def test_domain_interval_shared_by_workers(self, tmp_path):
+        """Test that a second worker cannot lease the same domain before its interval has passed."""
+        frontier = self.open(tmp_path, default_delay=2.0)
+        for page in range(3):
+            frontier.push("ebay", f"fp{page}", f"https://www.ebay.com/sch?_pgn={page}", 0, b"data", now=0)
+        frontier.push("ebay", "other", "https://www.aliexpress.com/wholesale", 0, b"data", now=0)
+
+        first = frontier.lease(["ebay"], "worker-1", now=100)
+        second = frontier.lease(["ebay"], "worker-2", now=100.5)
+        assert first[0] != second[0]
+        # Only the AliExpress unit was allowed at 100.5; eBay is closed until 102
+        assert frontier.lease(["ebay"], "worker-2", now=101) is None
+        assert frontier.next_ready_in(["ebay"], now=101) == 1.0
+        assert frontier.lease(["ebay"], "worker-2", now=102) is not None
+
+    def test_central_limit_overrides_default(self, tmp_path):
+        """Test that `limit` changes the interval for every worker."""
+        frontier = self.open(tmp_path, default_delay=2.0)
+        frontier.set_limit("www.ebay.com", 10.0)
+        for page in range(2):
+            frontier.push("ebay", f"fp{page}", f"https://www.ebay.com/sch?_pgn={page}", 0, b"data", now=0)
+        assert frontier.lease(["ebay"], "worker-1", now=100)
+        assert frontier.lease(["ebay"], "worker-1", now=105) is None
+        assert frontier.lease(["ebay"], "worker-1", now=110)
+
+    def test_expired_lease_goes_to_another_worker(self, tmp_path):
+        """Test that a unit leased by a dead worker is re-leased after expiry, then failed after max attempts."""
+        frontier = self.open(tmp_path, lease_seconds=60, default_delay=0, max_attempts=2)
+        frontier.push("ebay", "fp", "https://www.ebay.com/sch", 0, b"data", now=0)
+        unit_id = frontier.lease(["ebay"], "worker-1", now=0)[0]
+        assert frontier.lease(["ebay"], "worker-2", now=30) is None
+        assert frontier.lease(["ebay"], "worker-2", now=61)[0] == unit_id
+        assert frontier.lease(["ebay"], "worker-3", now=200) is None
+        assert frontier.stats() == {"ebay": {FAILED: 1}}
+
+    def test_duplicates_and_seeds(self, tmp_path):
+        """Test that seen units are dropped, and dont_filter seeds only while still pending."""
+        frontier = self.open(tmp_path)
+        assert frontier.push("ebay", "fp", "https://www.ebay.com/a", 0, b"data")
+        assert frontier.push("ebay", "fp", "https://www.ebay.com/a", 0, b"data") is None
+        assert frontier.push("aliexpress", "fp", "https://www.aliexpress.com/a", 0, b"data")
+
+        seed = frontier.push("aliexpress", "seed", "https://www.aliexpress.com/s", 0, b"data", dont_filter=True)
+        assert frontier.push("aliexpress", "seed", "https://www.aliexpress.com/s", 0, b"data", dont_filter=True) is None
+        frontier.done(seed)
+        assert frontier.push("aliexpress", "seed", "https://www.aliexpress.com/s", 0, b"data", dont_filter=True)
+
+    def test_pending_ignores_own_leases(self, tmp_path):
+        """Test that a worker waits for units other workers still hold, but not for its own."""
+        frontier = self.open(tmp_path, default_delay=0)
+        frontier.push("ebay", "fp", "https://www.ebay.com/a", 0, b"data")
+        frontier.lease(["ebay"], "worker-1")
+        assert frontier.pending(["ebay"], owner="worker-1") == 0
+        assert frontier.pending(["ebay"], owner="worker-2") == 1
+
+
+class TestFrontierScheduler:
+    def test_requests_round_trip_through_frontier(self, tmp_path):
+        """Test that scheduled requests are leased back with their callback, and retries replace the unit."""
+        crawler = get_crawler(FrontierSpider, {"FRONTIER_PATH": str(tmp_path / "frontier.db"), "DOWNLOAD_DELAY": 0.01})
+        spider = FrontierSpider.from_crawler(crawler)
+        scheduler = FrontierScheduler.from_crawler(crawler)
+        scheduler.open(spider)
+
+        assert scheduler.enqueue_request(Request("https://www.ebay.com/sch?_pgn=1", spider.parse))
+        assert not scheduler.enqueue_request(Request("https://www.ebay.com/sch?_pgn=1", spider.parse))
+        request = scheduler.next_request()
+        assert request.callback == spider.parse
+        assert request.meta[FRONTIER_ID_META]
+        assert scheduler.frontier.stats() == {"frontier": {LEASED: 1}}
+
+        assert scheduler.enqueue_request(request.replace(dont_filter=True))
+        assert scheduler.frontier.stats() == {"frontier": {QUEUED: 1}}
+        scheduler.close("finished")
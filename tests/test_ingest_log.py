@@ -0,0 +1,143 @@
+import gzip
+import os
+import pytest
+import scrapy
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import ingest_log
+from app.database import Base
+from app.models import Item, Story
+from app.pipelines import IngestLogPipeline, RonaldoItemsPipeline
+
+
+class DummySpider(scrapy.Spider):
+    name = "dummy"
+
+
+def make_item(i, **overrides):
+    item = {
+        "title_en": f"Cristiano Ronaldo Portugal Jersey #{i}",
+        "price": 50.0 + i,
+        "item_url": f"https://www.ebay.com/itm/{i}",
+        "img_url": f"https://i.ebayimg.com/{i}.jpg",
+        "era": "Portugal",
+        "category": "jerseys",
+        "source": "eBay",
+    }
+    item.update(overrides)
+    return item
+
+
+class TestIngestLog:
+    @pytest.fixture(autouse=True)
+    def setup_db(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path}/ingest.db", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.log_dir = str(tmp_path / "log")
+
+    def load(self, **kwargs):
+        return ingest_log.load_ingest_log(self.log_dir, session_factory=self.Session, **kwargs)
+
+    def test_writer_rolls_and_seals_segments(self):
+        """Test that segments roll over at the record limit and are sealed on close."""
+        writer = ingest_log.IngestLogWriter(self.log_dir, writer_id="ebay", segment_max_records=3)
+        for i in range(7):
+            writer.append("item", make_item(i), spider="ebay")
+
+        assert len(ingest_log.list_segments(self.log_dir)) == 2
+        writer.close()
+        segments = ingest_log.list_segments(self.log_dir)
+        assert len(segments) == 3
+        assert sum(1 for segment in segments for _ in ingest_log.read_segment(segment)) == 7
+
+    def test_load_is_checkpointed(self):
+        """Test that loaded segments are not ingested again on the next run."""
+        writer = ingest_log.IngestLogWriter(self.log_dir, writer_id="ebay")
+        for i in range(5):
+            writer.append("item", make_item(i), spider="ebay")
+        writer.append("story", {"title_en": "Euro 2016", "content_en": "...", "story_type": "milestone"})
+        writer.close()
+
+        assert self.load(batch_size=2) == {"segments": 1, "records": 6, "failed": 0}
+        assert self.Session().query(Item).count() == 5
+        assert self.Session().query(Story).count() == 1
+        assert self.load()["records"] == 0
+
+    def test_replay_reloads_everything(self):
+        """Test that a replay re-ingests all segments idempotently."""
+        writer = ingest_log.IngestLogWriter(self.log_dir, writer_id="ebay")
+        writer.append("item", make_item(1))
+        writer.append("item", make_item(1, price=10.0))
+        writer.close()
+        self.load()
+
+        assert self.load(replay=True)["records"] == 2
+        items = self.Session().query(Item).all()
+        assert len(items) == 1
+        assert items[0].price == 10.0
+
+    def test_load_resumes_inside_a_segment(self):
+        """Test that a load interrupted mid-segment continues after the last committed batch."""
+        writer = ingest_log.IngestLogWriter(self.log_dir, writer_id="ebay")
+        for i in range(4):
+            writer.append("item", make_item(i))
+        writer.close()
+        segment = os.path.basename(ingest_log.list_segments(self.log_dir)[0])
+        ingest_log.save_checkpoint({"completed": [], "current": {"segment": segment, "line": 2}}, self.log_dir)
+
+        assert self.load()["records"] == 2
+        assert {item.item_url for item in self.Session().query(Item)} == {
+            "https://www.ebay.com/itm/2", "https://www.ebay.com/itm/3"}
+
+    def test_bad_record_does_not_fail_batch(self):
+        """Test that records the database rejects are skipped individually."""
+        writer = ingest_log.IngestLogWriter(self.log_dir, writer_id="ebay")
+        writer.append("item", make_item(1))
+        writer.append("item", make_item(2, not_a_column="x"))
+        writer.close()
+
+        assert self.load()["failed"] == 1
+        assert self.Session().query(Item).count() == 1
+
+    def test_truncated_segment_from_crashed_writer(self):
+        """Test that orphaned open segments are sealed and read up to the crash point."""
+        path = os.path.join(self.log_dir, "20250101T000000000000-ebay-999999-00001" + ingest_log.OPEN_SUFFIX)
+        os.makedirs(self.log_dir)
+        with gzip.open(path, "wb") as f:
+            f.write(b'{"kind": "item", "item": {"title_en": "A", "price": 1.0, "item_url": "u1", "source": "eBay"}}\n')
+            f.write(b'{"kind": "item", "item": {"title_')
+
+        assert self.load()["records"] == 1
+        assert self.Session().query(Item).count() == 1
+
+
+class TestIngestLogPipeline:
+    def test_ingest_mode_selects_pipeline(self):
+        """Test that exactly one pipeline is active for each ingest mode."""
+        db_crawler = get_crawler(DummySpider, {"INGEST_MODE": "db"})
+        log_crawler = get_crawler(DummySpider, {"INGEST_MODE": "log"})
+
+        assert isinstance(RonaldoItemsPipeline.from_crawler(db_crawler), RonaldoItemsPipeline)
+        with pytest.raises(NotConfigured):
+            IngestLogPipeline.from_crawler(db_crawler)
+        with pytest.raises(NotConfigured):
+            RonaldoItemsPipeline.from_crawler(log_crawler)
+        assert isinstance(IngestLogPipeline.from_crawler(log_crawler), IngestLogPipeline)
+
+    def test_pipeline_appends_valid_items(self, tmp_path):
+        """Test that validated items are appended to the log and invalid ones are dropped."""
+        spider = DummySpider()
+        pipeline = IngestLogPipeline(log_dir=str(tmp_path))
+        pipeline.open_spider(spider)
+        pipeline.process_item(make_item(1), spider)
+        pipeline.process_item(make_item(2, price=0), spider)
+        pipeline.close_spider(spider)
+
+        records = [record for segment in ingest_log.list_segments(str(tmp_path))
+                   for _, record in ingest_log.read_segment(segment)]
+        assert len(records) == 1
+        assert records[0]["kind"] == "item"
+        assert records[0]["spider"] == "dummy"
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from app import descriptions, fake_llm, llm, story_generator
+from app.llm import LLMError, RestClient
+
+PROMPTS = descriptions.load_prompts()
+ITEM_FIELDS = {"item_title": "Ronaldo 2008 United shirt", "item_context": "", "era": "United", "category": "jerseys"}
+
+
+def rest_client(gemini):
+    return RestClient("http://fake-gemini", "models/gemini-test", transport=httpx.ASGITransport(fake_llm.create_app(gemini)))
+
+
+class TestFakeAnswers:
+    def test_descriptions_are_valid(self):
+        """Test that single and batched description prompts get answers that pass description validation."""
+        english = fake_llm.fake_answer(PROMPTS["en"].format(**ITEM_FIELDS))
+        hebrew = fake_llm.fake_answer(PROMPTS["he"].format(**ITEM_FIELDS))
+        assert descriptions.valid_descriptions(english, hebrew)
+
+        items = [{"id": 7, "title": "Ronaldo boots"}, {"id": 9, "title": "Ronaldo card"}]
+        answer = descriptions.parse_batch_answer(fake_llm.fake_answer(PROMPTS["batch"].format(items_json=json.dumps(items))))
+        assert [entry["id"] for entry in answer] == [7, 9]
+        assert all(descriptions.valid_descriptions(entry["description_en"], entry["description_he"]) for entry in answer)
+
+    def test_story_prompts_get_their_json_shape(self):
+        """Test that story prompts are answered with the JSON the story generator reads."""
+        story = json.loads(fake_llm.fake_answer(story_generator.STORY_CONTENT_PROMPT.format(
+            story_title="Hat-trick", story_context="", story_type="match", era="Madrid")))
+        assert set(story) == {"content_en", "content_he", "summary_en", "summary_he"}
+
+        stories = json.loads(fake_llm.fake_answer(story_generator.CONTEXTUAL_STORIES_PROMPT.format(
+            era="Madrid", category="jerseys", team="Real Madrid")))
+        assert len(stories) == 5
+        assert all(story["era"] == "Madrid" and story["team"] == "Real Madrid" and story["title_en"] for story in stories)
+
+
+class TestFakeServer:
+    def test_rate_limit_answers_429(self):
+        """Test that requests over the per-minute quota are rejected like Gemini rejects them."""
+        gemini = fake_llm.FakeGemini(latency=0, requests_per_minute=2)
+        client = TestClient(fake_llm.create_app(gemini))
+        body = {"contents": [{"parts": [{"text": "Hello"}]}]}
+        statuses = [client.post("/v1beta/models/gemini-test:generateContent", json=body).status_code for _ in range(3)]
+        assert statuses == [200, 200, 429]
+        assert client.get("/stats").json()["rate_limited"] == 1
+
+    def test_latency_is_applied(self):
+        """Test that answers take the configured latency and concurrent requests overlap."""
+        client = rest_client(fake_llm.FakeGemini(latency=0.2))
+
+        async def generate_three():
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            await asyncio.gather(*[client.generate_content_async("Hello") for _ in range(3)])
+            return loop.time() - started
+
+        assert 0.2 <= asyncio.run(generate_three()) < 0.5
+
+    def test_streaming_sends_the_answer_in_pieces(self):
+        """Test that the streaming endpoint sends the answer as several Server-Sent Events."""
+        client = TestClient(fake_llm.create_app(fake_llm.FakeGemini(latency=0)))
+        prompt = PROMPTS["en"].format(**ITEM_FIELDS)
+        body = {"contents": [{"parts": [{"text": prompt}]}]}
+        response = client.post("/v1beta/models/gemini-test:streamGenerateContent", params={"alt": "sse"}, json=body)
+        chunks = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+        assert len(chunks) == fake_llm.STREAM_CHUNKS
+        assert "".join(chunk["candidates"][0]["content"]["parts"][0]["text"] for chunk in chunks) == fake_llm.fake_answer(prompt)
+
+
+class TestRestClient:
+    def test_generates_through_the_fake_server(self):
+        """Test that the REST client sends Gemini's request shape and reads the answer text."""
+        response = asyncio.run(rest_client(fake_llm.FakeGemini(latency=0)).generate_content_async(
+            PROMPTS["en"].format(**ITEM_FIELDS)))
+        assert response.text.startswith("Ronaldo 2008 United shirt is")
+
+    def test_errors_raise_with_status(self):
+        """Test that an error response raises LLMError with the HTTP status."""
+        client = rest_client(fake_llm.FakeGemini(latency=0, error_rate=1.0))
+        with pytest.raises(LLMError) as error:
+            asyncio.run(client.generate_content_async("Hello"))
+        assert error.value.status == 500
+
+    def test_generation_config_is_sent_in_camel_case(self):
+        """Test that SDK-style generation options are translated to the REST request body."""
+        bodies = []
+
+        def handler(request):
+            bodies.append(json.loads(request.content))
+            return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": "[]"}]}}]})
+
+        client = RestClient("http://fake-gemini", "gemini-test", transport=httpx.MockTransport(handler))
+        assert client.generate_content("Hi", generation_config={"response_mime_type": "application/json"}).text == "[]"
+        assert bodies[0]["generationConfig"] == {"responseMimeType": "application/json"}
+        assert client.model_name == "http://fake-gemini/models/gemini-test"
+
+    def test_base_url_selects_the_rest_client(self, monkeypatch):
+        """Test that LLM_BASE_URL switches model creation to the REST client without a Gemini key."""
+        monkeypatch.setenv("LLM_BASE_URL", "http://127.0.0.1:8090")
+        monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+        model = llm.create_model("models/gemini-1.5-flash-latest")
+        assert isinstance(model, RestClient)
+        assert model.base_url == "http://127.0.0.1:8090"
+
+    def test_streaming_yields_each_event(self):
+        """Test that stream=True reads Gemini's Server-Sent Events one partial response at a time."""
+        def handler(request):
+            assert request.url.path.endswith(":streamGenerateContent") and request.url.params["alt"] == "sse"
+            events = "".join(f"data: {json.dumps({'candidates': [{'content': {'parts': [{'text': text}]}}]})}\r\n\r\n"
+                             for text in ('[{"a"', ": 1}]"))
+            return httpx.Response(200, text=events, headers={"content-type": "text/event-stream"})
+
+        client = RestClient("http://fake-gemini", "models/gemini-test", transport=httpx.MockTransport(handler))
+        assert [chunk.text for chunk in client.generate_content("Hi", stream=True)] == ['[{"a"', ": 1}]"]
+
+    def test_streaming_errors_raise_with_status(self):
+        """Test that a rejected streaming request raises LLMError before any chunk."""
+        client = RestClient("http://fake-gemini", "models/gemini-test", transport=httpx.MockTransport(
+            lambda request: httpx.Response(429, json={"error": {"code": 429, "message": "quota"}})))
+        with pytest.raises(LLMError) as error:
+            list(client.generate_content("Hi", stream=True))
+        assert error.value.status == 429
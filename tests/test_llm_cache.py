@@ -0,0 +1,156 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import descriptions, story_generator
+from app.database import Base
+from app.llm_cache import CachedModel, PromptCache, forget_response
+
+
+class FakeModel:
+    model_name = "models/fake"
+
+    def __init__(self, text="Generated"):
+        self.text = text
+        self.calls = []
+
+    def generate_content(self, prompt, stream=False, **options):
+        self.calls.append(prompt)
+        if stream:
+            return iter([SimpleNamespace(text=self.text[:3]), SimpleNamespace(text=self.text[3:])])
+        return SimpleNamespace(text=self.text)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = PromptCache(str(tmp_path / "llm_cache.db"))
+    yield cache
+    cache.close()
+
+
+class TestCachedModel:
+    def test_repeated_prompts_are_served_from_cache(self, cache):
+        """Test that the same prompt reaches the model once and hits and misses are counted."""
+        model = FakeModel()
+        cached = CachedModel(model, cache)
+        assert cached.generate_content("Tell me about 2008").text == "Generated"
+        assert cached.generate_content("Tell me about 2008").text == "Generated"
+        assert cached.generate_content("Tell me about 2016").text == "Generated"
+
+        assert model.calls == ["Tell me about 2008", "Tell me about 2016"]
+        assert (cached.hits, cached.misses) == (1, 2)
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+    def test_key_includes_model_and_options(self, cache):
+        """Test that another model or other generation options do not share an entry."""
+        CachedModel(FakeModel(), cache).generate_content("Prompt")
+        other = FakeModel()
+        other.model_name = "models/other"
+        CachedModel(other, cache).generate_content("Prompt")
+        same = FakeModel()
+        CachedModel(same, cache).generate_content("Prompt", generation_config={"temperature": 0})
+        assert other.calls == ["Prompt"] and same.calls == ["Prompt"]
+
+    def test_empty_answers_are_not_cached(self, cache):
+        """Test that a blank response is asked for again next time."""
+        model = FakeModel(text="  ")
+        cached = CachedModel(model, cache)
+        cached.generate_content("Prompt")
+        cached.generate_content("Prompt")
+        assert len(model.calls) == 2
+
+    def test_async_calls_share_the_cache(self, cache):
+        """Test that async callers get answers cached by sync ones."""
+        model = FakeModel()
+        cached = CachedModel(model, cache)
+        cached.generate_content("Prompt")
+        assert asyncio.run(cached.generate_content_async("Prompt")).text == "Generated"
+        assert len(model.calls) == 1
+
+    def test_streamed_answers_are_cached_whole(self, cache):
+        """Test that a streamed answer passes through in pieces and is then served whole to both kinds of call."""
+        model = FakeModel()
+        cached = CachedModel(model, cache)
+        assert [chunk.text for chunk in cached.generate_content("Prompt", stream=True)] == ["Gen", "erated"]
+        assert [chunk.text for chunk in cached.generate_content("Prompt", stream=True)] == ["Generated"]
+        assert cached.generate_content("Prompt").text == "Generated"
+        assert len(model.calls) == 1
+
+    def test_unparseable_answers_are_forgotten(self, cache):
+        """Test that an answer the caller drops is asked for again, also through other model wrappers."""
+        model = FakeModel(text="not json")
+        cached = CachedModel(model, cache)
+        wrapper = SimpleNamespace(model=cached)
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                json.loads(cached.generate_content("Prompt").text)
+            forget_response(wrapper, "Prompt")
+        assert len(model.calls) == 3
+
+
+class TestEviction:
+    def test_expired_entries_are_missed(self, tmp_path):
+        """Test that entries older than the TTL are fetched again."""
+        cache = PromptCache(str(tmp_path / "llm_cache.db"), ttl_seconds=0.05)
+        key = cache.key("models/fake", "Prompt")
+        cache.put(key, "models/fake", "Answer")
+        assert cache.get(key) == "Answer"
+        time.sleep(0.1)
+        assert cache.get(key) is None
+        assert cache.stats()["entries"] == 0
+
+    def test_least_recently_used_entries_are_evicted(self, tmp_path):
+        """Test that the cache stays under its size limit by dropping the least recently used entries."""
+        cache = PromptCache(str(tmp_path / "llm_cache.db"), max_bytes=25)
+        keys = [cache.key("models/fake", f"Prompt {i}") for i in range(3)]
+        cache.put(keys[0], "models/fake", "x" * 10)
+        cache.put(keys[1], "models/fake", "y" * 10)
+        cache.get(keys[0])
+        cache.put(keys[2], "models/fake", "z" * 10)
+        assert cache.get(keys[0]) is not None
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[2]) is not None
+
+
+class TestDescriberCache:
+    def test_cached_prompts_skip_the_rate_limit(self, cache):
+        """Test that re-describing an unchanged item costs no requests and no rate-limit wait."""
+        prompts = descriptions.load_prompts()
+        model = FakeModel()
+        item = {"title_en": "Ronaldo 2008 United shirt", "era": "United", "category": "jerseys"}
+        asyncio.run(descriptions.GeminiDescriber(CachedModel(model, cache), prompts, requests_per_minute=6000).describe(item))
+
+        describer = descriptions.GeminiDescriber(CachedModel(model, cache), prompts, requests_per_minute=1)
+        started = time.monotonic()
+        asyncio.run(describer.describe(item))
+        assert time.monotonic() - started < 1
+        assert len(model.calls) == 2
+
+    def test_malformed_batch_is_retried_against_the_model(self, cache):
+        """Test that the retries of a batch whose answer is not JSON reach the model instead of the cache."""
+        prompts = descriptions.load_prompts()
+        model = FakeModel(text="Sorry, I can't help with that")
+        describer = descriptions.GeminiDescriber(CachedModel(model, cache), prompts, requests_per_minute=6000)
+        items = [{"id": i, "title_en": f"Ronaldo card {i}", "era": "Madrid", "category": "cards"} for i in (1, 2)]
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                asyncio.run(describer.describe_batch(items))
+        assert len(model.calls) == 2
+        assert cache.stats()["entries"] == 0
+
+
+class TestStoryCache:
+    def test_malformed_stories_are_not_replayed(self, cache, monkeypatch, tmp_path):
+        """Test that a story answer that is not JSON is evicted, so the next generation asks the model again."""
+        engine = create_engine(f"sqlite:///{tmp_path}/stories.db")
+        Base.metadata.create_all(bind=engine)
+        monkeypatch.setattr(story_generator, "SessionLocal", sessionmaker(bind=engine))
+        model = FakeModel(text="[{broken")
+        cached = CachedModel(model, cache)
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                story_generator._generate_contextual_stories(era="Madrid", model=cached)
+        assert len(model.calls) == 2
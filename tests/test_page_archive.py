@@ -0,0 +1,113 @@
+import os
+import pytest
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import page_archive
+from app.database import Base
+from app.models import Item
+from app.spiders.ebay_spider import EbaySpider
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+EBAY_URL = "https://www.ebay.com/sch/i.html?_nkw=cristiano+ronaldo+portugal+jersey&_sacat=0"
+
+
+def ebay_fixture():
+    with open(os.path.join(ROOT_DIR, "ebay.html"), "rb") as f:
+        return f.read()
+
+
+class TestPageArchive:
+    @pytest.fixture(autouse=True)
+    def setup_archive(self, tmp_path):
+        self.archive_dir = str(tmp_path / "archive")
+        self.archive = page_archive.PageArchive(self.archive_dir)
+        self.db_path = tmp_path / "reparse.db"
+        yield
+        self.archive.close()
+
+    def test_pages_round_trip(self):
+        """Test that archived pages are read back byte for byte with their request context."""
+        context = {"callback": "parse", "cb_kwargs": {"era": "Portugal", "category": "jerseys"}, "meta": {}}
+        self.archive.add("ebay", EBAY_URL, b"<html>first</html>", context=context)
+        self.archive.add("ebay", "https://www.ebay.com/other", b"<html>other</html>")
+
+        records = self.archive.records()
+        assert len(records) == 2
+        page = page_archive.read_record(self.archive_dir, records[0])
+        assert page["body"] == b"<html>first</html>"
+        assert page["cb_kwargs"] == {"era": "Portugal", "category": "jerseys"}
+
+    def test_latest_capture_per_url(self):
+        """Test that only the newest capture of a URL is re-parsed by default."""
+        self.archive.add("ebay", EBAY_URL, b"<html>old</html>")
+        self.archive.add("ebay", EBAY_URL, b"<html>new</html>")
+
+        assert len(self.archive.records(latest_only=False)) == 2
+        latest = self.archive.records()
+        assert len(latest) == 1
+        assert page_archive.read_record(self.archive_dir, latest[0])["body"] == b"<html>new</html>"
+
+    def test_segments_roll_over(self, tmp_path):
+        """Test that a new segment is started once the size limit is reached."""
+        archive = page_archive.PageArchive(str(tmp_path / "small"), segment_max_bytes=1)
+        archive.add("ebay", EBAY_URL, b"<html>a</html>")
+        archive.add("ebay", EBAY_URL + "&_pgn=2", b"<html>b</html>")
+        assert len({record["segment"] for record in archive.records()}) == 2
+        archive.close()
+
+    def test_request_context_drops_transient_meta(self):
+        """Test that only JSON-safe, replayable request state is stored."""
+        spider = EbaySpider()
+        request = Request(EBAY_URL, callback=spider.parse, cb_kwargs={"era": "Portugal", "category": "jerseys"},
+                          meta={"download_slot": "ebay.com", "playwright": True, "context": "Portugal", "obj": object()})
+        context = page_archive.request_context(request)
+        assert context == {"callback": "parse", "cb_kwargs": {"era": "Portugal", "category": "jerseys"},
+                           "meta": {"context": "Portugal"}}
+
+    def test_middleware_is_opt_in(self):
+        """Test that the middleware is only enabled with PAGE_ARCHIVE_ENABLED."""
+        with pytest.raises(NotConfigured):
+            page_archive.PageArchiveMiddleware.from_crawler(get_crawler(EbaySpider))
+        crawler = get_crawler(EbaySpider, {"PAGE_ARCHIVE_ENABLED": True, "PAGE_ARCHIVE_DIR": self.archive_dir})
+        assert isinstance(page_archive.PageArchiveMiddleware.from_crawler(crawler), page_archive.PageArchiveMiddleware)
+
+    def test_middleware_archives_responses(self):
+        """Test that successful responses are archived and passed through unchanged."""
+        middleware = page_archive.PageArchiveMiddleware(self.archive_dir)
+        spider = EbaySpider()
+        request = Request(EBAY_URL, callback=spider.parse, cb_kwargs={"era": "Portugal", "category": "jerseys"})
+        response = HtmlResponse(url=EBAY_URL, body=b"<html></html>", encoding="utf-8", request=request)
+
+        assert middleware.process_response(request, response, spider) is response
+        error = HtmlResponse(url=EBAY_URL, status=503, body=b"busy", encoding="utf-8", request=request)
+        middleware.process_response(request, error, spider)
+        assert len(middleware.archive.records(latest_only=False)) == 1
+
+    def test_reparse_record_runs_current_callback(self):
+        """Test that an archived eBay page yields the same items as a live parse."""
+        self.archive.add("ebay", EBAY_URL, ebay_fixture(),
+                         context={"callback": "parse", "cb_kwargs": {"era": "Portugal", "category": "jerseys"}, "meta": {}})
+        items = page_archive.reparse_record(self.archive_dir, self.archive.records()[0])
+
+        assert len(items) > 0
+        assert all(item["era"] == "Portugal" and item["source"] == "eBay" for item in items)
+
+    def test_reparse_archive_feeds_pipeline(self):
+        """Test that re-parsing in a process pool stores the items through the pipeline."""
+        engine = create_engine(f"sqlite:///{self.db_path}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.archive.add("ebay", EBAY_URL, ebay_fixture(),
+                         context={"callback": "parse", "cb_kwargs": {"era": "Portugal", "category": "jerseys"}, "meta": {}})
+
+        stats = page_archive.reparse_archive(self.archive_dir, workers=2, session_factory=Session)
+
+        assert stats["pages"] == 1
+        assert stats["failed_pages"] == 0
+        db = Session()
+        stored = db.query(Item).count()
+        db.close()
+        assert 0 < stored <= stats["items"]
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import scrapy
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+from app import parse_pool
+from app.spiders.ebay_spider import EbaySpider
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+EBAY_URL = "https://www.ebay.com/sch/i.html?_nkw=cristiano+ronaldo+portugal+jersey&_sacat=0"
+
+
+class FollowSpider(parse_pool.PoolParsingMixin, scrapy.Spider):
+    name = "follow"
+
+    def parse(self, response):
+        yield {"url": response.url}
+        yield Request(response.urljoin("/page/2"), self.parse)
+
+
+def ebay_fixture():
+    with open(os.path.join(ROOT_DIR, "ebay.html"), "rb") as f:
+        return f.read()
+
+
+class TestParsePool:
+    def test_requests_unchanged_when_disabled(self):
+        """Test that requests are parsed inline unless PARSE_POOL_ENABLED is set."""
+        spider = EbaySpider.from_crawler(get_crawler(EbaySpider))
+        request = Request(EBAY_URL, spider.parse)
+        assert spider.pooled(request) is request
+
+    def test_run_callback_splits_items_and_requests(self):
+        """Test that follow-up requests come back as picklable dicts."""
+        items, requests = parse_pool.run_callback(FollowSpider(), "https://example.com/page/1", b"<html></html>")
+        assert items == [{"url": "https://example.com/page/1"}]
+        assert requests[0]["url"] == "https://example.com/page/2"
+        assert requests[0]["callback"] == "parse"
+
+    def test_replayable_meta(self):
+        """Test that Scrapy bookkeeping and unpicklable meta stay behind."""
+        meta = {"download_slot": "ebay.com", "depth": 1, "playwright_page": object(), "context": "Portugal"}
+        assert parse_pool.replayable_meta(meta) == {"context": "Portugal"}
+
+    def test_parse_in_pool_matches_inline_parse(self):
+        """Test that pooled parsing yields the same items and next pages as parsing on the reactor thread."""
+        crawler = get_crawler(EbaySpider, {"PARSE_POOL_ENABLED": True, "PARSE_POOL_WORKERS": 1})
+        spider = EbaySpider.from_crawler(crawler)
+        cb_kwargs = {"era": "Portugal", "category": "jerseys"}
+        request = spider.search_request(EBAY_URL, **cb_kwargs)
+        assert request.callback == spider.parse_in_pool
+        response = HtmlResponse(url=request.url, body=ebay_fixture(), encoding="utf-8", request=request)
+
+        async def collect():
+            return [result async for result in spider.parse_in_pool(response, **cb_kwargs)]
+
+        try:
+            pooled = asyncio.run(collect())
+        finally:
+            parse_pool.shutdown_pool()
+        inline = list(EbaySpider().parse_search(response, **cb_kwargs))
+        assert [r for r in pooled if isinstance(r, dict)] == [r for r in inline if isinstance(r, dict)]
+        assert [r.url for r in pooled if isinstance(r, Request)] == [r.url for r in inline if isinstance(r, Request)]
+        assert len(pooled) > 0
+
+    def test_pool_outlives_spiders_until_the_last_closes(self, monkeypatch):
+        """Test that one spider closing leaves the pool to the others and the last one shuts it down without waiting."""
+        shutdowns = []
+
+        class FakeExecutor:
+            def shutdown(self, wait=True):
+                shutdowns.append(wait)
+
+        monkeypatch.setattr(parse_pool, "_pool", None)
+        monkeypatch.setattr(parse_pool, "_pool_users", 0)
+        monkeypatch.setattr(parse_pool, "ProcessPoolExecutor", lambda **kwargs: FakeExecutor())
+        first, second = EbaySpider(), EbaySpider()
+        for spider in (first, second):
+            spider._uses_pool = True
+            parse_pool.acquire_pool(1)
+
+        first.closed("finished")
+        assert shutdowns == [] and parse_pool._pool is not None
+        first.closed("finished")
+        assert shutdowns == []
+        second.closed("finished")
+        assert shutdowns == [False] and parse_pool._pool is None
+
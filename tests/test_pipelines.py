@@ -0,0 +1,133 @@
+import shutil
+import tempfile
+
+import pytest
+import scrapy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from twisted.internet import defer
+from twisted.trial import unittest as trial
+from app.database import Base
+from app.models import Item, Part
+from app.pipelines import RonaldoItemsPipeline
+
+
+class DummySpider(scrapy.Spider):
+    name = "dummy"
+
+
+class TestRonaldoItemsPipeline:
+    @pytest.fixture(autouse=True)
+    def setup_db(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path}/pipeline.db", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.spider = DummySpider()
+        self.pipeline = RonaldoItemsPipeline(threaded=False, session_factory=self.Session)
+        self.pipeline.open_spider(self.spider)
+        yield
+        self.pipeline.close_spider(self.spider)
+
+    def _ronaldo_item(self, **overrides):
+        item = {
+            "title_en": "Cristiano Ronaldo Real Madrid Home Jersey 2016-17",
+            "price": 99.99,
+            "item_url": "https://www.ebay.com/itm/1",
+            "img_url": "https://i.ebayimg.com/1.jpg",
+            "era": "Madrid",
+            "category": "jerseys",
+            "source": "eBay",
+        }
+        item.update(overrides)
+        return item
+
+    def test_ronaldo_item_is_written(self):
+        """Test that a valid Ronaldo item is stored and returned unchanged."""
+        item = self._ronaldo_item()
+        assert self.pipeline.process_item(item, self.spider) is item
+
+        db = self.Session()
+        assert db.query(Item).count() == 1
+        assert db.query(Item).first().title_en == item["title_en"]
+        assert self.pipeline.items_processed == 1
+
+    def test_duplicate_url_updates_existing_item(self):
+        """Test that items are upserted by URL."""
+        self.pipeline.process_item(self._ronaldo_item(), self.spider)
+        self.pipeline.process_item(self._ronaldo_item(price=79.99), self.spider)
+
+        db = self.Session()
+        assert db.query(Item).count() == 1
+        assert db.query(Item).first().price == 79.99
+
+    def test_invalid_items_are_not_written(self):
+        """Test that items with missing fields or invalid prices are skipped."""
+        self.pipeline.process_item(self._ronaldo_item(price=0), self.spider)
+        self.pipeline.process_item(self._ronaldo_item(title_en=""), self.spider)
+
+        assert self.Session().query(Item).count() == 0
+        assert self.pipeline.items_processed == 0
+
+    def test_legacy_part_is_written(self):
+        """Test that legacy BMW parts still go to the parts table."""
+        part = {
+            "title_en": "BMW E28 Brake Disc",
+            "price": 45.0,
+            "ebay_url": "https://www.schmiedmann.com/en/part.html",
+            "img_url": "https://example.com/disc.jpg",
+            "series": "E28",
+            "source": "Schmiedmann",
+        }
+        self.pipeline.process_item(part, self.spider)
+
+        assert self.Session().query(Part).count() == 1
+
+    def test_write_error_does_not_break_pipeline(self):
+        """Test that a failed write is logged and the session stays usable."""
+        bad_item = self._ronaldo_item(unknown_column="not a column")
+        assert self.pipeline.process_item(bad_item, self.spider) is bad_item
+
+        self.pipeline.process_item(self._ronaldo_item(item_url="https://www.ebay.com/itm/2"), self.spider)
+        assert self.Session().query(Item).count() == 1
+
+
+class TestThreadedPipeline(trial.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        engine = create_engine(f"sqlite:///{self.tmp_dir}/pipeline.db", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.spider = DummySpider()
+        self.pipeline = RonaldoItemsPipeline(threaded=True, write_queue_size=2, session_factory=self.Session)
+        self.pipeline.open_spider(self.spider)
+
+    def _ronaldo_item(self, number, **overrides):
+        item = {
+            "title_en": f"Cristiano Ronaldo Real Madrid Home Jersey {number}",
+            "price": 99.99,
+            "item_url": f"https://www.ebay.com/itm/{number}",
+            "era": "Madrid",
+            "category": "jerseys",
+            "source": "eBay",
+        }
+        item.update(overrides)
+        return item
+
+    @defer.inlineCallbacks
+    def test_queued_writes_are_all_committed(self):
+        """Test that writes beyond the queue size, one of them failing, all fire with their item and are committed by close."""
+        items = [self._ronaldo_item(number) for number in range(6)]
+        items[2]["unknown_column"] = "not a column"
+        deferreds = [self.pipeline.process_item(item, self.spider) for item in items]
+        assert all(isinstance(d, defer.Deferred) for d in deferreds)
+
+        yield self.pipeline.close_spider(self.spider)
+        results = yield defer.gatherResults(deferreds)
+
+        assert all(result is item for result, item in zip(results, items))
+        db = self.Session()
+        assert sorted(item.item_url for item in db.query(Item)) == sorted(
+            item["item_url"] for item in items if "unknown_column" not in item)
+        assert self.pipeline.items_processed == 5
+        db.close()
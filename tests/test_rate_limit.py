@@ -0,0 +1,88 @@
+import multiprocessing
+import threading
+import time
+import pytest
+from app import rate_limit
+from app.rate_limit import BULK, INTERACTIVE, Limit, LimiterTimeout, SharedLimiter
+
+
+def acquire_in_process(path, count, times):
+    """Run in a separate process: take count slots at 600 rpm and record when each was granted"""
+    limiter = SharedLimiter(path, {"gemini": Limit(requests_per_minute=600)})
+    for _ in range(count):
+        with limiter.slot("gemini"):
+            times.append(time.time())
+
+
+class TestSharedLimiter:
+    def test_calls_are_spaced_by_the_rate(self, tmp_path):
+        """Test that calls beyond the burst wait for the bucket to refill."""
+        limiter = SharedLimiter(str(tmp_path / "limits.db"), {"gemini": Limit(requests_per_minute=600)})
+        started = time.monotonic()
+        for _ in range(3):
+            with limiter.slot("gemini"):
+                pass
+        assert time.monotonic() - started >= 0.19
+
+    def test_concurrency_cap_is_shared_between_limiters(self, tmp_path):
+        """Test that a slot held through one connection to the file is not available through another."""
+        limits = {"gemini": Limit(max_concurrency=1)}
+        first = SharedLimiter(str(tmp_path / "limits.db"), limits)
+        second = SharedLimiter(str(tmp_path / "limits.db"), limits)
+        lease = first.acquire("gemini", INTERACTIVE)
+        with pytest.raises(LimiterTimeout):
+            second.acquire("gemini", INTERACTIVE, timeout=0.2)
+        first.release(lease)
+        second.release(second.acquire("gemini", INTERACTIVE, timeout=0.2))
+
+    def test_interactive_callers_go_first(self, tmp_path):
+        """Test that an interactive caller waiting for a token is served before a bulk caller that came earlier."""
+        limiter = SharedLimiter(str(tmp_path / "limits.db"), {"gemini": Limit(requests_per_minute=120)})
+        limiter.release(limiter.acquire("gemini"))
+        order = []
+
+        def take(name, priority):
+            with limiter.slot("gemini", priority):
+                order.append(name)
+
+        bulk = threading.Thread(target=take, args=("bulk", BULK))
+        bulk.start()
+        time.sleep(0.1)
+        interactive = threading.Thread(target=take, args=("interactive", INTERACTIVE))
+        interactive.start()
+        bulk.join()
+        interactive.join()
+        assert order == ["interactive", "bulk"]
+
+    def test_bulk_callers_leave_a_slot_for_interactive_ones(self, tmp_path):
+        """Test that bulk callers cannot take the slots reserved for interactive callers."""
+        limiter = SharedLimiter(None, {"gemini": Limit(max_concurrency=2, interactive_reserve=1)})
+        limiter.acquire("gemini", BULK)
+        with pytest.raises(LimiterTimeout):
+            limiter.acquire("gemini", BULK, timeout=0.1)
+        limiter.acquire("gemini", INTERACTIVE, timeout=0.1)
+        assert limiter.status()["gemini"]["in_flight"] == 2
+
+    def test_slots_of_dead_processes_expire(self, tmp_path, monkeypatch):
+        """Test that a lease that was never released frees its slot after the lease time."""
+        monkeypatch.setattr(rate_limit, "LEASE_SECONDS", 0.1)
+        limiter = SharedLimiter(str(tmp_path / "limits.db"), {"gemini": Limit(max_concurrency=1)})
+        limiter.acquire("gemini")
+        limiter.release(limiter.acquire("gemini", timeout=1))
+
+    def test_rate_holds_across_processes(self, tmp_path):
+        """Test that two processes sharing the file together stay within the rate."""
+        context = multiprocessing.get_context("spawn")
+        with context.Manager() as manager:
+            times = manager.list()
+            workers = [context.Process(target=acquire_in_process, args=(str(tmp_path / "limits.db"), 3, times))
+                       for _ in range(2)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join(30)
+            times = sorted(times)
+        assert len(times) == 6
+        # One token up front, then one every 0.1s
+        assert times[-1] - times[0] >= 0.45
+        assert all(later - earlier >= 0.08 for earlier, later in zip(times, times[1:]))
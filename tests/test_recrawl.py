@@ -0,0 +1,138 @@
+import datetime
+import pytest
+import scrapy
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import recrawl
+from app.database import Base
+from app.models import Item, Part, QuerySchedule, QueryStat
+
+SEARCH = "https://www.ebay.com/sch/i.html?_nkw=ronaldo"
+
+
+class SearchSpider(scrapy.Spider):
+    name = "ebay"
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/recrawl.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def middleware_for(session_factory, budgets=None):
+    middleware = recrawl.QueryYieldMiddleware(get_crawler(SearchSpider), budgets, session_factory=session_factory)
+    db = session_factory()
+    db.add(Item(title_en="Known jersey", item_url="https://www.ebay.com/itm/1", price=50.0, source="eBay"))
+    db.add(Item(title_en="Known boots", item_url="https://www.ebay.com/itm/2", price=80.0, source="eBay"))
+    db.commit()
+    db.close()
+    return middleware
+
+
+def search_page(request):
+    return HtmlResponse(url=request.url, body=b"<html></html>", request=request)
+
+
+class TestQueryYieldMiddleware:
+    def test_counts_new_items_and_price_changes(self, session_factory):
+        """Test that a query is credited with new listings and price changes, also on follow-up pages."""
+        middleware = middleware_for(session_factory)
+        spider = SearchSpider()
+        middleware.spider_opened(spider)
+        start = next(middleware.process_start_requests([Request(SEARCH)], spider))
+        output = [
+            {"item_url": "https://www.ebay.com/itm/1", "price": 50.0},
+            {"item_url": "https://www.ebay.com/itm/2", "price": 70.0},
+            {"item_url": "https://www.ebay.com/itm/3", "price": 20.0},
+            Request(SEARCH + "&_pgn=2"),
+        ]
+        next_page = list(middleware.process_spider_output(search_page(start), output, spider))[-1]
+        assert next_page.meta[recrawl.QUERY_ID_META] == f"ebay {SEARCH}"
+        list(middleware.process_spider_output(search_page(next_page), [{"item_url": "https://www.ebay.com/itm/4", "price": 5.0}], spider))
+
+        middleware.spider_closed(spider)
+        stat = session_factory().query(QueryStat).one()
+        assert (stat.requests, stat.items, stat.new_items, stat.price_changes) == (2, 4, 2, 1)
+
+    def test_prices_are_looked_up_only_for_scraped_urls(self, session_factory, monkeypatch):
+        """Test that opening the spider loads no prices and scraped URLs are looked up in batches."""
+        monkeypatch.setattr(recrawl, "PRICE_LOOKUP_BATCH", 2)
+        middleware = middleware_for(session_factory)
+        spider = SearchSpider()
+        middleware.spider_opened(spider)
+        assert middleware.known_prices == {}
+
+        start = next(middleware.process_start_requests([Request(SEARCH)], spider))
+        output = [{"item_url": f"https://www.ebay.com/itm/{n}", "price": 70.0} for n in (2, 3, 5)]
+        assert list(middleware.process_spider_output(search_page(start), output, spider)) == output
+        assert set(middleware.known_prices) == {f"https://www.ebay.com/itm/{n}" for n in (2, 3, 5)}
+        assert "https://www.ebay.com/itm/1" not in middleware.known_prices
+
+        middleware.spider_closed(spider)
+        stat = session_factory().query(QueryStat).one()
+        assert (stat.items, stat.new_items, stat.price_changes) == (3, 2, 1)
+
+    def test_schmiedmann_parts_count(self, session_factory):
+        """Test that parts stored by ebay_url, as the Schmiedmann spiders yield them, are credited to their query."""
+        middleware = middleware_for(session_factory)
+        db = session_factory()
+        db.add(Part(title_en="BMW E28 Brake Disc", ebay_url="https://www.schmiedmann.com/en/disc", price=49.14,
+                    series="E28", source="Schmiedmann"))
+        db.commit()
+        db.close()
+        spider = SearchSpider()
+        middleware.spider_opened(spider)
+        start = next(middleware.process_start_requests([Request(SEARCH)], spider))
+        output = [
+            {"title_en": "BMW E28 Brake Disc", "ebay_url": "https://www.schmiedmann.com/en/disc", "price": 45.0},
+            {"title_en": "BMW E28 Oil Filter", "ebay_url": "https://www.schmiedmann.com/en/filter", "price": 13.5},
+        ]
+        list(middleware.process_spider_output(search_page(start), output, spider))
+
+        middleware.spider_closed(spider)
+        stat = session_factory().query(QueryStat).one()
+        assert (stat.items, stat.new_items, stat.price_changes) == (2, 1, 1)
+
+    def test_budgets_limit_queries_and_pages(self, session_factory):
+        """Test that only budgeted queries run and their follow-up pages stop at the budget."""
+        middleware = middleware_for(session_factory, budgets={f"ebay {SEARCH}": 2})
+        spider = SearchSpider()
+        starts = list(middleware.process_start_requests([Request(SEARCH), Request(SEARCH + "+boots")], spider))
+        assert [r.url for r in starts] == [SEARCH]
+        pages = [Request(SEARCH + f"&_pgn={n}") for n in (2, 3)]
+        followed = list(middleware.process_spider_output(search_page(starts[0]), pages, spider))
+        assert [r.url for r in followed] == [SEARCH + "&_pgn=2"]
+
+
+class TestPlanSchedule:
+    def add_history(self, db, query, new_items, requests=5, price_changes=0):
+        db.add(QueryStat(query_id=query, spider="ebay", crawled_at=datetime.datetime(2026, 1, 1),
+                         requests=requests, items=new_items, new_items=new_items, price_changes=price_changes))
+
+    def test_intervals_and_shares_follow_yield(self, session_factory):
+        """Test that productive queries are recrawled sooner with a larger budget share, and dead ones rarely."""
+        db = session_factory()
+        self.add_history(db, "ebay hot", new_items=40)
+        self.add_history(db, "ebay warm", new_items=5, price_changes=5)
+        self.add_history(db, "ebay dead", new_items=0)
+        db.commit()
+
+        plan = {s.query_id: s for s in recrawl.plan_schedule(db, daily_budget=1000)}
+        assert plan["ebay hot"].interval_hours < plan["ebay warm"].interval_hours < plan["ebay dead"].interval_hours
+        assert plan["ebay dead"].interval_hours == recrawl.MAX_INTERVAL_HOURS
+        assert plan["ebay hot"].budget_share > plan["ebay warm"].budget_share > plan["ebay dead"].budget_share > 0
+        assert sum(s.budget_share for s in plan.values()) == pytest.approx(1.0, abs=0.001)
+        assert plan["ebay hot"].next_due == datetime.datetime(2026, 1, 1) + datetime.timedelta(hours=plan["ebay hot"].interval_hours)
+
+    def test_due_queries_grouped_by_spider(self, session_factory):
+        """Test that only queries past their due time are handed to the crawler, with their budgets."""
+        db = session_factory()
+        now = datetime.datetime(2026, 1, 10)
+        db.add(QuerySchedule(query_id="ebay a", spider="ebay", max_requests=7, next_due=now - datetime.timedelta(hours=1)))
+        db.add(QuerySchedule(query_id="ebay b", spider="ebay", max_requests=3, next_due=now + datetime.timedelta(hours=1)))
+        db.commit()
+        assert recrawl.due_queries(db, now=now) == {"ebay": {"ebay a": 7}}
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from scrapy.http import HtmlResponse, Request
 from app.spiders.schmiedmann_spider import SchmiedmannE28Spider, SchmiedmannF10Spider, SchmiedmannSpider
@@ -488,4 +489,140 @@ class TestSchmiedmannSpider:
         assert 'Sec-Ch-Ua' in headers
         
         # User-Agent is set at top level, not in DEFAULT_REQUEST_HEADERS
-        assert 'USER_AGENT' in settings
\ No newline at end of file
+        assert 'USER_AGENT' in settings
+
+class FakeCatalogResponse:
+    """Stands in for a Playwright response to a catalog XHR."""
+
+    def __init__(self, page, payload, resource_type="xhr", content_type="application/json; charset=utf-8"):
+        self.url = "https://www.schmiedmann.com/api/catalog/products"
+        self.frame = type("Frame", (), {"page": page})()
+        self.request = type("PlaywrightRequest", (), {"resource_type": resource_type})()
+        self.headers = {"content-type": content_type}
+        self.payload = payload
+
+    async def json(self):
+        return self.payload
+
+
+class FakePage:
+    def __init__(self, late_response=None, rendered_html=None):
+        self.closed = False
+        self.late_response = late_response
+        self.rendered_html = rendered_html
+
+    async def wait_for_selector(self, selector, timeout=None):
+        if self.rendered_html is None:
+            raise TimeoutError("no products rendered")
+
+    async def content(self):
+        return self.rendered_html
+
+    async def wait_for_response(self, predicate, timeout=None):
+        if self.late_response is None or not predicate(self.late_response):
+            raise TimeoutError("no catalog response")
+        return self.late_response
+
+    async def close(self):
+        self.closed = True
+
+
+CATALOG_PAYLOAD = {
+    "total": 2,
+    "data": {
+        "products": [
+            {"Name": "Brake Disc Front", "Price": {"Amount": 45.5}, "Url": "/en/bmw-E28/brake-disc",
+             "Images": ["https://cdn.schmiedmann.com/brake-disc.jpg"]},
+            {"Name": "Oil Filter", "Price": "12,50 €", "Url": "/en/bmw-E28/oil-filter"},
+            {"Name": "Gift card", "Price": 0},
+        ],
+        "facets": [{"name": "Brand", "count": 12}],
+    },
+}
+
+
+class TestSchmiedmannCatalogJson:
+    def setup_method(self):
+        self.spider = SchmiedmannE28Spider(capture_xhr="1")
+        self.url = "https://www.schmiedmann.com/en/bmw-E28/spare-parts-engine-and-driveline-mc12-catn-ol"
+
+    def _collect(self, page):
+        request = Request(self.url, meta={"playwright_page": page})
+        response = HtmlResponse(url=self.url, body=b"<html><body></body></html>", encoding="utf-8", request=request)
+
+        async def collect():
+            return [result async for result in self.spider.parse_catalog_json(response)]
+
+        return asyncio.run(collect())
+
+    def test_capture_mode_requests(self):
+        """Test that capture mode keeps the page and registers the response handler by name."""
+        request = next(iter(self.spider.start_requests()))
+        assert request.callback == self.spider.parse_catalog_json
+        assert request.meta["playwright_include_page"] is True
+        assert request.meta["playwright_page_event_handlers"] == {"response": "capture_catalog_response"}
+        assert request.to_dict(spider=self.spider)["callback"] == "parse_catalog_json"
+
+    def test_find_product_records(self):
+        """Test that product lists are found anywhere in the payload and facets are ignored."""
+        from app.spiders.schmiedmann_spider import find_product_records
+        records = find_product_records(CATALOG_PAYLOAD)
+        assert [record["Name"] for record in records] == ["Brake Disc Front", "Oil Filter", "Gift card"]
+
+    def test_items_from_captured_json(self):
+        """Test that captured catalog JSON is turned into items and the page is closed."""
+        page = FakePage()
+        self.spider.capture_catalog_response(FakeCatalogResponse(page, CATALOG_PAYLOAD))
+        self.spider.capture_catalog_response(FakeCatalogResponse(page, {"tracking": True}, resource_type="script"))
+
+        items = self._collect(page)
+
+        assert page.closed
+        assert len(items) == 2
+        assert items[0]["title_en"] == "BMW E28 Brake Disc Front"
+        assert items[0]["price"] == round(45.5 * self.spider.EUR_TO_USD_RATE, 2)
+        assert items[0]["ebay_url"] == "https://www.schmiedmann.com/en/bmw-E28/brake-disc"
+        assert items[0]["img_url"] == "https://cdn.schmiedmann.com/brake-disc.jpg"
+        assert items[1]["price"] == round(12.5 * self.spider.EUR_TO_USD_RATE, 2)
+        assert len(self.spider._catalog_responses) == 0
+
+    def test_waits_for_late_catalog_response(self):
+        """Test that parsing waits for a catalog response that arrives after DOMContentLoaded."""
+        page = FakePage()
+        page.late_response = FakeCatalogResponse(page, CATALOG_PAYLOAD)
+        assert len(self._collect(page)) == 2
+
+    def test_falls_back_to_dom(self):
+        """Test that the DOM is parsed when no catalog JSON was captured."""
+        page = FakePage()
+        assert self._collect(page) == []
+        assert page.closed
+
+    def test_dom_fallback_waits_for_the_rendered_grid(self):
+        """Test that the DOM fallback parses the grid the client rendered after DOMContentLoaded."""
+        page = FakePage(rendered_html="""<html><body><div class="product-card">
+            <h3 class="product-title">Water Pump</h3><span class="price">89,00 €</span>
+            <a href="/en/bmw-E28/water-pump">View</a></div></body></html>""")
+        items = self._collect(page)
+        assert [item["title_en"] for item in items] == ["BMW E28 Water Pump"]
+        assert page.closed
+
+    def test_responses_after_close_are_dropped(self):
+        """Test that a catalog response arriving while the page closes is not kept."""
+        page = FakePage()
+
+        async def close():
+            self.spider.capture_catalog_response(FakeCatalogResponse(page, CATALOG_PAYLOAD))
+            page.closed = True
+
+        page.close = close
+        self._collect(page)
+        assert len(self.spider._catalog_responses) == 0
+
+    def test_archived_capture_page_replays(self):
+        """Test that an archived capture-mode page is re-parsed from its DOM through run_callback."""
+        from app.parse_pool import run_callback
+        body = b'<html><body><div class="product-card"><h3 class="product-title">Water Pump</h3>' \
+               b'<span class="price">89,00 \xe2\x82\xac</span><a href="/en/bmw-E28/water-pump">View</a></div></body></html>'
+        items, _ = run_callback(self.spider, self.url, body, callback="parse_catalog_json")
+        assert [item["title_en"] for item in items] == ["BMW E28 Water Pump"]
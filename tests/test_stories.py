@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import story_generator
+from fastapi.testclient import TestClient
+from app.api import app
+from app.database import Base
+from app.llm import CircuitBreaker, DeadlineRunner
+from app.rate_limit import SharedLimiter, limits_from_env
+from tests.fakes import FakeModel, FakeStreamingModel
+
+
+def sse_events(body):
+    return [(block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+            for block in body.strip().split("\n\n")]
+
+
+@pytest.fixture
+def stories(tmp_path, monkeypatch):
+    """story_generator on a temporary database with a 0.2s deadline"""
+    engine = create_engine(f"sqlite:///{tmp_path}/stories.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(story_generator, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    monkeypatch.setattr(story_generator, "STORY_RUNNER", DeadlineRunner(0.2, workers=2, breaker=CircuitBreaker(2, 60)))
+    return story_generator
+
+
+class TestCircuitBreaker:
+    def test_opens_after_repeated_failures_and_tries_again_later(self):
+        """Test that the breaker opens at the threshold, lets one trial through after the reset time and closes on success."""
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open" and not breaker.allow()
+
+        now[0] = 10
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open"
+
+        now[0] = 20
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed" and breaker.allow()
+
+
+class TestDeadlineRunner:
+    def test_slow_calls_are_abandoned_at_the_deadline(self):
+        """Test that a call over its deadline returns None on time and counts as a failure."""
+        runner = DeadlineRunner(0.1, workers=1, breaker=CircuitBreaker(1, 60))
+        started = time.monotonic()
+        assert runner.run(time.sleep, 0.5) is None
+        assert time.monotonic() - started < 0.3
+        assert runner.breaker.state == "open"
+        assert runner.stats["timed_out"] == 1
+
+    def test_busy_runner_rejects_calls(self):
+        """Test that calls are turned away without waiting while every worker is busy."""
+        runner = DeadlineRunner(0.05, workers=1)
+        release = threading.Event()
+        runner.run(release.wait)
+        assert runner.run(lambda: "answer") is None
+        assert runner.stats["rejected"] == 1
+        release.set()
+        time.sleep(0.1)
+        assert runner.run(lambda: "answer") == "answer"
+
+
+class TestStoryFallback:
+    def test_generated_stories_are_returned(self, stories, monkeypatch):
+        """Test that a provider answering within the deadline fills the filter with new stories."""
+        monkeypatch.setattr(stories, "GEMINI_MODEL", FakeModel())
+        result = stories.get_or_generate_stories(era="Madrid", team="Real Madrid")
+        assert len(result) == 5
+        assert all(story.era == "Madrid" and story.title_en.startswith("Madrid story") for story in result)
+
+    def test_slow_provider_falls_back_to_ranked_stories(self, stories, monkeypatch):
+        """Test that a provider slower than the deadline is abandoned and ranked default stories are served."""
+        monkeypatch.setattr(stories, "GEMINI_MODEL", FakeModel(latency=1.0))
+        started = time.monotonic()
+        result = stories.get_or_generate_stories(era="Madrid", team="Real Madrid", limit=4)
+        assert time.monotonic() - started < 0.5
+        assert len(result) == 4
+        assert result[0].title_en == "The Bicycle Kick Against Juventus"
+        assert all(story.era in ("Madrid", "General") for story in result)
+
+    def test_open_breaker_stops_calling_the_provider(self, stories, monkeypatch):
+        """Test that after repeated failures requests are served from the fallback without calling the provider."""
+        model = FakeModel(fail=True)
+        monkeypatch.setattr(stories, "GEMINI_MODEL", model)
+        for _ in range(4):
+            assert len(stories.get_or_generate_stories(era="Juventus", limit=3)) == 3
+        assert model.calls == 2
+        assert stories.STORY_RUNNER.breaker.state == "open"
+
+    def test_waiting_for_the_rate_limit_does_not_open_the_breaker(self, stories, monkeypatch):
+        """Test that at the default limits, calls without a free token are skipped quickly and the breaker stays closed."""
+        for name in ("GEMINI_RPM", "GEMINI_CONCURRENCY"):
+            monkeypatch.delenv(name, raising=False)
+        model = FakeModel(latency=0.2)
+        monkeypatch.setattr(stories, "GEMINI_MODEL", stories.interactive_model(model, SharedLimiter(None, limits_from_env())))
+        monkeypatch.setattr(stories, "STORY_RUNNER", stories.story_runner())
+
+        for era in ("Era 1", "Era 2", "Era 3", "Era 4"):
+            started = time.monotonic()
+            assert len(stories.get_or_generate_stories(era=era, limit=5)) == 5
+            assert time.monotonic() - started < stories.STORY_DEADLINE_SECONDS
+        assert model.calls == 1
+        assert stories.STORY_RUNNER.stats == {"calls": 4, "succeeded": 1, "failed": 0, "timed_out": 0, "rejected": 3}
+        assert stories.STORY_RUNNER.breaker.state == "closed"
+
+
+class TestStoryStreaming:
+    def test_parser_emits_each_object_once_it_closes(self):
+        """Test that stories split at any point, including inside strings with brackets and escapes, come out whole."""
+        answer = '```json\n[{"title_en": "A {b} \\"c]\\"", "n": [1, {"x": 2}]}, {"title_en": "Second"}]\n```'
+        for size in (1, 3, 10):
+            parser = story_generator.StoryStreamParser()
+            found = []
+            for i in range(0, len(answer), size):
+                found.extend(parser.feed(answer[i:i + size]))
+            assert found == [{"title_en": 'A {b} "c]"', "n": [1, {"x": 2}]}, {"title_en": "Second"}]
+
+    def test_first_story_is_stored_before_the_answer_ends(self, stories, monkeypatch):
+        """Test that each streamed story is stored as soon as it is complete, while invalid ones are skipped."""
+        answer = json.dumps([{"title_en": "Complete", "content_en": "c", "summary_en": "s", "story_type": "match"},
+                             {"title_en": "No content"},
+                             {"title_en": "Later", "content_en": "c", "summary_en": "s", "story_type": "record"}])
+        monkeypatch.setattr(stories, "GEMINI_MODEL", FakeStreamingModel(answer=answer))
+        events = stories.stream_contextual_stories(era="Madrid")
+        event, story = next(events)
+        assert event == "story" and story["title_en"] == "Complete" and story["era"] == "Madrid"
+        db = stories.SessionLocal()
+        assert [s.title_en for s in db.query(stories.Story)] == ["Complete"]
+        db.close()
+        rest = list(events)
+        assert [event for event, _ in rest] == ["story", "done"]
+        assert rest[-1][1] == {"generated": 2, "rejected": 1}
+
+    def test_endpoint_streams_stories_as_server_sent_events(self, stories, monkeypatch):
+        """Test that GET /stories/stream sends a story event per generated story and then done."""
+        monkeypatch.setattr(stories, "GEMINI_MODEL", FakeStreamingModel())
+        response = TestClient(app).get("/stories/stream", params={"era": "Juventus", "team": "Juventus"})
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = sse_events(response.text)
+        assert [event for event, _ in events] == ["story"] * 5 + ["done"]
+        assert all(data["id"] and data["era"] == "Juventus" for _, data in events[:5])
+        assert events[-1][1] == {"generated": 5, "rejected": 0}
+
+        # The filter is now full, so the next stream does not call the model
+        again = sse_events(TestClient(app).get("/stories/stream", params={"era": "Juventus", "team": "Juventus"}).text)
+        assert again == [("done", {"generated": 0})]
+        assert stories.GEMINI_MODEL.calls == 1
+
+    def test_interrupted_stream_keeps_stored_stories_and_reports_the_error(self, stories, monkeypatch):
+        """Test that stories stored before a provider failure are kept and the failure counts against the breaker."""
+        story = {"content_en": "c", "summary_en": "s", "story_type": "match"}
+        answer = json.dumps([dict(story, title_en="First"), dict(story, title_en="Second")])
+        # The stream breaks halfway through the second story
+        monkeypatch.setattr(stories, "GEMINI_MODEL",
+                            FakeStreamingModel(chunk_size=10, fail_after=len(answer) * 3 // 40, answer=answer))
+        events = list(stories.stream_contextual_stories(era="United"))
+        assert [event for event, _ in events] == ["story", "error"]
+        assert events[-1][1] == {"message": "stream interrupted", "generated": 1}
+        db = stories.SessionLocal()
+        assert [s.title_en for s in db.query(stories.Story)] == ["First"]
+        db.close()
+        assert stories.STORY_RUNNER.breaker.failures == 1
@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import story_generator, story_warmup
+from app.database import Base
+from app.models import Item, Story, StoryRanking, StoryWarmupRun
+from tests.fakes import FakeModel
+
+
+def add_items(db, *filters):
+    for i, (era, team, category) in enumerate(filters):
+        db.add(Item(title_en=f"Ronaldo item {i}", item_url=f"https://example.com/{i}", era=era, team=team,
+                    category=category))
+    db.commit()
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path}/warmup.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(story_generator, "SessionLocal", session_factory)
+    monkeypatch.setattr(story_generator, "GEMINI_MODEL", None)
+    session = session_factory()
+    yield session
+    session.close()
+
+
+class TestCatalogFilters:
+    def test_filters_come_from_the_catalog(self, db):
+        """Test that every catalog combination and the team-less filters the frontend sends are walked once."""
+        add_items(db, ("Madrid", "Real Madrid", "jerseys"), ("Madrid", "Real Madrid", "jerseys"),
+                  ("Madrid", None, "boots"))
+        assert story_warmup.catalog_filters(db) == [
+            ("", "", "boots"), ("", "", "jerseys"), ("Madrid", "", ""), ("Madrid", "", "boots"),
+            ("Madrid", "", "jerseys"), ("Madrid", "Real Madrid", "jerseys"),
+        ]
+
+
+class TestWarmFilters:
+    def test_budget_splits_filters_into_generated_and_ranked(self, db):
+        """Test that cold filters are generated while the call budget lasts and ranked after it."""
+        add_items(db, ("Madrid", None, "jerseys"), ("Juventus", None, "boots"), ("United", None, "cards"))
+        model = story_warmup.SpendMeter(FakeModel())
+        filters = [("Juventus", "", ""), ("Madrid", "", ""), ("United", "", "")]
+        counts = story_warmup.warm_filters(db, filters, model, max_calls=1)
+
+        assert counts == {"combinations": 3, "already_warm": 0, "generated": 1, "ranked": 2, "failed": 0,
+                          "stories_added": 5}
+        assert model.calls == 1 and model.tokens > 0
+        assert {(r.era, r.team, r.category) for r in db.query(StoryRanking)} == {("Madrid", "", ""), ("United", "", "")}
+
+        # A second run finds the generated filter warm and spends nothing on it
+        again = story_warmup.warm_filters(db, filters[:1], story_warmup.SpendMeter(FakeModel()))
+        assert again["already_warm"] == 1
+
+    def test_ranked_filters_are_read_without_generating(self, db, monkeypatch):
+        """Test that a read of a ranked filter returns the ranked stories and never calls the model."""
+        story_warmup.warm_filters(db, [("United", "", "jerseys")], model=None)
+        model = FakeModel()
+        monkeypatch.setattr(story_generator, "GEMINI_MODEL", model)
+
+        stories = story_generator.get_or_generate_stories(era="United", category="jerseys", limit=5)
+        assert len(stories) == 5 and model.calls == 0
+        assert list(story_generator.stream_contextual_stories(era="United", category="jerseys")) == [
+            ("done", {"generated": 0, "ranked": True})]
+        # Another category of the same era was not ranked, so it still generates
+        assert len(story_generator.get_or_generate_stories(era="United", category="boots", limit=5)) == 5
+        assert model.calls == 1
+
+    def test_failing_provider_is_not_asked_all_run(self, db):
+        """Test that generation stops after repeated failures and the remaining filters are ranked."""
+        model = story_warmup.SpendMeter(FakeModel(fail=True))
+        filters = [(era, "", "") for era in ("A", "B", "C", "D", "E")]
+        counts = story_warmup.warm_filters(db, filters, model)
+        assert counts["failed"] == story_warmup.MAX_FAILURES_IN_A_ROW
+        assert counts["ranked"] == 5
+        assert db.query(Story).count() == len(story_generator.DEFAULT_STORIES)
+
+    def test_run_is_recorded_with_its_spend(self, db, monkeypatch):
+        """Test that the command stores how many filters were warmed and what the run spent."""
+        add_items(db, ("Portugal", "Portugal", "jerseys"))
+        monkeypatch.setattr(story_warmup, "SessionLocal", story_generator.SessionLocal)
+        monkeypatch.setattr(story_warmup, "engine", db.get_bind())
+        monkeypatch.setattr(story_warmup, "warmup_model", lambda: story_warmup.SpendMeter(FakeModel()))
+        story_warmup.main(["--max-calls", "2"])
+
+        run = db.query(StoryWarmupRun).one()
+        assert run.combinations == 4
+        assert run.generated + run.ranked + run.already_warm == 4
+        assert run.llm_calls == 2 and run.estimated_tokens > 0
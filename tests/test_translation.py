@@ -0,0 +1,150 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import translation
+from app.database import Base
+from app.models import Item, Translation
+
+
+class FakeTranslator:
+    """Prefixes every line with 'he:' and records each request"""
+
+    def __init__(self, requests, drop_lines=False):
+        self.requests = requests
+        self.drop_lines = drop_lines
+
+    def translate(self, text):
+        self.requests.append(text)
+        lines = [f"he:{line}" for line in text.split("\n")]
+        if self.drop_lines and len(lines) > 1:
+            lines = lines[:-1]
+        return "\n".join(lines)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/translation.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def translator_for(session_factory, requests, overrides=None, **kwargs):
+    return translation.PartTranslator(session_factory, lambda lang: FakeTranslator(requests, **kwargs),
+                                      overrides=overrides or {})
+
+
+class TestPartTranslator:
+    def test_unique_misses_are_batched(self, session_factory):
+        """Test that distinct titles go out in one request and repeats reuse the translation."""
+        requests = []
+        translator = translator_for(session_factory, requests)
+        titles = ["Ronaldo Jersey", "ronaldo  jersey ", "Ronaldo Boots", "Ronaldo Jersey"]
+
+        assert translator.translate_batch(titles) == ["he:Ronaldo Jersey", "he:Ronaldo Jersey",
+                                                      "he:Ronaldo Boots", "he:Ronaldo Jersey"]
+        assert requests == ["Ronaldo Jersey\nRonaldo Boots"]
+
+    def test_memory_persists_across_translators(self, session_factory):
+        """Test that a new translator finds earlier translations in the memory table."""
+        translator_for(session_factory, []).translate("Ronaldo Jersey")
+        requests = []
+        assert translator_for(session_factory, requests).translate("RONALDO JERSEY") == "he:Ronaldo Jersey"
+        assert requests == []
+        assert session_factory().query(Translation).one().source_key == "ronaldo jersey"
+
+    def test_mismatched_batch_falls_back_to_single_requests(self, session_factory):
+        """Test that a batch whose lines do not come back one for one is translated text by text."""
+        requests = []
+        translator = translator_for(session_factory, requests, drop_lines=True)
+        assert translator.translate_batch(["Jersey", "Boots"]) == ["he:Jersey", "he:Boots"]
+        assert requests == ["Jersey\nBoots", "Jersey", "Boots"]
+
+    def test_requests_stay_under_size_limit(self, session_factory, monkeypatch):
+        """Test that large batches are split so no request exceeds the size limit."""
+        monkeypatch.setattr(translation, "MAX_REQUEST_CHARS", 30)
+        requests = []
+        translator = translator_for(session_factory, requests)
+        titles = [f"Ronaldo item number {i}" for i in range(5)]
+        assert translator.translate_batch(titles) == [f"he:{title}" for title in titles]
+        assert len(requests) == 5 and all(len(request) <= 30 for request in requests)
+
+
+class TestGlossary:
+    GLOSSARY = {"real madrid": "ריאל מדריד", "cristiano ronaldo": "כריסטיאנו רונאלדו", "ronaldo": "רונאלדו"}
+
+    def test_phrases_are_protected_inside_titles(self, session_factory):
+        """Test that glossary phrases inside a title are kept out of machine translation and restored after it."""
+        requests = []
+        translator = translator_for(session_factory, requests, overrides=self.GLOSSARY)
+        assert translator.translate("Cristiano Ronaldo  REAL MADRID home shirt") == \
+            "he:כריסטיאנו רונאלדו ריאל מדריד home shirt"
+        assert requests == ["⟦0⟧ ⟦1⟧ home shirt"]
+
+    def test_longest_phrase_wins_and_words_must_be_whole(self, session_factory):
+        """Test that overlapping phrases match the longest one and phrases never match inside words."""
+        glossary = translation.Glossary(self.GLOSSARY)
+        assert glossary.protect("Cristiano Ronaldo boots") == ("⟦0⟧ boots", ["כריסטיאנו רונאלדו"])
+        assert glossary.protect("Ronaldoesque Real Madridista") == ("Ronaldoesque Real Madridista", [])
+
+    def test_titles_of_known_phrases_skip_the_translator(self, session_factory):
+        """Test that a title made only of glossary phrases and punctuation is translated locally."""
+        requests = []
+        translator = translator_for(session_factory, requests, overrides=self.GLOSSARY)
+        assert translator.translate_batch(["Ronaldo - Real Madrid", "ronaldo"]) == ["רונאלדו - ריאל מדריד", "רונאלדו"]
+        assert requests == []
+
+    def test_lost_placeholder_falls_back_to_plain_translation(self, session_factory):
+        """Test that a title whose placeholder did not survive translation is translated without the glossary."""
+        requests = []
+
+        class DroppingTranslator(FakeTranslator):
+            def translate(self, text):
+                return super().translate(text.replace("⟦0⟧", "0"))
+
+        translator = translation.PartTranslator(session_factory, lambda lang: DroppingTranslator(requests),
+                                                overrides=self.GLOSSARY)
+        assert translator.translate("Ronaldo boots") == "he:Ronaldo boots"
+        assert requests == ["0 boots", "Ronaldo boots"]
+
+
+    def test_lost_placeholders_fall_back_per_title(self, session_factory):
+        """Test that titles sharing a protected key each get their own plain translation, which is remembered."""
+        requests = []
+
+        class DroppingTranslator(FakeTranslator):
+            def translate(self, text):
+                return super().translate(text.replace("⟦0⟧", "XX"))
+
+        glossary = dict(self.GLOSSARY, juventus="יובנטוס")
+        translator = translation.PartTranslator(session_factory, lambda lang: DroppingTranslator(requests),
+                                                overrides=glossary)
+        titles = ["Real Madrid jersey", "Juventus jersey", "real madrid  jersey"]
+        assert translator.translate_batch(titles) == [
+            "he:Real Madrid jersey", "he:Juventus jersey", "he:Real Madrid jersey"]
+
+        # A fresh translator still asks for the protected text, but takes the plain titles from memory
+        requests.clear()
+        again = translation.PartTranslator(session_factory, lambda lang: DroppingTranslator(requests), overrides=glossary)
+        assert again.translate_batch(titles[:2]) == ["he:Real Madrid jersey", "he:Juventus jersey"]
+        assert requests == ["XX jersey"]
+
+
+class TestBackfill:
+    def test_fills_missing_hebrew_titles(self, session_factory):
+        """Test that the backfill translates missing and untranslated titles, each distinct title once."""
+        db = session_factory()
+        titles = [("Ronaldo Jersey", None), ("Ronaldo Jersey", ""), ("Ronaldo Boots", "Ronaldo Boots"),
+                  ("Ronaldo Card", "כרטיס רונאלדו")]
+        for i, (title_en, title_he) in enumerate(titles):
+            db.add(Item(title_en=title_en, title_he=title_he, item_url=f"https://www.aliexpress.com/item/{i}.html",
+                        price=10.0, source="AliExpress"))
+        db.commit()
+        db.close()
+        requests = []
+
+        assert translation.backfill_titles(session_factory, translator_for(session_factory, requests), batch_size=2) == 3
+
+        db = session_factory()
+        assert [item.title_he for item in db.query(Item).order_by(Item.id)] == [
+            "he:Ronaldo Jersey", "he:Ronaldo Jersey", "he:Ronaldo Boots", "כרטיס רונאלדו"]
+        assert requests == ["Ronaldo Jersey", "Ronaldo Boots"]